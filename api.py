@@ -0,0 +1,652 @@
+"""A JSON API for the curation data and the literature cache.
+
+All collections support:
+
+- ``fields``: a comma-separated list of columns to return
+- ``format``: ``json`` (the default), ``ndjson``, or ``tsv``
+- ``descendants``: if given, filters on a reaction or CURIE also match its
+  descendants in the reaction or chemical hierarchy
+- ``limit`` and ``cursor``: the number of rows to return, and the opaque
+  cursor from the ``next`` field or the ``X-Next-Cursor`` header of the
+  previous page. JSON pages have at most 1,000 rows, while NDJSON and TSV
+  return all remaining rows if no limit is given.
+
+Responses are streamed in chunks, and each chunk only takes the requested
+rows and columns out of the snapshot's data frames, so large collections are
+never copied in full for a request. Cursors are tied to the version of the
+data they were issued for, and a cursor from an older version is rejected.
+"""
+
+import base64
+import hashlib
+import threading
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from typing import Any, ClassVar, Protocol, TypeVar
+
+import flask
+import numpy as np
+import pandas as pd
+
+from cache.citation_graph import (
+    CITATIONS_PATH,
+    LITERATURE_PATH,
+    CitationGraph,
+    expand,
+    load_citation_graph,
+)
+from hierarchy import Hierarchy
+from index import EMPTY, union
+from metrics import span
+from pathways import WEIGHTS, PathwayIndex, build_pathway_index
+from snapshot import KGSnapshot, SnapshotStore
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1_000
+CHUNK_SIZE = 1_000
+MAX_DEPTH = 3
+MAX_NODES = 10_000
+MAX_ROUTES = 20
+
+X = TypeVar("X")
+
+MIMETYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "tsv": "text/tab-separated-values",
+}
+
+
+class Rows(Protocol):
+    """A sequence of rows that can be sliced into data frames."""
+
+    columns: list[str]
+
+    def __len__(self) -> int: ...
+
+    def get(self, start: int, stop: int, columns: list[str]) -> pd.DataFrame:
+        """Get a slice of rows with the given columns."""
+
+
+@dataclass
+class FrameRows:
+    """Rows of a data frame, optionally restricted to the given positions."""
+
+    df: pd.DataFrame
+    positions: np.ndarray | None = None
+
+    @property
+    def columns(self) -> list[str]:
+        """Get the columns of the data frame."""
+        return list(self.df.columns)
+
+    def __len__(self) -> int:
+        return len(self.df) if self.positions is None else len(self.positions)
+
+    def get(self, start: int, stop: int, columns: list[str]) -> pd.DataFrame:
+        """Get a slice of rows with the given columns."""
+        rows = (
+            slice(start, stop) if self.positions is None else self.positions[start:stop]
+        )
+        return self.df.iloc[rows, [self.df.columns.get_loc(c) for c in columns]]
+
+
+@dataclass
+class LiteratureRows:
+    """Articles in the citation graph."""
+
+    graph: CitationGraph
+    nodes: np.ndarray
+    columns: ClassVar[list[str]] = [
+        "pubmed",
+        "year",
+        "title",
+        "professors",
+        "cited_by",
+        "cites",
+    ]
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def get(self, start: int, stop: int, columns: list[str]) -> pd.DataFrame:
+        """Get a slice of rows with the given columns."""
+        nodes = self.nodes[start:stop]
+        getters: dict[str, Callable[[], Iterable]] = {
+            "pubmed": lambda: self.graph.pubmeds[nodes].astype(str),
+            "year": lambda: np.asarray(self.graph.years)[nodes],
+            "title": lambda: [self.graph.get_title(n) for n in nodes],
+            "professors": lambda: [
+                ",".join(self.graph.get_professors(n)) for n in nodes
+            ],
+            "cited_by": lambda: (
+                self.graph.in_offsets[nodes + 1] - self.graph.in_offsets[nodes]
+            ),
+            "cites": lambda: (
+                self.graph.out_offsets[nodes + 1] - self.graph.out_offsets[nodes]
+            ),
+        }
+        return pd.DataFrame({column: getters[column]() for column in columns})
+
+
+@dataclass
+class CitationRows:
+    """Citations in the citation graph, optionally restricted to given node pairs."""
+
+    graph: CitationGraph
+    sources: np.ndarray | None = None
+    targets: np.ndarray | None = None
+    columns: ClassVar[list[str]] = ["source", "target"]
+
+    def __len__(self) -> int:
+        if self.sources is None:
+            return self.graph.number_of_edges
+        return len(self.sources)
+
+    def get(self, start: int, stop: int, columns: list[str]) -> pd.DataFrame:
+        """Get a slice of rows with the given columns."""
+        if self.sources is None:
+            # find the source of each edge from the offsets, so the sources
+            # of all edges are never materialized
+            positions = np.arange(start, stop)
+            sources = np.searchsorted(self.graph.out_offsets, positions, "right") - 1
+            targets = self.graph.out_targets[start:stop]
+        else:
+            sources, targets = self.sources[start:stop], self.targets[start:stop]
+        pubmeds = {
+            "source": self.graph.pubmeds[sources],
+            "target": self.graph.pubmeds[targets],
+        }
+        return pd.DataFrame({column: pubmeds[column].astype(str) for column in columns})
+
+
+def _encode_cursor(version: str, offset: int) -> str:
+    return base64.urlsafe_b64encode(f"{version[:16]}:{offset}".encode()).decode()
+
+
+def _decode_cursor(cursor: str | None, version: str) -> int:
+    if not cursor:
+        return 0
+    try:
+        cursor_version, offset = base64.urlsafe_b64decode(cursor).decode().split(":")
+        offset = int(offset)
+    except ValueError:
+        flask.abort(400, "invalid cursor")
+    if offset < 0:
+        flask.abort(400, "invalid cursor")
+    if cursor_version != version[:16]:
+        flask.abort(409, "the data changed since the cursor was issued")
+    return offset
+
+
+def _get_int(name: str, default: int | None, maximum: int | None) -> int | None:
+    raw_value = flask.request.args.get(name)
+    if raw_value is None:
+        value = default
+    else:
+        try:
+            value = int(raw_value)
+        except ValueError:
+            flask.abort(400, f"{name} must be of type int")
+    if value is not None and value < 0:
+        flask.abort(400, f"{name} must not be negative")
+    if value is not None and maximum is not None:
+        value = min(value, maximum)
+    return value
+
+
+def respond(rows: Rows, version: str) -> flask.Response:
+    """Stream a page of rows in the format, with the fields, from the request's arguments."""
+    args = flask.request.args
+    output_format = args.get("format", "json")
+    if output_format not in MIMETYPES:
+        flask.abort(400, f"format must be one of {', '.join(MIMETYPES)}")
+    if fields := args.get("fields"):
+        columns = fields.split(",")
+        if unknown := set(columns).difference(rows.columns):
+            flask.abort(400, f"unknown fields: {', '.join(sorted(unknown))}")
+    else:
+        columns = rows.columns
+
+    start = _decode_cursor(args.get("cursor"), version)
+    if output_format == "json":
+        limit = _get_int("limit", DEFAULT_LIMIT, MAX_LIMIT)
+    else:
+        limit = _get_int("limit", None, None)
+    total = len(rows)
+    stop = total if limit is None else min(total, start + limit)
+    next_cursor = _encode_cursor(version, stop) if stop < total else None
+
+    def _iter_chunks() -> Iterable[pd.DataFrame]:
+        for chunk_start in range(start, stop, CHUNK_SIZE):
+            yield rows.get(chunk_start, min(stop, chunk_start + CHUNK_SIZE), columns)
+
+    def _generate() -> Iterable[str]:
+        if output_format == "tsv":
+            yield "\t".join(columns) + "\n"
+            for chunk in _iter_chunks():
+                yield chunk.to_csv(sep="\t", header=False, index=False)
+        elif output_format == "ndjson":
+            for chunk in _iter_chunks():
+                if len(chunk):
+                    lines = chunk.to_json(
+                        orient="records", lines=True, force_ascii=False
+                    )
+                    yield lines if lines.endswith("\n") else f"{lines}\n"
+        else:
+            yield flask.json.dumps(
+                {"version": version, "total": total, "next": next_cursor}
+            )[:-1]
+            yield ', "items": ['
+            first = True
+            for chunk in _iter_chunks():
+                if len(chunk):
+                    if not first:
+                        yield ","
+                    yield chunk.to_json(orient="records", force_ascii=False)[1:-1]
+                    first = False
+            yield "]}"
+
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    return flask.Response(
+        flask.stream_with_context(_generate()),
+        mimetype=MIMETYPES[output_format],
+        headers=headers,
+    )
+
+
+def _filter(
+    filters: dict[str, tuple[dict, type]],
+    hierarchies: dict[str, Hierarchy] | None = None,
+) -> np.ndarray | None:
+    """Get the positions matching all filters in the request's arguments.
+
+    :param filters: Argument name -> index from values to positions and the
+        type of the values
+    :param hierarchies: Argument name -> the hierarchy whose descendants of
+        the value also match, if the request has a ``descendants`` argument
+    :returns: Sorted positions, or ``None`` if there were no filters
+    """
+    if hierarchies is None or "descendants" not in flask.request.args:
+        hierarchies = {}
+    rv = None
+    with span("filter"):
+        for name, (index, value_type) in filters.items():
+            raw_value = flask.request.args.get(name)
+            if raw_value is None:
+                continue
+            try:
+                value = value_type(raw_value)
+            except ValueError:
+                flask.abort(400, f"{name} must be of type {value_type.__name__}")
+            if name in hierarchies:
+                positions = union(index, hierarchies[name].get_descendants(value))
+            else:
+                positions = index.get(value, EMPTY)
+            rv = positions if rv is None else np.intersect1d(rv, positions)
+    return rv
+
+
+class _Derived:
+    """Small tables and indexes derived from a snapshot, computed once per version."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._version = ""
+        self._values: dict[tuple, Any] = {}
+
+    def get(self, kg: KGSnapshot, func: Callable[..., X], *args: Any) -> X:
+        key = (func.__name__, *args)
+        with self._lock:
+            if kg.version != self._version:
+                self._version = kg.version
+                self._values = {}
+            if key not in self._values:
+                self._values[key] = func(kg, *args)
+            return self._values[key]
+
+
+def _get_catalysts(kg: KGSnapshot) -> pd.DataFrame:
+    df = (
+        kg.conditions_df[
+            kg.conditions_df["catalyst"].notna()
+            & (kg.conditions_df["catalyst"] != "no catalyst")
+        ][["catalyst", "catalyst name"]]
+        .drop_duplicates("catalyst")
+        .sort_values("catalyst")
+        .reset_index(drop=True)
+    )
+    df["conditions"] = [len(kg.index.catalyst_to_conditions[c]) for c in df["catalyst"]]
+    return df
+
+
+def _get_entities(kg: KGSnapshot) -> pd.DataFrame:
+    df = (
+        pd.concat(
+            [
+                kg.reactions_df[[column, f"{column} name"]].set_axis(
+                    ["curie", "name"], axis=1
+                )
+                for column in ("input", "output")
+            ]
+        )
+        .dropna(subset="curie")
+        .drop_duplicates("curie")
+        .sort_values("curie")
+        .reset_index(drop=True)
+    )
+    index = kg.index
+    df["as_substrate"] = [
+        len(index.input_to_reactions.get(c, EMPTY)) for c in df["curie"]
+    ]
+    df["as_product"] = [
+        len(index.output_to_reactions.get(c, EMPTY)) for c in df["curie"]
+    ]
+    return df
+
+
+def _get_pathway_index(
+    kg: KGSnapshot, include_reagents: bool, include_secondary: bool
+) -> PathwayIndex:
+    return build_pathway_index(
+        kg.reactions_df,
+        kg.conditions_df,
+        include_reagents=include_reagents,
+        include_secondary=include_secondary,
+    )
+
+
+class _LiteratureLoader:
+    """Loads the citation graph, and reloads it when the literature cache changes."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._stat: tuple[int, int] | None = None
+        self._graph: CitationGraph | None = None
+        self.version = ""
+
+    def get(self) -> tuple[str, CitationGraph]:
+        try:
+            stat = (
+                LITERATURE_PATH.stat().st_mtime_ns,
+                CITATIONS_PATH.stat().st_mtime_ns,
+            )
+        except FileNotFoundError:
+            flask.abort(503, "the literature cache hasn't been harvested yet")
+        with self._lock:
+            if stat != self._stat:
+                self._graph = load_citation_graph()
+                self._stat = stat
+                self.version = hashlib.sha256(repr(stat).encode()).hexdigest()
+            return self.version, self._graph
+
+
+def _get_neighbourhood(
+    graph: CitationGraph, node: int, *, direction: str, depth: int, max_nodes: int
+) -> tuple[np.ndarray, np.ndarray, bool]:
+    """Get nodes up to a depth away from a node, in breadth-first order, with their depths."""
+    offsets, values = [], []
+    if direction in {"out", "both"}:
+        offsets.append(np.asarray(graph.out_offsets))
+        values.append(np.asarray(graph.out_targets))
+    if direction in {"in", "both"}:
+        offsets.append(np.asarray(graph.in_offsets))
+        values.append(np.asarray(graph.in_sources))
+
+    depths = np.full(graph.number_of_nodes, -1, dtype=np.int64)
+    depths[node] = 0
+    order = [np.array([node])]
+    frontier = order[0]
+    n_nodes, truncated = 1, False
+    for distance in range(1, depth + 1):
+        neighbors = np.unique(
+            np.concatenate(
+                [
+                    v[expand(o, frontier)[0]]
+                    for o, v in zip(offsets, values, strict=True)
+                ]
+            )
+        )
+        frontier = neighbors[depths[neighbors] < 0]
+        if n_nodes + len(frontier) > max_nodes:
+            frontier = frontier[: max_nodes - n_nodes]
+            truncated = True
+        depths[frontier] = distance
+        order.append(frontier)
+        n_nodes += len(frontier)
+        if truncated or not len(frontier):
+            break
+    nodes = np.concatenate(order)
+    return nodes, depths[nodes], truncated
+
+
+def get_blueprint(store: SnapshotStore) -> flask.Blueprint:
+    """Get a blueprint for the API that serves data from the given snapshot store."""
+    blueprint = flask.Blueprint("api", __name__, url_prefix="/api")
+    derived = _Derived()
+    literature = _LiteratureLoader()
+
+    def preload() -> None:
+        """Compute the derived tables and indexes and load the citation graph."""
+        kg = store.get()
+        derived.get(kg, _get_catalysts)
+        derived.get(kg, _get_entities)
+        derived.get(kg, _get_pathway_index, False, False)
+        if LITERATURE_PATH.is_file() and CITATIONS_PATH.is_file():
+            literature.get()
+
+    # called by wsgi.preload before a multi-process server forks its workers
+    blueprint.preload = preload  # type: ignore[attr-defined]
+
+    @blueprint.route("/reactions")
+    def get_reactions() -> flask.Response:
+        """Get reactions, optionally filtered by ``reaction`` ID or ``input`` or ``output`` CURIE."""
+        kg = store.get()
+        positions = _filter(
+            {
+                "reaction": (kg.index.reaction_to_reactions, int),
+                "input": (kg.index.input_to_reactions, str),
+                "output": (kg.index.output_to_reactions, str),
+            },
+            {
+                "reaction": kg.reaction_hierarchy,
+                "input": kg.chemical_hierarchy,
+                "output": kg.chemical_hierarchy,
+            },
+        )
+        return respond(FrameRows(kg.reactions_df, positions), kg.version)
+
+    @blueprint.route("/conditions")
+    def get_conditions() -> flask.Response:
+        """Get conditions, optionally filtered by reaction, chemist, group, catalyst, input, or output."""
+        kg = store.get()
+        positions = _filter(
+            {
+                "reaction": (kg.index.reaction_to_conditions, int),
+                "chemist": (kg.index.chemist_to_conditions, str),
+                "group": (kg.index.group_to_conditions, int),
+                "catalyst": (kg.index.catalyst_to_conditions, str),
+                "input": (kg.index.input_to_conditions, str),
+                "output": (kg.index.output_to_conditions, str),
+            },
+            {
+                "reaction": kg.reaction_hierarchy,
+                "catalyst": kg.chemical_hierarchy,
+                "input": kg.chemical_hierarchy,
+                "output": kg.chemical_hierarchy,
+            },
+        )
+        return respond(FrameRows(kg.conditions_df, positions), kg.version)
+
+    @blueprint.route("/people")
+    def get_people() -> flask.Response:
+        """Get memberships of people in groups, optionally filtered by group."""
+        kg = store.get()
+        positions = _filter({"group": (kg.index.group_to_memberships, int)})
+        return respond(FrameRows(kg.memberships_df, positions), kg.version)
+
+    @blueprint.route("/groups")
+    def get_groups() -> flask.Response:
+        """Get groups."""
+        kg = store.get()
+        return respond(FrameRows(kg.labs_df), kg.version)
+
+    @blueprint.route("/catalysts")
+    def get_catalysts() -> flask.Response:
+        """Get catalysts with their number of conditions."""
+        kg = store.get()
+        return respond(FrameRows(derived.get(kg, _get_catalysts)), kg.version)
+
+    @blueprint.route("/entities")
+    def get_entities() -> flask.Response:
+        """Get substrates and products with their number of reactions."""
+        kg = store.get()
+        return respond(FrameRows(derived.get(kg, _get_entities)), kg.version)
+
+    @blueprint.route("/pathways")
+    def get_pathways() -> flask.Response:
+        """Get the cheapest routes from a ``source`` to a ``target`` CURIE.
+
+        Without a ``target``, closed loops from the source back to itself are
+        returned. ``weight`` is ``steps`` (the default), ``yield``, or
+        ``time``, and at most ``k`` routes are returned, up to 20. Reagents
+        are substrates and ``output 2`` are products of their reactions if
+        ``reagents`` or ``secondary`` are given.
+        """
+        kg = store.get()
+        source = flask.request.args.get("source")
+        if not source:
+            flask.abort(400, "source is required")
+        target = flask.request.args.get("target") or source
+        weight = flask.request.args.get("weight", "steps")
+        if weight not in WEIGHTS:
+            flask.abort(400, f"weight must be one of {', '.join(WEIGHTS)}")
+        index = derived.get(
+            kg,
+            _get_pathway_index,
+            "reagents" in flask.request.args,
+            "secondary" in flask.request.args,
+        )
+        with span("pathways"):
+            routes = index.get_routes(
+                source,
+                target,
+                k=max(1, _get_int("k", 5, MAX_ROUTES)),
+                weight=weight,
+            )
+        return flask.jsonify(
+            {
+                "source": source,
+                "target": target,
+                "weight": weight,
+                "routes": [
+                    {
+                        "cost": route.cost,
+                        "reactions": list(route.reactions),
+                        "curies": list(route.curies),
+                    }
+                    for route in routes
+                ],
+            }
+        )
+
+    @blueprint.route("/literature")
+    def get_literature() -> flask.Response:
+        """Get articles, optionally filtered by ``professor`` name or ``year``."""
+        version, graph = literature.get()
+        mask = np.ones(graph.number_of_nodes, dtype=bool)
+        if (year := _get_int("year", None, None)) is not None:
+            mask &= np.asarray(graph.years) == year
+        if professor := flask.request.args.get("professor"):
+            names = [
+                graph.get_professor_name(p) for p in range(graph.number_of_professors)
+            ]
+            professor_nodes = np.repeat(
+                np.arange(graph.number_of_nodes), np.diff(graph.professor_offsets)
+            )
+            keep = np.zeros(graph.number_of_nodes, dtype=bool)
+            if professor in names:
+                keep[
+                    professor_nodes[
+                        np.asarray(graph.professor_ids) == names.index(professor)
+                    ]
+                ] = True
+            mask &= keep
+        return respond(LiteratureRows(graph, np.flatnonzero(mask)), version)
+
+    @blueprint.route("/literature/<int:pubmed>")
+    def get_article(pubmed: int) -> flask.Response:
+        """Get an article."""
+        _, graph = literature.get()
+        node = graph.get_node(pubmed)
+        if node is None:
+            flask.abort(404)
+        df = LiteratureRows(graph, np.array([node])).get(0, 1, LiteratureRows.columns)
+        return flask.Response(
+            df.to_json(orient="records", force_ascii=False)[1:-1],
+            mimetype=MIMETYPES["json"],
+        )
+
+    @blueprint.route("/literature/<int:pubmed>/neighbourhood")
+    def get_article_neighbourhood(pubmed: int) -> flask.Response:
+        """Get articles citing or cited by an article, up to a given depth.
+
+        The ``direction`` argument is ``out`` (cited articles), ``in``
+        (citing articles), or ``both``. At most ``depth`` citations are
+        followed, up to 3, and at most ``max_nodes`` articles are returned,
+        up to 10,000, closest first. Returns articles with their ``depth``
+        and the citations between them.
+        """
+        _, graph = literature.get()
+        node = graph.get_node(pubmed)
+        if node is None:
+            flask.abort(404)
+        direction = flask.request.args.get("direction", "both")
+        if direction not in {"in", "out", "both"}:
+            flask.abort(400, "direction must be one of in, out, both")
+        nodes, depths, truncated = _get_neighbourhood(
+            graph,
+            node,
+            direction=direction,
+            depth=_get_int("depth", 1, MAX_DEPTH),
+            max_nodes=max(1, _get_int("max_nodes", 1_000, MAX_NODES)),
+        )
+        articles = LiteratureRows(graph, nodes).get(
+            0, len(nodes), LiteratureRows.columns
+        )
+        articles["depth"] = depths
+
+        # citations between the returned articles
+        mask = np.zeros(graph.number_of_nodes, dtype=bool)
+        mask[nodes] = True
+        positions, rows = expand(graph.out_offsets, nodes)
+        targets = np.asarray(graph.out_targets)[positions]
+        keep = mask[targets]
+        pubmeds = graph.pubmeds.astype(str)
+        return flask.jsonify(
+            {
+                "truncated": truncated,
+                "articles": articles.to_dict(orient="records"),
+                "citations": np.stack(
+                    [pubmeds[nodes[rows[keep]]], pubmeds[targets[keep]]], axis=1
+                ).tolist(),
+            }
+        )
+
+    @blueprint.route("/citations")
+    def get_citations() -> flask.Response:
+        """Get citations, optionally only ones from or to an article given by ``pubmed``."""
+        version, graph = literature.get()
+        pubmed = flask.request.args.get("pubmed", type=int)
+        if pubmed is None:
+            return respond(CitationRows(graph), version)
+        node = graph.get_node(pubmed)
+        if node is None:
+            return respond(CitationRows(graph, EMPTY, EMPTY), version)
+        cited = np.asarray(graph.out_neighbors(node))
+        citing = np.asarray(graph.in_neighbors(node))
+        sources = np.concatenate([np.full(len(cited), node), citing])
+        targets = np.concatenate([cited, np.full(len(citing), node)])
+        return respond(CitationRows(graph, sources, targets), version)
+
+    return blueprint
@@ -0,0 +1,598 @@
+# /// script
+# requires-python = ">=3.14"
+# dependencies = [
+#     "click>=8.1.0",
+#     "curies>=0.12.9",
+#     "numpy>=2.0.0",
+#     "opencitations-client>=0.0.7",
+#     "pandas>=3.0.0",
+#     "pubmed-downloader>=0.0.12",
+#     "pystow>=0.7.21",
+#     "tqdm>=4.67.2",
+# ]
+# ///
+
+"""Benchmarks for the web application and the literature harvest.
+
+Run ``uv run --script benchmark.py scaling`` to measure import time, route
+latency percentiles, diagram rendering, literature analysis, and peak memory
+on synthetic data at 10x, 100x, and 1000x scale. Results are appended to
+``output/benchmarks/results.jsonl``. Run ``uv run --script benchmark.py workers``
+to measure the memory each worker of a preloaded, forking server adds.
+"""
+
+import datetime
+import json
+import os
+import random
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import click
+import numpy as np
+import pandas as pd
+
+from constants import HERE, OUTPUT_DIR
+from identifiers import build_crosswalk
+from index import EMPTY, build_index
+from literature import Backends, Harvester, Limits
+from synthetic import SYNTHETIC_DIR, get_environment, scale_curation, write_synthetic
+
+RESULTS_PATH = OUTPUT_DIR.joinpath("benchmarks", "results.jsonl")
+
+
+def _time(func: Callable[[], object], repeats: int) -> float:
+    """Get the median wall time of calling the function, in milliseconds."""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return 1000 * statistics.median(times)
+
+
+@click.group()
+def main() -> None:
+    """Run benchmarks."""
+
+
+@main.command()
+@click.option("--factor", type=int, default=100, show_default=True)
+@click.option("--repeats", type=int, default=50, show_default=True)
+def routes(factor: int, repeats: int) -> None:
+    """Compare per-route lookups with boolean masks and with the prebuilt index."""
+    labs_df, memberships_df, reactions_df, conditions_df = scale_curation(factor)
+    click.echo(
+        f"{factor}x curation: {len(reactions_df):,} reactions, "
+        f"{len(conditions_df):,} conditions"
+    )
+
+    start = time.perf_counter()
+    index = build_index(
+        labs_df=labs_df,
+        memberships_df=memberships_df,
+        reactions_df=reactions_df,
+        conditions_df=conditions_df,
+    )
+    click.echo(f"built index in {1000 * (time.perf_counter() - start):.1f} ms\n")
+
+    orcid = memberships_df["orcid"].iloc[-1]
+    group = int(memberships_df["lab"].iloc[-1])
+    group_orcids = index.group_to_orcids[group]
+    catalyst = conditions_df["catalyst"].dropna().iloc[-1]
+    curie = reactions_df["input"].iloc[-1]
+
+    def _scan_person():
+        conditions_df[conditions_df["chemist"] == orcid]
+        labs_df[labs_df["group"].isin(index.orcid_to_groups[orcid])]
+
+    def _index_person():
+        conditions_df.iloc[index.chemist_to_conditions.get(orcid, EMPTY)]
+        labs_df.iloc[index.get_groups(orcid)]
+
+    def _scan_group():
+        labs_df.loc[labs_df["group"] == group].iloc[0]
+        memberships_df[memberships_df["lab"] == group]
+        conditions_df[conditions_df["chemist"].isin(group_orcids)]
+
+    def _index_group():
+        labs_df.iloc[index.group_to_lab[group]]
+        memberships_df.iloc[index.group_to_memberships.get(group, EMPTY)]
+        conditions_df.iloc[index.group_to_conditions.get(group, EMPTY)]
+
+    def _scan_catalyst():
+        conditions_df[conditions_df["catalyst"] == catalyst]
+
+    def _index_catalyst():
+        conditions_df.iloc[index.catalyst_to_conditions.get(catalyst, EMPTY)]
+
+    def _scan_entity():
+        for column in ["input", "output"]:
+            reactions = reactions_df[reactions_df[column] == curie]
+            conditions_df[conditions_df["reaction"].isin(reactions["reaction"])]
+
+    def _index_entity():
+        reactions_df.iloc[index.input_to_reactions.get(curie, EMPTY)]
+        conditions_df.iloc[index.input_to_conditions.get(curie, EMPTY)]
+        reactions_df.iloc[index.output_to_reactions.get(curie, EMPTY)]
+        conditions_df.iloc[index.output_to_conditions.get(curie, EMPTY)]
+
+    click.echo(f"{'route':<20}{'scan (ms)':>12}{'index (ms)':>12}{'speedup':>10}")
+    for route, scan, lookup in [
+        ("/person/<orcid>", _scan_person, _index_person),
+        ("/group/<group>", _scan_group, _index_group),
+        ("/catalyst/<curie>", _scan_catalyst, _index_catalyst),
+        ("/entity/<curie>", _scan_entity, _index_entity),
+    ]:
+        scan_ms = _time(scan, repeats)
+        index_ms = _time(lookup, repeats)
+        click.echo(
+            f"{route:<20}{scan_ms:>12.3f}{index_ms:>12.3f}{scan_ms / index_ms:>9.1f}x"
+        )
+
+
+@dataclass
+class _Xref:
+    prefix: str
+    identifier: str
+
+
+@dataclass
+class _StandInArticle:
+    pubmed: int
+    title: str
+    date_published: None = None
+    xrefs: list[_Xref] = field(default_factory=list)
+    authors: list = field(default_factory=list)
+
+
+def get_stand_in_backends(
+    *, n_people: int, n_articles: int, n_citations: int, latency: float, seed: int = 0
+) -> Backends:
+    """Get a local stand-in for PubMed and OpenCitations with a fixed latency per request."""
+    rng = random.Random(seed)
+    pubmed_ids = [str(10_000_000 + i) for i in range(n_articles)]
+    authored = {
+        f"Person {i}[Author]": rng.sample(pubmed_ids, k=n_articles // n_people)
+        for i in range(n_people)
+    }
+    incoming: dict[str, list[str]] = {}
+    outgoing: dict[str, list[str]] = {}
+    for _ in range(n_citations):
+        source, target = rng.sample(pubmed_ids, k=2)
+        outgoing.setdefault(f"br/{source}", []).append(f"br/{target}")
+        incoming.setdefault(f"br/{target}", []).append(f"br/{source}")
+
+    def _delay(func: Callable) -> Callable:
+        def _wrapped(*args):
+            time.sleep(latency)
+            return func(*args)
+
+        return _wrapped
+
+    def _get_articles(batch: Iterable[str]) -> list[_StandInArticle]:
+        return [_StandInArticle(int(p), f"Article {p}") for p in batch]
+
+    return Backends(
+        search=_delay(lambda query: authored.get(query, [])),
+        get_articles=_delay(_get_articles),
+        get_omid_from_pubmed=_delay(lambda pubmed: f"br/{pubmed}"),
+        get_omid_from_doi=_delay(lambda doi: None),
+        get_pubmed_from_omid=_delay(lambda omid: omid.removeprefix("br/")),
+        get_incoming_citations=_delay(lambda omid: incoming.get(omid, [])),
+        get_outgoing_citations=_delay(lambda omid: outgoing.get(omid, [])),
+    )
+
+
+@main.command()
+@click.option("--people", type=int, default=17, show_default=True)
+@click.option("--articles", type=int, default=2_000, show_default=True)
+@click.option("--citations", type=int, default=4_000, show_default=True)
+@click.option("--latency", type=float, default=0.002, show_default=True)
+@click.option("--pubmed-limit", type=int, default=3, show_default=True)
+@click.option("--opencitations-limit", type=int, default=16, show_default=True)
+def harvest(
+    people: int,
+    articles: int,
+    citations: int,
+    latency: float,
+    pubmed_limit: int,
+    opencitations_limit: int,
+) -> None:
+    """Compare serial and concurrent harvesting against a local stand-in."""
+    backends = get_stand_in_backends(
+        n_people=people, n_articles=articles, n_citations=citations, latency=latency
+    )
+    names = [f"Person {i}" for i in range(people)]
+    pubmed_ids = [str(10_000_000 + i) for i in range(articles)]
+    crosswalk = build_crosswalk(
+        pd.DataFrame({"omid": [f"br/{p}" for p in pubmed_ids], "pmid": pubmed_ids}),
+        pd.DataFrame(columns=["omid", "doi"], dtype=str),
+    )
+    concurrent = Limits(pubmed=pubmed_limit, opencitations=opencitations_limit)
+    results = {}
+    for label, limits, kwargs in [
+        ("serial", Limits(pubmed=1, opencitations=1), {}),
+        ("concurrent", concurrent, {}),
+        ("crosswalk", concurrent, {"crosswalk": crosswalk}),
+    ]:
+        start = time.perf_counter()
+        with Harvester(backends, limits=limits, progress=False, **kwargs) as harvester:
+            results[label] = harvester.harvest(names)
+        elapsed = time.perf_counter() - start
+        n = len(results[label].articles)
+        click.echo(
+            f"{label:<12}{elapsed:>8.2f} s{n / elapsed:>10.1f} articles/s "
+            f"({n:,} articles, {len(results[label].citations):,} citations)"
+        )
+    if any(r.citations != results["serial"].citations for r in results.values()):
+        raise click.ClickException("harvests differ")
+
+
+def _percentiles(latencies: list[float]) -> dict[str, float]:
+    """Get latency percentiles in milliseconds."""
+    values = 1000 * np.array(latencies)
+    return {
+        "requests": len(latencies),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p90_ms": round(float(np.percentile(values, 90)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "max_ms": round(float(values.max()), 3),
+    }
+
+
+def _get_route(path: str) -> str:
+    """Get the route pattern for a path, e.g., ``/person/<>`` for ``/person/0000-...``."""
+    parts = path.split("/")
+    return "/".join(parts[:2] + ["<>"]) if len(parts) > 2 and parts[2] else path
+
+
+@main.command(hidden=True)
+@click.option("--sample", type=int, default=20, show_default=True)
+@click.option("--repeats", type=int, default=5, show_default=True)
+@click.option("--kingdom-diagram/--no-kingdom-diagram", default=True)
+def measure(sample: int, repeats: int, kingdom_diagram: bool) -> None:
+    """Measure the application against the data configured in the environment.
+
+    This is run in a subprocess by ``scaling``, so that import time and peak
+    memory are measured from a fresh interpreter. Prints a JSON object.
+    """
+    results: dict[str, Any] = {}
+    start = time.perf_counter()
+    import wsgi
+
+    results["import_seconds"] = round(time.perf_counter() - start, 3)
+
+    from draw import draw
+    from export import get_pages
+    from snapshot import compile_snapshot, load_snapshot, read_compiled_snapshot
+
+    # startup from the TSVs and from a compiled snapshot
+    snapshot_start = time.perf_counter()
+    load_snapshot()
+    tsv_seconds = time.perf_counter() - snapshot_start
+    compile_snapshot()
+    snapshot_start = time.perf_counter()
+    read_compiled_snapshot()
+    results["snapshot"] = {
+        "tsv_seconds": round(tsv_seconds, 3),
+        "compiled_seconds": round(time.perf_counter() - snapshot_start, 3),
+    }
+
+    kg = wsgi.STORE.get()
+    results["reactions"] = len(kg.reactions_df)
+    results["conditions"] = len(kg.conditions_df)
+
+    # request a sample of pages of each route a few times with the page cache
+    # cleared, so each request renders the page, as before there was a page
+    # cache. the first request to an entity's diagram draws it, later ones hit
+    # the diagram cache. then request each page a few times from the page cache
+    rng = random.Random(0)
+    routes: dict[str, list[str]] = {}
+    for page in get_pages(kg, wsgi.NAMES):
+        routes.setdefault(_get_route(page.path), []).append(page.path)
+        if page.path.startswith("/entity/"):
+            routes.setdefault("/entity/<>/<>.svg", []).extend(
+                f"{page.path}/{role}.svg" for role in ("substrate", "product")
+            )
+    client = wsgi.app.test_client()
+
+    def _request(path: str) -> float:
+        request_start = time.perf_counter()
+        response = client.get(path)
+        elapsed = time.perf_counter() - request_start
+        if response.status_code != 200:
+            raise click.ClickException(f"{path} returned {response.status_code}")
+        return elapsed
+
+    results["routes"] = {}
+    results["cached_routes"] = {}
+    for route, paths in routes.items():
+        latencies, cached_latencies = [], []
+        for path in rng.sample(paths, min(sample, len(paths))):
+            for _ in range(repeats):
+                wsgi.RESPONSE_CACHE.clear()
+                latencies.append(_request(path))
+            # the last request put the page in the cache
+            cached_latencies.extend(_request(path) for _ in range(repeats))
+        results["routes"][route] = _percentiles(latencies)
+        results["cached_routes"][route] = _percentiles(cached_latencies)
+    results["response_cache"] = wsgi.RESPONSE_CACHE.stats()
+
+    # diagrams without the cache
+    entity_latencies = []
+    for curie in rng.sample(sorted(kg.index.input_to_reactions), min(sample, 5)):
+        diagram_start = time.perf_counter()
+        draw(
+            labs_df=kg.labs_df,
+            reactions_df=kg.reactions_df.iloc[kg.index.input_to_reactions[curie]],
+            conditions_df=kg.conditions_df.iloc[
+                kg.index.input_to_conditions.get(curie, EMPTY)
+            ],
+            reaction_hierarchy_df=kg.reaction_hierarchy_df,
+            chemical_hierarchy_df=kg.chemical_hierarchy_df,
+            direction="TD",
+            group_closed_loop=False,
+            format="svg",
+        )
+        entity_latencies.append(time.perf_counter() - diagram_start)
+    results["entity_diagram"] = _percentiles(entity_latencies)
+    if kingdom_diagram:
+        _kingdom, kingdom_df = next(iter(kg.reactions_df.groupby("kingdom")))
+        diagram_start = time.perf_counter()
+        draw(
+            labs_df=kg.labs_df,
+            reactions_df=kingdom_df,
+            conditions_df=kg.conditions_df,
+            reaction_hierarchy_df=kg.reaction_hierarchy_df,
+            chemical_hierarchy_df=kg.chemical_hierarchy_df,
+        )
+        results["kingdom_diagram_seconds"] = round(
+            time.perf_counter() - diagram_start, 3
+        )
+    else:
+        results["kingdom_diagram_seconds"] = None
+
+    # the literature analysis scripts import their siblings directly
+    sys.path.insert(0, str(HERE.joinpath("cache")))
+    from bibliometrics import get_report
+    from citation_graph import build_citation_graph
+    from reachability import get_reachability
+
+    analysis = {}
+    analysis_start = time.perf_counter()
+    graph = build_citation_graph()
+    analysis["build_store_seconds"] = round(time.perf_counter() - analysis_start, 3)
+    analysis["papers"] = graph.number_of_nodes
+    analysis["citations"] = graph.number_of_edges
+    analysis_start = time.perf_counter()
+    years = np.asarray(graph.years)
+    has_professors = np.diff(graph.professor_offsets) > 0
+    get_reachability(graph.subgraph((years >= 2015) & has_professors))
+    analysis["reachability_seconds"] = round(time.perf_counter() - analysis_start, 3)
+    analysis_start = time.perf_counter()
+    get_report(graph)
+    analysis["bibliometrics_seconds"] = round(time.perf_counter() - analysis_start, 3)
+    results["analysis"] = analysis
+
+    # ru_maxrss is in kilobytes on Linux
+    results["peak_memory_mb"] = round(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+    )
+    click.echo(json.dumps(results))
+
+
+def _get_memory() -> dict[str, float]:
+    """Get the resident, proportional, and private memory of this process, in MB.
+
+    Memory shared with other processes, e.g., pages inherited from a server
+    that forked this worker, counts toward the resident set size but not
+    toward private memory. This reads ``/proc/self/smaps_rollup``, so it only
+    works on Linux.
+    """
+    fields = {}
+    with open("/proc/self/smaps_rollup") as file:
+        for line in file:
+            key, _, value = line.partition(":")
+            if value.strip().endswith("kB"):
+                fields[key] = int(value.split()[0]) / 1024
+    return {
+        "rss_mb": round(fields["Rss"], 1),
+        "pss_mb": round(fields["Pss"], 1),
+        "private_mb": round(fields["Private_Clean"] + fields["Private_Dirty"], 1),
+    }
+
+
+@main.command()
+@click.option("--workers", "n_workers", type=int, default=4, show_default=True)
+@click.option("--sample", type=int, default=20, show_default=True)
+@click.option("--preload/--no-preload", default=True, show_default=True)
+def workers(n_workers: int, sample: int, preload: bool) -> None:
+    """Measure the memory of workers forked from a preloaded server.
+
+    This mimics ``gunicorn.conf.py`` against the data configured in the
+    environment: the application is imported and preloaded once, then each
+    forked worker requests a sample of pages of each route and reports how
+    much of its memory is private rather than shared with the server.
+    """
+    import wsgi
+    from export import get_pages
+
+    if preload:
+        wsgi.preload()
+    server = _get_memory()
+
+    rng = random.Random(0)
+    routes: dict[str, list[str]] = {}
+    for page in get_pages(wsgi.STORE.get(), wsgi.NAMES):
+        routes.setdefault(_get_route(page.path), []).append(page.path)
+    paths = [
+        path
+        for route_paths in routes.values()
+        for path in rng.sample(route_paths, min(sample, len(route_paths)))
+    ]
+
+    children = []
+    for _ in range(n_workers):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            client = wsgi.app.test_client()
+            for path in paths:
+                client.get(path)
+            with os.fdopen(write_fd, "w") as file:
+                json.dump(_get_memory(), file)
+            os._exit(0)
+        os.close(write_fd)
+        children.append((pid, read_fd))
+    results = []
+    for pid, read_fd in children:
+        with os.fdopen(read_fd) as file:
+            results.append(json.load(file))
+        os.waitpid(pid, 0)
+
+    click.echo(
+        f"server: {server['rss_mb']:,.1f} MB resident, "
+        f"{server['private_mb']:,.1f} MB private"
+    )
+    for i, result in enumerate(results):
+        click.echo(
+            f"worker {i}: {result['rss_mb']:,.1f} MB resident, "
+            f"{result['pss_mb']:,.1f} MB proportional, "
+            f"{result['private_mb']:,.1f} MB private"
+        )
+    private = statistics.mean(result["private_mb"] for result in results)
+    click.echo(
+        f"each additional worker costs {private:,.1f} MB after {len(paths):,} requests"
+    )
+    click.echo(json.dumps({"server": server, "workers": results}))
+
+
+def _get_commit() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=HERE, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@main.command()
+@click.option(
+    "--factor",
+    "factors",
+    type=int,
+    multiple=True,
+    default=[10, 100, 1000],
+    show_default=True,
+)
+@click.option(
+    "--max-literature-factor",
+    type=int,
+    default=100,
+    show_default=True,
+    help="Cap on replicates of the literature cache, since 1000x is ~19M articles",
+)
+@click.option(
+    "--max-kingdom-factor",
+    type=int,
+    default=10,
+    show_default=True,
+    help="Don't draw whole kingdoms above this factor, since graphviz layout is superlinear",
+)
+@click.option("--sample", type=int, default=20, show_default=True)
+@click.option("--repeats", type=int, default=5, show_default=True)
+@click.option("--directory", type=Path, default=SYNTHETIC_DIR, show_default=True)
+@click.option("--results", type=Path, default=RESULTS_PATH, show_default=True)
+def scaling(
+    factors: list[int],
+    max_literature_factor: int,
+    max_kingdom_factor: int,
+    sample: int,
+    repeats: int,
+    directory: Path,
+    results: Path,
+) -> None:
+    """Measure the application on synthetic data at several scales.
+
+    One line per scale is appended to the results file, so runs from
+    different commits can be compared.
+    """
+    for factor in factors:
+        literature_factor = min(factor, max_literature_factor)
+        data_dir = directory.joinpath(f"{factor}x-{literature_factor}x")
+        if not data_dir.joinpath("curation").is_dir():
+            click.echo(f"generating {factor}x data in {data_dir}")
+            write_synthetic(data_dir, factor, literature_factor=literature_factor)
+        # clear caches from previous runs, so each run does the same work
+        shutil.rmtree(data_dir.joinpath("output", "diagrams"), ignore_errors=True)
+        data_dir.joinpath("output", "snapshot.pickle").unlink(missing_ok=True)
+        shutil.rmtree(data_dir.joinpath("cache", "citation_graph"), ignore_errors=True)
+
+        args = [
+            sys.executable,
+            str(Path(__file__).resolve()),
+            "measure",
+            f"--sample={sample}",
+            f"--repeats={repeats}",
+            "--kingdom-diagram"
+            if factor <= max_kingdom_factor
+            else "--no-kingdom-diagram",
+        ]
+        start = time.perf_counter()
+        output = subprocess.run(
+            args,
+            env={**os.environ, **get_environment(data_dir)},
+            cwd=HERE,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        record = {
+            "timestamp": datetime.datetime.now(datetime.UTC).isoformat(
+                timespec="seconds"
+            ),
+            "commit": _get_commit(),
+            "factor": factor,
+            "literature_factor": literature_factor,
+            **json.loads(output.strip().splitlines()[-1]),
+            "total_seconds": round(time.perf_counter() - start, 3),
+        }
+        results.parent.mkdir(parents=True, exist_ok=True)
+        with results.open("a") as file:
+            print(json.dumps(record), file=file)
+
+        click.echo(
+            f"{factor}x: import {record['import_seconds']:.2f} s, "
+            f"peak memory {record['peak_memory_mb']:,.0f} MB"
+        )
+        click.echo(
+            f"  snapshot         {record['snapshot']['tsv_seconds']:.3f} s from TSVs,"
+            f" {record['snapshot']['compiled_seconds']:.3f} s compiled"
+        )
+        for route, stats in record["routes"].items():
+            cached = record["cached_routes"][route]
+            click.echo(
+                f"  {route:<16} p50 {stats['p50_ms']:>9.2f} ms"
+                f"  p99 {stats['p99_ms']:>9.2f} ms"
+                f"  cached p50 {cached['p50_ms']:>7.2f} ms"
+            )
+        click.echo(
+            f"  entity diagram   p50 {record['entity_diagram']['p50_ms']:>9.2f} ms"
+        )
+        for key, value in record["analysis"].items():
+            if key.endswith("_seconds"):
+                click.echo(f"  {key:<24} {value:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
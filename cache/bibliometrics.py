@@ -0,0 +1,134 @@
+"""Bibliometric statistics over the citation graph, as a JSON report.
+
+All statistics are computed with array operations over the columns of the
+citation graph store, so the report for the whole cache is built in a few
+milliseconds once the store is loaded.
+"""
+
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+import click
+import numpy as np
+
+from citation_graph import CitationGraph, expand, load_citation_graph
+
+
+def get_professor_citations(graph: CitationGraph) -> np.ndarray:
+    """Count citations between professors' labs.
+
+    :returns: A square matrix where the entry at ``(i, j)`` is the number of
+        citations from papers of professor ``i`` to papers of professor ``j``.
+        A citation between papers with several professors counts once for each
+        pair of professors.
+    """
+    n = graph.number_of_professors
+    offsets = np.asarray(graph.professor_offsets)
+    professor_ids = np.asarray(graph.professor_ids)
+    sources, targets = graph.edges()
+    source_positions, edges = expand(offsets, sources)
+    target_positions, rows = expand(offsets, targets[edges])
+    citing = professor_ids[source_positions][rows]
+    cited = professor_ids[target_positions]
+    return np.bincount(citing * n + cited, minlength=n * n).reshape(n, n)
+
+
+def _histogram(values: np.ndarray) -> dict[str, int]:
+    counts = np.bincount(values)
+    nonzero = np.flatnonzero(counts)
+    return dict(
+        zip(nonzero.astype(str).tolist(), counts[nonzero].tolist(), strict=True)
+    )
+
+
+def get_report(graph: CitationGraph, top: int = 10) -> dict[str, Any]:
+    """Get bibliometric statistics for the citation graph.
+
+    :param graph: A citation graph
+    :param top: The number of most cited papers to include
+    :returns: A JSON-serializable report
+    """
+    in_degrees = graph.in_degrees()
+    out_degrees = graph.out_degrees()
+    years = np.asarray(graph.years)
+    professor_names = [
+        graph.get_professor_name(p) for p in range(graph.number_of_professors)
+    ]
+
+    papers_per_professor = np.bincount(
+        graph.professor_ids, minlength=graph.number_of_professors
+    )
+    professor_sources = np.repeat(
+        np.arange(graph.number_of_nodes), np.diff(graph.professor_offsets)
+    )
+    citations_per_professor = np.bincount(
+        graph.professor_ids,
+        weights=in_degrees[professor_sources],
+        minlength=graph.number_of_professors,
+    ).astype(int)
+
+    professor_citations = get_professor_citations(graph)
+    within = int(np.trace(professor_citations))
+
+    most_cited = np.argsort(-in_degrees, kind="stable")[:top]
+
+    return {
+        "papers": graph.number_of_nodes,
+        "citations": graph.number_of_edges,
+        "in_degree_histogram": _histogram(in_degrees),
+        "out_degree_histogram": _histogram(out_degrees),
+        "papers_per_year": _histogram(years[years > 0]),
+        "professors": {
+            name: {"papers": int(papers), "citations": int(citations)}
+            for name, papers, citations in zip(
+                professor_names,
+                papers_per_professor,
+                citations_per_professor,
+                strict=True,
+            )
+        },
+        "professor_citations": {
+            "within_labs": within,
+            "across_labs": int(professor_citations.sum()) - within,
+            "matrix": {
+                citing: {
+                    cited: int(count)
+                    for cited, count in zip(professor_names, row, strict=True)
+                    if count
+                }
+                for citing, row in zip(
+                    professor_names, professor_citations, strict=True
+                )
+            },
+        },
+        "most_cited": [
+            {
+                "pubmed": str(graph.pubmeds[node]),
+                "title": graph.get_title(node),
+                "citations": int(in_degrees[node]),
+            }
+            for node in most_cited
+        ],
+    }
+
+
+@click.command()
+@click.option("--output", type=Path, help="Write the report here instead of stdout")
+@click.option("--top", type=int, default=10, show_default=True)
+def main(output: Path | None, top: int) -> None:
+    """Write a JSON report of bibliometric statistics for the literature cache."""
+    start = time.perf_counter()
+    report = get_report(load_citation_graph(), top=top)
+    report["seconds"] = round(time.perf_counter() - start, 4)
+    if output is None:
+        json.dump(report, sys.stdout, indent=2, ensure_ascii=False)
+        sys.stdout.write("\n")
+    else:
+        output.write_text(json.dumps(report, indent=2, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+"""A compact, array-backed store for the citation graph.
+
+Articles get integer node IDs in order of their PubMed IDs. Edges are stored
+in compressed sparse row (CSR) format in both directions, and the year, title,
+and professors of each article are stored as columns. The store is saved as
+one ``.npy`` file per array, so loading it memory-maps the arrays instead of
+parsing the TSVs and building a :class:`networkx.DiGraph`.
+"""
+
+import os
+from collections.abc import Iterable
+from dataclasses import dataclass, fields
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import numpy as np
+import pandas as pd
+
+if TYPE_CHECKING:
+    import networkx as nx
+
+#: can be overridden, e.g., to run against synthetic data (see synthetic.py)
+HERE = Path(
+    os.environ.get("CATALAIX_LITERATURE_DIR") or Path(__file__).parent.resolve()
+)
+LITERATURE_PATH = HERE.joinpath("literature.tsv")
+CITATIONS_PATH = HERE.joinpath("citations.tsv")
+GRAPH_DIR = HERE.joinpath("citation_graph")
+
+
+def _csr(
+    sources: np.ndarray, targets: np.ndarray, n: int
+) -> tuple[np.ndarray, np.ndarray]:
+    order = np.lexsort((targets, sources))
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=n), out=offsets[1:])
+    return offsets, targets[order].astype(np.int32)
+
+
+def expand(offsets: np.ndarray, nodes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Get the positions of the CSR values of each node, and the node each came from.
+
+    :param offsets: CSR offsets, e.g., :attr:`CitationGraph.out_offsets`
+    :param nodes: Node IDs
+    :returns: Positions into the CSR values and, for each position, the index
+        into ``nodes`` that it belongs to
+    """
+    offsets = np.asarray(offsets)
+    starts, ends = offsets[nodes], offsets[nodes + 1]
+    lengths = ends - starts
+    rows = np.repeat(np.arange(len(nodes)), lengths)
+    positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    positions += np.arange(lengths.sum())
+    return positions, rows
+
+
+def _pack(strings: Iterable[str]) -> tuple[np.ndarray, np.ndarray]:
+    """Pack strings into a UTF-8 buffer and offsets."""
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+@dataclass(frozen=True)
+class CitationGraph:
+    """A citation graph stored as arrays."""
+
+    #: node ID -> PubMed ID, sorted
+    pubmeds: np.ndarray
+    #: node ID -> year of publication, or 0 if unknown
+    years: np.ndarray
+    #: UTF-8 encoded titles, sliced by :attr:`title_offsets`
+    title_buffer: np.ndarray
+    title_offsets: np.ndarray
+    #: professor ID -> name, UTF-8 encoded and sliced by :attr:`professor_name_offsets`
+    professor_name_buffer: np.ndarray
+    professor_name_offsets: np.ndarray
+    #: node ID -> professor IDs, in CSR format
+    professor_offsets: np.ndarray
+    professor_ids: np.ndarray
+    #: node ID -> cited node IDs, in CSR format
+    out_offsets: np.ndarray
+    out_targets: np.ndarray
+    #: node ID -> citing node IDs, in CSR format
+    in_offsets: np.ndarray
+    in_sources: np.ndarray
+
+    @property
+    def number_of_nodes(self) -> int:
+        """Get the number of nodes."""
+        return len(self.pubmeds)
+
+    @property
+    def number_of_edges(self) -> int:
+        """Get the number of edges."""
+        return len(self.out_targets)
+
+    @property
+    def number_of_professors(self) -> int:
+        """Get the number of distinct professors."""
+        return len(self.professor_name_offsets) - 1
+
+    def get_node(self, pubmed: str | int) -> int | None:
+        """Get the node ID for a PubMed ID."""
+        position = int(np.searchsorted(self.pubmeds, int(pubmed)))
+        if position < len(self.pubmeds) and self.pubmeds[position] == int(pubmed):
+            return position
+        return None
+
+    def get_nodes(self, pubmeds: Iterable[str | int]) -> np.ndarray:
+        """Get node IDs for PubMed IDs, with -1 for ones that aren't in the graph."""
+        queries = np.fromiter((int(p) for p in pubmeds), dtype=np.int64)
+        positions = np.searchsorted(self.pubmeds, queries)
+        positions[positions == len(self.pubmeds)] = 0
+        return np.where(self.pubmeds[positions] == queries, positions, -1)
+
+    def out_neighbors(self, node: int) -> np.ndarray:
+        """Get the nodes cited by a node."""
+        return self.out_targets[self.out_offsets[node] : self.out_offsets[node + 1]]
+
+    def in_neighbors(self, node: int) -> np.ndarray:
+        """Get the nodes citing a node."""
+        return self.in_sources[self.in_offsets[node] : self.in_offsets[node + 1]]
+
+    def out_degrees(self) -> np.ndarray:
+        """Get the out-degree of all nodes."""
+        return np.diff(self.out_offsets)
+
+    def in_degrees(self) -> np.ndarray:
+        """Get the in-degree of all nodes."""
+        return np.diff(self.in_offsets)
+
+    def edges(self) -> tuple[np.ndarray, np.ndarray]:
+        """Get arrays of sources and targets for all edges."""
+        sources = np.repeat(
+            np.arange(self.number_of_nodes, dtype=np.int32), self.out_degrees()
+        )
+        return sources, np.asarray(self.out_targets)
+
+    def get_title(self, node: int) -> str:
+        """Get the title of a node."""
+        start, end = self.title_offsets[node], self.title_offsets[node + 1]
+        return bytes(self.title_buffer[start:end]).decode("utf-8")
+
+    def get_professor_name(self, professor: int) -> str:
+        """Get the name of a professor by ID."""
+        start = self.professor_name_offsets[professor]
+        end = self.professor_name_offsets[professor + 1]
+        return bytes(self.professor_name_buffer[start:end]).decode("utf-8")
+
+    def get_professor_ids(self, node: int) -> np.ndarray:
+        """Get the professor IDs for a node."""
+        start, end = self.professor_offsets[node], self.professor_offsets[node + 1]
+        return self.professor_ids[start:end]
+
+    def get_professors(self, node: int) -> list[str]:
+        """Get the names of professors for a node."""
+        return [self.get_professor_name(p) for p in self.get_professor_ids(node)]
+
+    def subgraph(self, nodes: np.ndarray) -> "CitationGraph":
+        """Get the subgraph induced by the given node IDs or boolean mask."""
+        nodes = np.asarray(nodes)
+        if nodes.dtype == bool:
+            nodes = np.flatnonzero(nodes)
+        nodes = np.unique(nodes)
+        mapping = np.full(self.number_of_nodes, -1, dtype=np.int64)
+        mapping[nodes] = np.arange(len(nodes))
+        sources, targets = self.edges()
+        keep = (mapping[sources] >= 0) & (mapping[targets] >= 0)
+        professor_counts = np.diff(self.professor_offsets)[nodes]
+        professor_ids = (
+            np.concatenate([self.get_professor_ids(n) for n in nodes])
+            if len(nodes)
+            else np.empty(0, dtype=np.int32)
+        )
+        titles = [self.get_title(n) for n in nodes]
+        title_buffer, title_offsets = _pack(titles)
+        return _build(
+            pubmeds=np.asarray(self.pubmeds)[nodes],
+            years=np.asarray(self.years)[nodes],
+            title_buffer=title_buffer,
+            title_offsets=title_offsets,
+            professor_name_buffer=np.asarray(self.professor_name_buffer),
+            professor_name_offsets=np.asarray(self.professor_name_offsets),
+            professor_counts=professor_counts,
+            professor_ids=professor_ids.astype(np.int32),
+            sources=mapping[sources[keep]],
+            targets=mapping[targets[keep]],
+        )
+
+    def to_networkx(self) -> "nx.DiGraph":
+        """Export to a :class:`networkx.DiGraph` with PubMed IDs as string nodes."""
+        import networkx as nx
+
+        graph = nx.DiGraph()
+        for node, pubmed in enumerate(self.pubmeds):
+            year = int(self.years[node])
+            graph.add_node(
+                str(pubmed),
+                year=year or None,
+                title=self.get_title(node),
+                professors=",".join(self.get_professors(node)),
+            )
+        sources, targets = self.edges()
+        labels = self.pubmeds.astype(str)
+        graph.add_edges_from(zip(labels[sources], labels[targets], strict=True))
+        return graph
+
+    def save(self, directory: Path = GRAPH_DIR) -> None:
+        """Save the graph as one ``.npy`` file per array."""
+        directory.mkdir(parents=True, exist_ok=True)
+        for field in fields(self):
+            np.save(directory.joinpath(f"{field.name}.npy"), getattr(self, field.name))
+
+    @classmethod
+    def load(cls, directory: Path = GRAPH_DIR) -> "CitationGraph":
+        """Load a graph, memory-mapping its arrays."""
+        return cls(
+            **{
+                field.name: np.load(
+                    directory.joinpath(f"{field.name}.npy"), mmap_mode="r"
+                )
+                for field in fields(cls)
+            }
+        )
+
+
+def _build(
+    *,
+    pubmeds: np.ndarray,
+    years: np.ndarray,
+    title_buffer: np.ndarray,
+    title_offsets: np.ndarray,
+    professor_name_buffer: np.ndarray,
+    professor_name_offsets: np.ndarray,
+    professor_counts: np.ndarray,
+    professor_ids: np.ndarray,
+    sources: np.ndarray,
+    targets: np.ndarray,
+) -> CitationGraph:
+    n = len(pubmeds)
+    professor_offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(professor_counts, out=professor_offsets[1:])
+    out_offsets, out_targets = _csr(sources, targets, n)
+    in_offsets, in_sources = _csr(targets, sources, n)
+    return CitationGraph(
+        pubmeds=pubmeds,
+        years=years,
+        title_buffer=title_buffer,
+        title_offsets=title_offsets,
+        professor_name_buffer=professor_name_buffer,
+        professor_name_offsets=professor_name_offsets,
+        professor_offsets=professor_offsets,
+        professor_ids=professor_ids,
+        out_offsets=out_offsets,
+        out_targets=out_targets,
+        in_offsets=in_offsets,
+        in_sources=in_sources,
+    )
+
+
+def build_citation_graph(
+    literature_path: Path = LITERATURE_PATH, citations_path: Path = CITATIONS_PATH
+) -> CitationGraph:
+    """Build a citation graph from the literature and citations TSVs.
+
+    Cited or citing articles that aren't in the literature TSV are included as
+    nodes without a year, title, or professors.
+    """
+    literature_df = pd.read_csv(
+        literature_path,
+        sep="\t",
+        dtype={"pubmed": np.int64, "title": str, "professors": str},
+    ).drop_duplicates("pubmed")
+    citations_df = pd.read_csv(
+        citations_path,
+        sep="\t",
+        header=None,
+        names=["source", "target"],
+        dtype=np.int64,
+    ).drop_duplicates()
+
+    pubmeds = np.union1d(
+        literature_df["pubmed"].to_numpy(),
+        np.concatenate([citations_df["source"], citations_df["target"]]),
+    )
+    literature_df = (
+        literature_df.set_index("pubmed").reindex(pubmeds).reset_index(names="pubmed")
+    )
+    years = literature_df["year"].fillna(0).to_numpy(dtype=np.int16)
+    title_buffer, title_offsets = _pack(literature_df["title"].fillna(""))
+
+    professors = (
+        literature_df["professors"].fillna("").str.split(",").explode().str.strip()
+    )
+    professors = professors[professors != ""]
+    professor_codes, professor_names = pd.factorize(professors, sort=True)
+    professor_name_buffer, professor_name_offsets = _pack(professor_names)
+
+    return _build(
+        pubmeds=pubmeds,
+        years=years,
+        title_buffer=title_buffer,
+        title_offsets=title_offsets,
+        professor_name_buffer=professor_name_buffer,
+        professor_name_offsets=professor_name_offsets,
+        professor_counts=np.bincount(professors.index, minlength=len(pubmeds)),
+        professor_ids=professor_codes.astype(np.int32),
+        sources=np.searchsorted(pubmeds, citations_df["source"].to_numpy()),
+        targets=np.searchsorted(pubmeds, citations_df["target"].to_numpy()),
+    )
+
+
+def get_synthetic_citation_graph(
+    n_nodes: int,
+    n_edges: int,
+    *,
+    n_professors: int = 17,
+    reverse_fraction: float = 0.001,
+    seed: int = 0,
+) -> CitationGraph:
+    """Generate a random citation graph for benchmarking.
+
+    Articles mostly cite older articles, but a small fraction of citations point
+    forwards (e.g., to preprints), so the graph has a few cycles like the real one.
+
+    :param n_nodes: The number of articles
+    :param n_edges: The number of citations to sample, before removing duplicates
+    :param n_professors: The number of professors to assign, between zero and
+        three per article
+    :param reverse_fraction: The fraction of citations pointing to newer articles
+    :param seed: The random seed
+    """
+    rng = np.random.default_rng(seed)
+    sources = rng.integers(1, n_nodes, size=n_edges)
+    targets = (rng.random(n_edges) * sources).astype(np.int64)
+    reverse = rng.random(n_edges) < reverse_fraction
+    sources[reverse], targets[reverse] = targets[reverse], sources[reverse]
+    edges = np.unique(np.stack([sources, targets], axis=1), axis=0)
+
+    professor_counts = rng.integers(0, 4, size=n_nodes)
+    professor_ids = rng.integers(0, n_professors, size=professor_counts.sum())
+    professor_name_buffer, professor_name_offsets = _pack(
+        f"Professor {i}" for i in range(n_professors)
+    )
+    title_buffer, title_offsets = _pack("" for _ in range(n_nodes))
+    return _build(
+        pubmeds=np.arange(n_nodes, dtype=np.int64) + 10_000_000,
+        years=np.sort(rng.integers(1990, 2026, size=n_nodes)).astype(np.int16),
+        title_buffer=title_buffer,
+        title_offsets=title_offsets,
+        professor_name_buffer=professor_name_buffer,
+        professor_name_offsets=professor_name_offsets,
+        professor_counts=professor_counts,
+        professor_ids=professor_ids.astype(np.int32),
+        sources=edges[:, 0],
+        targets=edges[:, 1],
+    )
+
+
+def load_citation_graph(directory: Path = GRAPH_DIR) -> CitationGraph:
+    """Load the citation graph, rebuilding it if the TSVs are newer than the store."""
+    marker = directory.joinpath("pubmeds.npy")
+    if not marker.is_file() or marker.stat().st_mtime < max(
+        LITERATURE_PATH.stat().st_mtime, CITATIONS_PATH.stat().st_mtime
+    ):
+        build_citation_graph().save(directory)
+    return CitationGraph.load(directory)
@@ -0,0 +1,564 @@
+"""Disambiguate the authors of the literature cache and build their co-author graph.
+
+``literature.py`` records every author of every article in ``authorships.tsv``.
+Authorships are first split into blocks by a name key, their last name and
+first initial, so only authorships in the same block are ever compared.
+Authorships with the same ORCID are the same author. Within a block, the
+others are compared by the Jaccard similarity of their features, i.e., the
+name keys of their coauthors and the words of their affiliations, estimated
+with MinHash. Locality-sensitive hashing of the MinHash signatures in bands
+finds candidate pairs without comparing all pairs. Candidates with similar
+enough features and compatible forenames are merged with a union-find that
+never merges two different ORCIDs.
+
+Authors are then matched to consortium members by ORCID, or by name if no
+other member has the same name key, and the co-author graph is written as
+arrays of edges with the number of joint articles and Newman's collaboration
+weight, where an article with ``n`` authors adds ``1 / (n - 1)`` to each
+pair of its authors.
+"""
+
+import hashlib
+import os
+import re
+import time
+import unicodedata
+from collections.abc import Iterable
+from dataclasses import dataclass, fields
+from pathlib import Path
+
+import click
+import numpy as np
+import pandas as pd
+
+from citation_graph import HERE
+
+AUTHORSHIPS_PATH = HERE.joinpath("authorships.tsv")
+AUTHORS_PATH = HERE.joinpath("authors.tsv")
+COAUTHOR_GRAPH_DIR = HERE.joinpath("coauthor_graph")
+#: can be overridden, e.g., to run against synthetic data (see synthetic.py)
+CURATION_DIR = Path(
+    os.environ.get("CATALAIX_CURATION_DIR")
+    or Path(__file__).parent.parent.joinpath("curation")
+)
+MEMBERSHIPS_PATH = CURATION_DIR.joinpath("memberships.tsv")
+LABS_PATH = CURATION_DIR.joinpath("labs.tsv")
+
+#: the number of MinHash permutations, split into bands of rows for LSH
+N_PERMUTATIONS = 32
+N_BANDS = 16
+#: the estimated Jaccard similarity above which candidates are merged
+THRESHOLD = 0.2
+#: articles with more authors don't add co-author edges, e.g., consortia papers
+MAX_AUTHORS = 100
+#: buckets of more authorships aren't linked, since they're likely common features
+MAX_BUCKET = 200
+
+_PRIME = (1 << 61) - 1
+_WORD_RE = re.compile(r"[a-z]{4,}")
+#: words that are in too many affiliations to tell authors apart
+_STOP_WORDS = frozenset(
+    {
+        "university",
+        "universitat",
+        "department",
+        "institute",
+        "technology",
+        "chemistry",
+        "germany",
+        "aachen",
+        "rwth",
+        "science",
+        "sciences",
+        "research",
+        "center",
+        "centre",
+        "faculty",
+        "school",
+    }
+)
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def get_name_key(name: str) -> str:
+    """Get the block of a name, its last name and first initial, e.g., ``blank l``."""
+    parts = re.findall(r"[a-z]+", _normalize(name))
+    if not parts:
+        return ""
+    return f"{parts[-1]} {parts[0][0]}" if len(parts) > 1 else parts[0]
+
+
+def get_first_forename(name: str) -> str:
+    """Get the first forename of a name, or an empty string if it has none."""
+    parts = re.findall(r"[a-z]+", _normalize(name))
+    return parts[0] if len(parts) > 1 else ""
+
+
+def are_compatible(a: str, b: str) -> bool:
+    """Check if two names with the same name key can be the same person.
+
+    Forenames are compatible if they're equal, or one is an initial of the
+    other, e.g., ``L M Blank`` and ``Lars Blank``.
+    """
+    first_a, first_b = get_first_forename(a), get_first_forename(b)
+    if not first_a or not first_b:
+        return True
+    if len(first_a) == 1 or len(first_b) == 1:
+        return first_a[0] == first_b[0]
+    return first_a == first_b
+
+
+def _hash(values: Iterable[str]) -> np.ndarray:
+    return np.fromiter(
+        (
+            int.from_bytes(
+                hashlib.blake2b(value.encode(), digest_size=8).digest(), "little"
+            )
+            for value in values
+        ),
+        dtype=np.uint64,
+    )
+
+
+def get_signatures(
+    owners: np.ndarray, features: np.ndarray, n: int, seed: int = 0
+) -> np.ndarray:
+    """Get MinHash signatures.
+
+    :param owners: The authorship of each feature, sorted
+    :param features: 64-bit hashes of the features
+    :param n: The number of authorships
+    :returns: An array with a row of :data:`N_PERMUTATIONS` minimums for each
+        authorship. Authorships without features get the maximum value.
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _PRIME, size=N_PERMUTATIONS, dtype=np.uint64)
+    b = rng.integers(0, _PRIME, size=N_PERMUTATIONS, dtype=np.uint64)
+    signatures = np.full((n, N_PERMUTATIONS), np.iinfo(np.uint64).max, np.uint64)
+    if not len(features):
+        return signatures
+    starts = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]])
+    values = features % np.uint64(_PRIME)
+    for i in range(N_PERMUTATIONS):
+        # overflowing multiplication is a fine hash family for MinHash
+        permuted = values * a[i] + b[i]
+        signatures[owners[starts], i] = np.minimum.reduceat(permuted, starts)
+    return signatures
+
+
+class _UnionFind:
+    """A union-find over authorships that keeps ORCIDs apart."""
+
+    def __init__(self, orcids: np.ndarray) -> None:
+        """Initialize with the ORCID of each authorship.
+
+        :param orcids: Codes of the ORCIDs of authorships, or -1 if they have none
+        """
+        self.parents = np.arange(len(orcids))
+        # authorships with the same ORCID are the same author
+        has_orcid = np.flatnonzero(orcids >= 0)
+        _, first = np.unique(orcids[has_orcid], return_index=True)
+        self.parents[has_orcid] = has_orcid[first][
+            np.searchsorted(orcids[has_orcid][first], orcids[has_orcid])
+        ]
+        self.orcids = orcids
+
+    def find_all(self, xs: np.ndarray) -> np.ndarray:
+        """Get the roots of authorships, compressing their paths."""
+        roots = self.parents[xs]
+        while True:
+            parents = self.parents[roots]
+            if (parents == roots).all():
+                break
+            roots = parents
+        self.parents[xs] = roots
+        return roots
+
+    def union_all(self, firsts: np.ndarray, seconds: np.ndarray, chunk: int) -> None:
+        """Merge pairs of authorships in order, unless they have different ORCIDs.
+
+        Pairs that are already merged are dropped a chunk at a time with
+        :meth:`find_all`, so only the remaining pairs are merged one by one.
+        """
+        for start in range(0, len(firsts), chunk):
+            xs = self.find_all(firsts[start : start + chunk])
+            ys = self.find_all(seconds[start : start + chunk])
+            distinct = xs != ys
+            if not distinct.any():
+                continue
+            parents = self.parents.tolist()
+            orcids = self.orcids.tolist()
+            for x, y in zip(xs[distinct].tolist(), ys[distinct].tolist(), strict=True):
+                while parents[x] != x:
+                    x = parents[x]
+                while parents[y] != y:
+                    y = parents[y]
+                if x == y or (orcids[x] >= 0 and orcids[y] >= 0):
+                    continue
+                # the root with the ORCID, if any, stays the root
+                if orcids[y] < 0:
+                    x, y = y, x
+                parents[x] = y
+            self.parents = np.array(parents)
+
+
+@dataclass(frozen=True)
+class CoauthorGraph:
+    """Disambiguated authors and the weighted, undirected co-author graph."""
+
+    #: the author of each authorship
+    authors: np.ndarray
+    #: pairs of authors with ``sources < targets``, sorted
+    sources: np.ndarray
+    targets: np.ndarray
+    #: the number of joint articles of each pair
+    counts: np.ndarray
+    #: Newman's collaboration weight of each pair
+    weights: np.ndarray
+
+    def save(self, directory: Path = COAUTHOR_GRAPH_DIR) -> None:
+        """Save each array to a ``.npy`` file."""
+        directory.mkdir(parents=True, exist_ok=True)
+        for f in fields(self):
+            np.save(directory.joinpath(f"{f.name}.npy"), getattr(self, f.name))
+
+    @classmethod
+    def load(cls, directory: Path = COAUTHOR_GRAPH_DIR) -> "CoauthorGraph":
+        """Load the arrays, memory-mapped."""
+        return cls(
+            **{
+                f.name: np.load(directory.joinpath(f"{f.name}.npy"), mmap_mode="r")
+                for f in fields(cls)
+            }
+        )
+
+
+def read_authorships(path: Path = AUTHORSHIPS_PATH) -> pd.DataFrame:
+    """Read authorships, dropping ones that were appended twice."""
+    df = pd.read_csv(
+        path,
+        sep="\t",
+        dtype={
+            "pubmed": np.int64,
+            "position": np.int32,
+            "name": str,
+            "orcid": str,
+            "affiliations": str,
+        },
+        keep_default_na=False,
+    )
+    return df.drop_duplicates(["pubmed", "position"]).reset_index(drop=True)
+
+
+def _get_pairs(
+    *keys: np.ndarray, max_size: int
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Get all pairs of positions with equal keys.
+
+    Groups of the same size are handled as one matrix, so there's no loop over
+    groups, e.g., over the authorships of each article.
+
+    :param keys: Arrays that together identify the group of each position
+    :param max_size: Groups with more positions are skipped
+    :returns: The first and second position of each pair, and the size of its group
+    """
+    order = np.lexsort(keys)
+    changes = np.zeros(len(order), dtype=bool)
+    changes[:1] = True
+    for key in keys:
+        changes[1:] |= key[order][1:] != key[order][:-1]
+    starts = np.flatnonzero(changes)
+    sizes = np.diff(np.r_[starts, len(order)])
+    firsts, seconds, pair_sizes = [], [], []
+    for size in np.unique(sizes).tolist():
+        if size < 2 or size > max_size:
+            continue
+        rows = starts[sizes == size]
+        matrix = order[rows[:, None] + np.arange(size)]
+        i, j = np.triu_indices(size, 1)
+        firsts.append(matrix[:, i].ravel())
+        seconds.append(matrix[:, j].ravel())
+        pair_sizes.append(np.full(len(rows) * len(i), size))
+    if not firsts:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+    return np.concatenate(firsts), np.concatenate(seconds), np.concatenate(pair_sizes)
+
+
+def _get_features(df: pd.DataFrame, keys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Get each authorship's coauthors' name keys and affiliation words, hashed.
+
+    :returns: The authorship of each feature, sorted, and the features
+    """
+    key_codes, unique_keys = pd.factorize(keys)
+    key_hashes = _hash(f"coauthor:{key}" for key in unique_keys)[key_codes]
+    firsts, seconds, _ = _get_pairs(df["pubmed"].to_numpy(), max_size=MAX_AUTHORS)
+
+    # affiliations are repeated across authorships, so each is split once
+    affiliation_codes, unique_affiliations = pd.factorize(df["affiliations"])
+    affiliation_words = [
+        sorted(set(_WORD_RE.findall(_normalize(affiliation))) - _STOP_WORDS)
+        for affiliation in unique_affiliations
+    ]
+    word_counts = np.array([len(words) for words in affiliation_words], dtype=np.int64)
+    word_codes, unique_words = pd.factorize(
+        np.array([word for words in affiliation_words for word in words], dtype=object)
+    )
+    word_hashes = _hash(f"affiliation:{word}" for word in unique_words)
+    word_offsets = np.r_[0, np.cumsum(word_counts)]
+    counts = word_counts[affiliation_codes]
+    word_owners = np.repeat(np.arange(len(df)), counts)
+    # the position of each of an authorship's words among its affiliation's words
+    within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    word_values = word_hashes[
+        word_codes[word_offsets[affiliation_codes][word_owners] + within]
+    ]
+
+    owners = np.concatenate([firsts, seconds, word_owners])
+    values = np.concatenate([key_hashes[seconds], key_hashes[firsts], word_values])
+    order = np.argsort(owners, kind="stable")
+    return owners[order], values[order]
+
+
+def _get_band_hashes(signatures: np.ndarray, band: int) -> np.ndarray:
+    rows = N_PERMUTATIONS // N_BANDS
+    rv = np.zeros(len(signatures), dtype=np.uint64)
+    for row in range(band * rows, (band + 1) * rows):
+        rv = rv * np.uint64(_PRIME) + signatures[:, row]
+    return rv
+
+
+def disambiguate(df: pd.DataFrame, *, seed: int = 0) -> np.ndarray:
+    """Assign an author to each authorship.
+
+    :param df: Authorships, as from :func:`read_authorships`
+    :returns: The author of each authorship, numbered from zero
+    """
+    n = len(df)
+    # names are repeated across authorships, so each is parsed once
+    name_codes, unique_names = pd.factorize(df["name"])
+    keys = np.array([get_name_key(name) for name in unique_names], dtype=object)
+    keys = keys[name_codes]
+    union_find = _UnionFind(
+        pd.factorize(df["orcid"].replace("", None), use_na_sentinel=True)[0]
+    )
+
+    owners, features = _get_features(df, keys)
+    signatures = get_signatures(owners, features, n, seed=seed)
+    with_features = np.unique(owners)
+    blocks = pd.factorize(keys)[0][with_features]
+
+    # candidates are in the same block and have an equal band in any band
+    candidates = []
+    for band in range(N_BANDS):
+        band_hashes = _get_band_hashes(signatures[with_features], band)
+        firsts, seconds, _ = _get_pairs(band_hashes, blocks, max_size=MAX_BUCKET)
+        candidates.append(with_features[firsts] * n + with_features[seconds])
+    pairs = pd.unique(np.concatenate(candidates))
+    firsts, seconds = pairs // n, pairs % n
+
+    similarity = (signatures[firsts] == signatures[seconds]).mean(axis=1)
+    pubmeds = df["pubmed"].to_numpy()
+    # names in the same block have the same initial, so only the forenames of
+    # ones that aren't initials need to be compared
+    forenames = pd.Series(unique_names).map(get_first_forename)
+    forename_codes = pd.factorize(forenames)[0][name_codes]
+    is_initial = (forenames.str.len() <= 1).to_numpy()[name_codes]
+    keep = (
+        (similarity >= THRESHOLD)
+        & (pubmeds[firsts] != pubmeds[seconds])
+        & (
+            is_initial[firsts]
+            | is_initial[seconds]
+            | (forename_codes[firsts] == forename_codes[seconds])
+        )
+    )
+    # most similar pairs first, so they win over weaker, conflicting ones
+    order = np.argsort(-similarity[keep], kind="stable")
+    union_find.union_all(firsts[keep][order], seconds[keep][order], chunk=max(n, 1))
+
+    return pd.factorize(union_find.find_all(np.arange(n)))[0]
+
+
+def get_coauthor_graph(df: pd.DataFrame, authors: np.ndarray) -> CoauthorGraph:
+    """Get the co-author graph of disambiguated authorships."""
+    firsts, seconds, sizes = _get_pairs(df["pubmed"].to_numpy(), max_size=MAX_AUTHORS)
+    sources = np.minimum(authors[firsts], authors[seconds])
+    targets = np.maximum(authors[firsts], authors[seconds])
+    # the same author can be listed twice on an article
+    keep = sources != targets
+    n = int(authors.max()) + 1 if len(authors) else 0
+    unique, inverse = np.unique(
+        sources[keep].astype(np.int64) * n + targets[keep], return_inverse=True
+    )
+    return CoauthorGraph(
+        authors=authors.astype(np.int32),
+        sources=(unique // n).astype(np.int32),
+        targets=(unique % n).astype(np.int32),
+        counts=np.bincount(inverse, minlength=len(unique)).astype(np.int32),
+        weights=np.bincount(
+            inverse, weights=1 / (sizes[keep] - 1), minlength=len(unique)
+        ).astype(np.float32),
+    )
+
+
+def get_authors(
+    df: pd.DataFrame, authors: np.ndarray, members: dict[str, str]
+) -> pd.DataFrame:
+    """Get a table of authors, matched to consortium members.
+
+    :param df: Authorships
+    :param authors: The author of each authorship
+    :param members: ORCID -> name of consortium members
+    :returns: A table with each author's most common name, ORCID, the ORCID
+        of the consortium member it's matched to, and its number of articles
+    """
+    assigned = df.assign(author=authors)
+    names = (
+        assigned.groupby(["author", "name"])
+        .size()
+        .reset_index(name="count")
+        .sort_values(["author", "count"], ascending=[True, False], kind="stable")
+        .drop_duplicates("author")
+        .set_index("author")["name"]
+    )
+    orcids = (
+        assigned[assigned["orcid"] != ""]
+        .drop_duplicates("author")
+        .set_index("author")["orcid"]
+    )
+    rv = pd.DataFrame(
+        {
+            "name": names,
+            "orcid": orcids.reindex(names.index).fillna(""),
+            "articles": assigned.groupby("author")["pubmed"].nunique(),
+        }
+    )
+    rv.index.name = "author"
+
+    # match authors without a member's ORCID by name, if the name key is unique
+    member_keys = pd.Series(
+        {orcid: get_name_key(name) for orcid, name in members.items()}
+    )
+    unique_keys = member_keys[~member_keys.duplicated(keep=False)]
+    key_to_member = dict(zip(unique_keys.values, unique_keys.index, strict=True))
+    matches = []
+    for name, orcid in rv[["name", "orcid"]].values:
+        if orcid in members:
+            matches.append(orcid)
+            continue
+        member = key_to_member.get(get_name_key(name))
+        if member is not None and not orcid and are_compatible(name, members[member]):
+            matches.append(member)
+        else:
+            matches.append("")
+    rv["member"] = matches
+    return rv.reset_index()
+
+
+def get_members(
+    memberships_path: Path = MEMBERSHIPS_PATH, labs_path: Path = LABS_PATH
+) -> dict[str, str]:
+    """Get the ORCIDs and names of consortium members and professors."""
+    memberships_df = pd.read_csv(memberships_path, sep="\t", dtype=str)
+    labs_df = pd.read_csv(labs_path, sep="\t", dtype=str)
+    rv = dict(labs_df[["ORCID", "Professor"]].dropna().values)
+    rv.update(memberships_df[["orcid", "name"]].dropna().values)
+    return rv
+
+
+def _get_word(i: int) -> str:
+    """Get a word of at least four letters for a number, since names can't have digits."""
+    letters = []
+    for _ in range(4):
+        i, letter = divmod(int(i), 26)
+        letters.append(chr(ord("a") + letter))
+    return "".join(letters) + _get_word(i) if i else "".join(letters)
+
+
+def get_synthetic_authorships(
+    n_articles: int, *, n_people: int = 20_000, seed: int = 0
+) -> pd.DataFrame:
+    """Generate random authorships for benchmarking.
+
+    People are drawn from a pool in which many share a last name and first
+    initial, a quarter have an ORCID, and each keeps one affiliation.
+    """
+    rng = np.random.default_rng(seed)
+    last_names = [_get_word(i).title() for i in range(n_people // 4)]
+    people = [
+        (
+            (
+                f"{chr(65 + rng.integers(0, 6))}{'abcdef'[rng.integers(0, 6)]} "
+                f"{last_names[rng.integers(0, len(last_names))]}"
+            ),
+            f"0000-0000-{i // 10_000:04d}-{i % 10_000:04d}"
+            if rng.random() < 0.25
+            else "",
+            f"Institute of {_get_word(rng.integers(0, n_people // 10)).title()}",
+        )
+        for i in range(n_people)
+    ]
+    # people mostly publish with the same group of collaborators
+    groups = rng.integers(0, n_people // 8, size=n_people)
+    by_group: dict[int, list[int]] = {}
+    for person, group in enumerate(groups.tolist()):
+        by_group.setdefault(group, []).append(person)
+    group_ids = list(by_group)
+    rows = []
+    for article in range(n_articles):
+        group = by_group[group_ids[rng.integers(0, len(group_ids))]]
+        size = min(len(group), int(rng.integers(2, 9)))
+        for position, person in enumerate(rng.choice(group, size=size, replace=False)):
+            name, orcid, affiliation = people[person]
+            rows.append((10_000_000 + article, position + 1, name, orcid, affiliation))
+    return pd.DataFrame(
+        rows, columns=["pubmed", "position", "name", "orcid", "affiliations"]
+    )
+
+
+@click.command()
+@click.option(
+    "--articles",
+    type=int,
+    help="Benchmark on synthetic authorships of this many articles",
+)
+def main(articles: int | None) -> None:
+    """Disambiguate authors and write the co-author graph."""
+    start = time.perf_counter()
+    if articles is None:
+        if not AUTHORSHIPS_PATH.is_file():
+            raise click.ClickException(
+                f"{AUTHORSHIPS_PATH} doesn't exist, harvest with literature.py --full"
+            )
+        df = read_authorships()
+    else:
+        df = get_synthetic_authorships(articles)
+    click.echo(f"read {len(df):,} authorships in {time.perf_counter() - start:.2f} s")
+
+    start = time.perf_counter()
+    authors = disambiguate(df)
+    click.echo(
+        f"found {authors.max() + 1:,} authors in {time.perf_counter() - start:.2f} s"
+    )
+    start = time.perf_counter()
+    graph = get_coauthor_graph(df, authors)
+    click.echo(
+        f"built {len(graph.sources):,} co-author edges "
+        f"in {time.perf_counter() - start:.2f} s"
+    )
+    if articles is not None:
+        return
+
+    authors_df = get_authors(df, authors, get_members())
+    click.echo(f"matched {(authors_df['member'] != '').sum():,} consortium members")
+    authors_df.to_csv(AUTHORS_PATH, sep="\t", index=False)
+    graph.save()
+
+
+if __name__ == "__main__":
+    main()
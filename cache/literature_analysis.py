@@ -1,11 +1,13 @@
 import click
 import networkx as nx
-from pystow.utils import safe_open_reader
+import numpy as np
 
 from pathlib import Path
-from functools import partial
 import textwrap
 
+from citation_graph import CitationGraph, load_citation_graph
+from reachability import get_descendants, get_reachability
+
 HERE = Path(__file__).parent.resolve()
 OUT_STUB = HERE.joinpath("literature_subgraph_example")
 OUT_SVG = OUT_STUB.with_suffix(".svg")
@@ -13,38 +15,17 @@ OUT_PNG = OUT_STUB.with_suffix(".png")
 
 
 def main():
-    graph = nx.DiGraph()
-
-    with safe_open_reader(HERE.joinpath("literature.tsv")) as reader:
-        next(reader)
-        for pubmed, year, title, professors in reader:
-            if not year or int(year) < 2015:
-                continue
-            if not professors:
-                continue
-            professors = ", ".join(p.split()[-1] for p in professors.split(","))
-            label = f"{title}\n{professors} ({year})"
-            graph.add_node(
-                pubmed, label=label, year=int(year), title=title, professors=professors
-            )
-
-    with safe_open_reader(HERE.joinpath("citations.tsv")) as reader:
-        for source, target in reader:
-            if source in graph and target in graph:
-                graph.add_edge(source, target)
-
-    for node in list(graph):
-        if not graph.in_degree(node) and not graph.out_degree(node):
-            graph.remove_node(node)
-
-    largest_component_nodes = max(
-        (
-            nx.descendants(graph, node) | {node}
-            for node in graph.nodes()
-            if graph.nodes[node]["year"] > 2021
-        ),
-        key=partial(_size, graph=graph),
-    )
+    store = load_citation_graph()
+    years = np.asarray(store.years)
+    has_professors = np.diff(store.professor_offsets) > 0
+    store = store.subgraph((years >= 2015) & has_professors)
+    store = store.subgraph((store.in_degrees() + store.out_degrees()) > 0)
+    graph = get_networkx(store)
+
+    diversity = get_reachability(store).get_diversity(min_size=5)
+    candidates = np.flatnonzero(np.asarray(store.years) > 2021)
+    best = candidates[np.argmax(diversity[candidates])]
+    largest_component_nodes = store.pubmeds[get_descendants(store, best)].astype(str)
 
     largest_component = graph.subgraph(largest_component_nodes).copy()
 
@@ -59,22 +40,20 @@ def main():
     agraph.draw(OUT_SVG, prog="dot")
     agraph.draw(OUT_PNG, prog="dot")
 
-    # TODO do some graph analytics. what is the:
-    #  1. in-degree distribution,
-    #  2. out-degree distribution,
-    #  3. number of papers per year
-    #  4. Author frequency
-    #  5. build co-author network?
-    #  looking forward, doing joint disambiguation of authors
+    # degree distributions, papers per year, and author frequency are reported
+    # by bibliometrics.py, and the co-author network of disambiguated authors
+    # is built by coauthors.py
 
 
-def _size(nodes, graph):
-    if len(nodes) < 5:
-        return 0
-    professors = {
-        prof for node in nodes for prof in graph.nodes[node]["professors"].split(",")
-    }
-    return len(professors) / len(nodes)
+def get_networkx(store: CitationGraph) -> nx.DiGraph:
+    """Export the store, labelling nodes with their title, professors' last names, and year."""
+    graph = store.to_networkx()
+    for data in graph.nodes.values():
+        data["professors"] = ", ".join(
+            p.split()[-1] for p in data["professors"].split(",")
+        )
+        data["label"] = f"{data['title']}\n{data['professors']} ({data['year']})"
+    return graph
 
 
 def digraph_to_mermaid(graph: nx.DiGraph) -> str:
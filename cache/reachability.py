@@ -0,0 +1,272 @@
+"""Reachability over the citation graph without a search per node.
+
+Strongly connected components are found once with an iterative version of
+Tarjan's algorithm, which emits them in reverse topological order. Walking
+the condensation in that order, each component's descendants are the union of
+its successors' descendants, kept as a Python integer bitset with one bit per
+article. Articles are assigned bits by component, so a component's bitset only
+spans the bits of components emitted before it, and a bitset is dropped as
+soon as all of its predecessors have been processed. Descendant counts are
+popcounts of these bitsets and professor counts are popcounts of a second,
+much smaller bitset per component, so no Python sets are built.
+"""
+
+import time
+from dataclasses import dataclass
+
+import click
+import networkx as nx
+import numpy as np
+
+from citation_graph import (
+    CitationGraph,
+    _csr,
+    expand,
+    get_synthetic_citation_graph,
+    load_citation_graph,
+)
+
+
+def get_components(offsets: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    """Get the strongly connected component of each node of a graph in CSR format.
+
+    :returns: An array with the component of each node. Components are numbered
+        in reverse topological order, i.e., all components reachable from a
+        component have lower numbers.
+    """
+    n = len(offsets) - 1
+    offsets = offsets.tolist()
+    targets = targets.tolist()
+    index = [-1] * n
+    low = [0] * n
+    on_stack = [False] * n
+    labels = [-1] * n
+    stack: list[int] = []
+    counter = 0
+    n_components = 0
+    for root in range(n):
+        if index[root] != -1:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        work = [(root, offsets[root])]
+        while work:
+            node, edge = work[-1]
+            end = offsets[node + 1]
+            while edge < end:
+                child = targets[edge]
+                edge += 1
+                if index[child] == -1:
+                    work[-1] = (node, edge)
+                    index[child] = low[child] = counter
+                    counter += 1
+                    stack.append(child)
+                    on_stack[child] = True
+                    work.append((child, offsets[child]))
+                    break
+                if on_stack[child] and index[child] < low[node]:
+                    low[node] = index[child]
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = False
+                        labels[member] = n_components
+                        if member == node:
+                            break
+                    n_components += 1
+    return np.array(labels, dtype=np.int64)
+
+
+@dataclass(frozen=True)
+class Reachability:
+    """Descendant and professor counts for every node of a citation graph.
+
+    Like ``nx.descendants(graph, node) | {node}``, descendants include the
+    node itself.
+    """
+
+    #: node -> strongly connected component
+    components: np.ndarray
+    #: node -> number of descendants
+    descendant_counts: np.ndarray
+    #: node -> number of distinct professors over its descendants
+    professor_counts: np.ndarray
+
+    def get_diversity(self, min_size: int = 5) -> np.ndarray:
+        """Get the number of distinct professors per descendant for each node.
+
+        :param min_size: Nodes with fewer descendants than this get a score of zero
+        """
+        return np.where(
+            self.descendant_counts >= min_size,
+            self.professor_counts / self.descendant_counts,
+            0.0,
+        )
+
+
+def get_reachability(graph: CitationGraph) -> Reachability:
+    """Count the descendants and their distinct professors for every node."""
+    sources, targets = graph.edges()
+    components = get_components(
+        np.asarray(graph.out_offsets), np.asarray(graph.out_targets)
+    )
+    n_components = int(components.max()) + 1 if len(components) else 0
+
+    # bits are assigned by component, so each component's bits are contiguous
+    sizes = np.bincount(components, minlength=n_components)
+    starts = np.zeros(n_components, dtype=np.int64)
+    np.cumsum(sizes[:-1], out=starts[1:])
+
+    # the condensation, without self-loops or duplicate edges
+    pairs = np.unique(components[sources] * n_components + components[targets])
+    pair_sources, pair_targets = np.divmod(pairs, n_components)
+    keep = pair_sources != pair_targets
+    pair_sources, pair_targets = pair_sources[keep], pair_targets[keep]
+    offsets, successors = _csr(pair_sources, pair_targets, n_components)
+    remaining = np.bincount(pair_targets, minlength=n_components).tolist()
+
+    professor_masks = [0] * n_components
+    professor_nodes = np.repeat(
+        np.arange(graph.number_of_nodes), np.diff(graph.professor_offsets)
+    )
+    for component, professor in zip(
+        components[professor_nodes].tolist(),
+        np.asarray(graph.professor_ids).tolist(),
+        strict=True,
+    ):
+        professor_masks[component] |= 1 << professor
+
+    offsets = offsets.tolist()
+    successors = successors.tolist()
+    sizes = sizes.tolist()
+    starts = starts.tolist()
+    reach: list[int | None] = [None] * n_components
+    descendant_counts = [0] * n_components
+    professor_counts = [0] * n_components
+    for component in range(n_components):
+        bits = ((1 << sizes[component]) - 1) << starts[component]
+        mask = professor_masks[component]
+        for successor in successors[offsets[component] : offsets[component + 1]]:
+            bits |= reach[successor]
+            mask |= professor_masks[successor]
+            remaining[successor] -= 1
+            if not remaining[successor]:
+                reach[successor] = None
+        if remaining[component]:
+            reach[component] = bits
+        professor_masks[component] = mask
+        descendant_counts[component] = bits.bit_count()
+        professor_counts[component] = mask.bit_count()
+
+    return Reachability(
+        components=components,
+        descendant_counts=np.array(descendant_counts, dtype=np.int64)[components],
+        professor_counts=np.array(professor_counts, dtype=np.int64)[components],
+    )
+
+
+def get_descendants(graph: CitationGraph, node: int) -> np.ndarray:
+    """Get the sorted descendants of a node, including itself, with a breadth-first search."""
+    offsets = np.asarray(graph.out_offsets)
+    targets = np.asarray(graph.out_targets)
+    visited = np.zeros(graph.number_of_nodes, dtype=bool)
+    visited[node] = True
+    frontier = np.array([node])
+    while len(frontier):
+        positions, _ = expand(offsets, frontier)
+        frontier = np.unique(targets[positions])
+        frontier = frontier[~visited[frontier]]
+        visited[frontier] = True
+    return np.flatnonzero(visited)
+
+
+def _benchmark_networkx(
+    graph: CitationGraph, nodes: np.ndarray
+) -> tuple[float, list[tuple[int, int]]]:
+    digraph = nx.DiGraph()
+    digraph.add_nodes_from(range(graph.number_of_nodes))
+    digraph.add_edges_from(zip(*(a.tolist() for a in graph.edges()), strict=True))
+    start = time.perf_counter()
+    rv = []
+    for node in nodes.tolist():
+        descendants = nx.descendants(digraph, node) | {node}
+        professors = {
+            professor
+            for descendant in descendants
+            for professor in graph.get_professor_ids(descendant).tolist()
+        }
+        rv.append((len(descendants), len(professors)))
+    return time.perf_counter() - start, rv
+
+
+def _benchmark(graph: CitationGraph, nodes: np.ndarray, sample: int | None) -> None:
+    click.echo(
+        f"{graph.number_of_nodes:,} nodes, {graph.number_of_edges:,} edges, "
+        f"{len(nodes):,} query nodes"
+    )
+    start = time.perf_counter()
+    reachability = get_reachability(graph)
+    bitset_seconds = time.perf_counter() - start
+    click.echo(f"bitsets:  {bitset_seconds:.3f} s for all nodes")
+
+    n_queries = len(nodes)
+    if sample is not None and sample < n_queries:
+        rng = np.random.default_rng(0)
+        nodes = rng.choice(nodes, size=sample, replace=False)
+    networkx_seconds, expected = _benchmark_networkx(graph, nodes)
+    message = f"networkx: {networkx_seconds:.3f} s for {len(nodes):,} query nodes"
+    if len(nodes) < n_queries:
+        extrapolated = networkx_seconds / len(nodes) * n_queries
+        message += f" (~{extrapolated:.1f} s extrapolated to all query nodes)"
+    click.echo(message)
+    actual = list(
+        zip(
+            reachability.descendant_counts[nodes].tolist(),
+            reachability.professor_counts[nodes].tolist(),
+            strict=True,
+        )
+    )
+    if actual != expected:
+        raise click.ClickException("descendant or professor counts differ")
+
+
+@click.command()
+@click.option(
+    "--nodes", type=int, help="Benchmark on a synthetic graph with this many nodes"
+)
+@click.option("--edges", type=int, default=1_000_000, show_default=True)
+@click.option(
+    "--sample",
+    type=int,
+    default=200,
+    show_default=True,
+    help="The number of query nodes to run networkx on for synthetic graphs",
+)
+def main(nodes: int | None, edges: int, sample: int) -> None:
+    """Compare bitset reachability with networkx on the real or a synthetic graph."""
+    if nodes is None:
+        graph = load_citation_graph()
+        years = np.asarray(graph.years)
+        has_professors = np.diff(graph.professor_offsets) > 0
+        for label, subgraph in [
+            ("full graph", graph),
+            ("analysis subgraph", graph.subgraph((years >= 2015) & has_professors)),
+        ]:
+            click.echo(f"[{label}]")
+            queries = np.flatnonzero(np.asarray(subgraph.years) > 2021)
+            _benchmark(subgraph, queries, sample=None)
+    else:
+        graph = get_synthetic_citation_graph(nodes, edges)
+        queries = np.flatnonzero(np.asarray(graph.years) > 2021)
+        _benchmark(graph, queries, sample=sample)
+
+
+if __name__ == "__main__":
+    main()
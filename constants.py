@@ -1,7 +1,12 @@
+import os
 from pathlib import Path
 
 HERE = Path(__file__).parent.resolve()
-CURATION_DIR = HERE.joinpath("curation")
+#: can be overridden, e.g., to run against synthetic data (see synthetic.py)
+CURATION_DIR = Path(
+    os.environ.get("CATALAIX_CURATION_DIR") or HERE.joinpath("curation")
+)
+IMG_DIR = HERE.joinpath("img")
 LABS_PATH = CURATION_DIR.joinpath("labs.tsv")
 REACTIONS_PATH = CURATION_DIR.joinpath("reactions.tsv")
 REACTION_HIERARCHY_PATH = CURATION_DIR.joinpath("reaction_hierarchy.tsv")
@@ -9,3 +14,6 @@ CONDITIONS_PATH = CURATION_DIR.joinpath("conditions.tsv")
 MEMBERSHIPS_PATH = CURATION_DIR.joinpath("memberships.tsv")
 CLOSED_LOOPS_PATH = CURATION_DIR.joinpath("closed_loops.tsv")
 CHEMICAL_HIERARCHY_PATH = CURATION_DIR.joinpath("chemical_hierarchy.tsv")
+CLOSED_LOOP_MEMBERS_PATH = CURATION_DIR.joinpath("closed_loop_members.tsv")
+OUTPUT_DIR = Path(os.environ.get("CATALAIX_OUTPUT_DIR") or HERE.joinpath("output"))
+NAMES_PATH = OUTPUT_DIR.joinpath("names.sqlite")
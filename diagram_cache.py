@@ -0,0 +1,261 @@
+"""A content-addressed cache for reaction diagrams.
+
+Diagrams only depend on the curation data that goes into them and on the
+drawing options, so they are keyed by a hash of both. Recently used diagrams
+are kept in memory up to a byte budget, and all diagrams are kept on disk
+under ``output/diagrams/<version>/``, where the version is the one of the
+current curation data (see :attr:`snapshot.KGSnapshot.version`).
+
+When the current version changes, the in-memory tier is cleared and the
+directory of the previous version is removed. Requests still holding the
+previous snapshot during the swap get diagrams drawn or from memory, but
+never read or write the disk tier, so they can't bring back the previous
+version or remove the directory of the new one.
+
+Diagrams that aren't cached are drawn in a bounded pool of worker threads.
+Concurrent requests for the same diagram share one drawing, and new drawings
+are refused with :class:`DiagramQueueFull` when too many are already waiting,
+so a burst of requests for a popular entity can't pile up graphviz processes.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any
+
+import pandas as pd
+
+from draw import OUTPUT, draw
+
+DIAGRAM_CACHE_DIR = OUTPUT.joinpath("diagrams")
+
+logger = logging.getLogger(__name__)
+
+#: the data frame arguments of :func:`draw.draw`
+FRAME_KEYS = (
+    "labs_df",
+    "reactions_df",
+    "conditions_df",
+    "reaction_hierarchy_df",
+    "chemical_hierarchy_df",
+)
+
+
+def get_diagram_key(**kwargs: Any) -> str:
+    """Get a key for the arguments to :func:`draw.draw` from a hash of their contents."""
+    hasher = hashlib.sha256()
+    for key in FRAME_KEYS:
+        df = kwargs.pop(key)
+        hasher.update(key.encode())
+        hasher.update(",".join(map(str, df.columns)).encode())
+        hasher.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    hasher.update(json.dumps(kwargs, sort_keys=True, default=str).encode())
+    return hasher.hexdigest()
+
+
+class DiagramQueueFull(RuntimeError):
+    """Raised when too many diagrams are already waiting to be drawn."""
+
+
+class DiagramCache:
+    """A two-tier cache for diagrams drawn with :func:`draw.draw`."""
+
+    def __init__(
+        self,
+        get_version: Callable[[], str],
+        directory: Path = DIAGRAM_CACHE_DIR,
+        *,
+        max_bytes: int = 64 * 1024**2,
+        max_workers: int = 2,
+        max_pending: int = 32,
+    ) -> None:
+        """Instantiate the cache.
+
+        :param get_version: Gets the version of the current curation data,
+            e.g., from a :class:`snapshot.SnapshotStore`
+        :param directory: The directory for the disk tier
+        :param max_bytes: The budget for the in-memory tier
+        :param max_workers: The number of diagrams drawn at the same time
+        :param max_pending: The number of diagrams that can be drawing or
+            waiting to be drawn before new ones are refused
+        """
+        self.get_version = get_version
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._memory_bytes = 0
+        self._pending: dict[str, Future[bytes]] = {}
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="diagram"
+        )
+        self.version = ""
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+        self.rejected = 0
+
+    def _update_version(self) -> str:
+        """Move to the version of the current curation data, and get it."""
+        version = self.get_version()
+        with self._lock:
+            if version == self.version:
+                return version
+            previous, self.version = self.version, version
+            self._memory.clear()
+            self._memory_bytes = 0
+        if previous:
+            # drawings of the previous version might still be writing into
+            # it, which _draw tolerates
+            shutil.rmtree(self.directory.joinpath(previous), ignore_errors=True)
+        return version
+
+    def prune(self) -> None:
+        """Remove the disk tiers of all versions but the current one.
+
+        This should only be called when no other process is using the disk
+        tier, e.g., before a server forks its workers.
+        """
+        version = self._update_version()
+        if self.directory.is_dir():
+            for path in self.directory.iterdir():
+                if path.is_dir() and path.name != version:
+                    shutil.rmtree(path, ignore_errors=True)
+
+    def _get_path(self, version: str, key: str, format: str) -> Path:
+        return self.directory.joinpath(version, key[:2], f"{key}.{format}")
+
+    def _remember(self, key: str, value: bytes) -> None:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return
+            self._memory[key] = value
+            self._memory_bytes += len(value)
+            while self._memory_bytes > self.max_bytes and len(self._memory) > 1:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+                self.evictions += 1
+
+    def _draw(self, key: str, path: Path | None, kwargs: dict[str, Any]) -> bytes:
+        try:
+            value = draw(**kwargs)
+            self._remember(key, value)
+            if path is not None:
+                try:
+                    _write(path, value)
+                except OSError as e:
+                    # e.g., the version's directory was removed after a swap
+                    logger.warning("could not cache diagram in %s: %s", path, e)
+            return value
+        finally:
+            with self._lock:
+                del self._pending[key]
+
+    def submit(self, *, version: str, **kwargs: Any) -> Future[bytes]:
+        """Get a diagram from the cache, or start drawing it with :func:`draw.draw`.
+
+        :param version: The version of the curation data the arguments come
+            from. If it isn't the current version, the disk tier is bypassed.
+        :param kwargs: Arguments for :func:`draw.draw`
+        :returns: A future for the diagram's bytes. If the diagram is already
+            being drawn, the future of that drawing is returned.
+        :raises DiagramQueueFull: If the diagram isn't cached and
+            ``max_pending`` diagrams are already drawing or waiting to be drawn
+        """
+        current = version == self._update_version()
+        key = get_diagram_key(**kwargs)
+
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return _get_done_future(value)
+            future = self._pending.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future
+
+        path = (
+            self._get_path(version, key, kwargs.get("format", "png"))
+            if current
+            else None
+        )
+        if path is not None and path.is_file():
+            value = path.read_bytes()
+            with self._lock:
+                self.disk_hits += 1
+            self._remember(key, value)
+            return _get_done_future(value)
+
+        with self._lock:
+            # another thread might have started drawing while reading the disk
+            future = self._pending.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future
+            if len(self._pending) >= self.max_pending:
+                self.rejected += 1
+                raise DiagramQueueFull
+            self.misses += 1
+            # the lock is held, so the drawing can't remove itself before it's added
+            future = self._pending[key] = self._executor.submit(
+                self._draw, key, path, kwargs
+            )
+        return future
+
+    def draw(
+        self, *, version: str, timeout: float | None = None, **kwargs: Any
+    ) -> bytes:
+        """Get a diagram from the cache, or draw it with :func:`draw.draw` and cache it.
+
+        :param version: The version of the curation data the arguments come from
+        :param timeout: The number of seconds to wait for the diagram to be drawn
+        :param kwargs: Arguments for :func:`draw.draw`
+        :returns: The diagram's bytes
+        :raises DiagramQueueFull: If too many diagrams are waiting to be drawn
+        :raises TimeoutError: If the diagram isn't drawn within the timeout
+        """
+        return self.submit(version=version, **kwargs).result(timeout)
+
+    def stats(self) -> dict[str, int | str]:
+        """Get hit/miss counters and the size of the in-memory tier."""
+        with self._lock:
+            return {
+                "version": self.version,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "coalesced": self.coalesced,
+                "rejected": self.rejected,
+                "pending": len(self._pending),
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+def _write(path: Path, value: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as file:
+        file.write(value)
+    os.replace(file.name, path)
+
+
+def _get_done_future(value: bytes) -> Future[bytes]:
+    future: Future[bytes] = Future()
+    future.set_result(value)
+    return future
@@ -5,32 +5,36 @@
 #     "pandas>=3.0.0",
 #     "pygraphviz>=1.14",
 #     "pystow>=0.7.15",
+#     "tqdm>=4.67.2",
 # ]
 # ///
 
 """Create a diagram with the reaction network."""
 
 import base64
+import hashlib
+import html
+import json
+import logging
+import re
 import textwrap
 from collections import defaultdict
-from typing import Literal, Any
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Literal
 
 import pandas as pd
-from pathlib import Path
-from pystow.utils import download
 import pygraphviz as pgv
-import cairosvg
-from constants import (
-    HERE,
-    REACTIONS_PATH,
-    REACTION_HIERARCHY_PATH,
-    CONDITIONS_PATH,
-    LABS_PATH,
-    CHEMICAL_HIERARCHY_PATH,
-)
-
-IMG = HERE.joinpath("img")
-OUTPUT = HERE.joinpath("output")
+from tqdm import tqdm
+
+from constants import OUTPUT_DIR
+from metrics import increment, span
+from prefetch import get_png_path, prefetch
+from snapshot import get_snapshot
+
+OUTPUT = OUTPUT_DIR
+
+logger = logging.getLogger(__name__)
 
 HIGHLIGHT = {
     "CHEBI:53259",  # PET
@@ -40,39 +44,157 @@ HIGHLIGHT = {
 }
 
 
+#: fingerprints of the kingdom diagrams written by :func:`main`
+MANIFEST_PATH = OUTPUT.joinpath("kingdoms.json")
+
+
 def main(
     *,
     add_reagent: bool = False,
     add_output_2: bool = False,
     group_closed_loop: bool = True,
     direction: Literal["LR", "TD"] = "LR",
-) -> None:
-    conditions_df = pd.read_csv(CONDITIONS_PATH, sep="\t")
-    labs_df = pd.read_csv(LABS_PATH, sep="\t")
-    reactions_df = pd.read_csv(REACTIONS_PATH, sep="\t")
-    reaction_hierarchy_df = pd.read_csv(REACTION_HIERARCHY_PATH, sep="\t")
-    chemical_hierarchy_df = pd.read_csv(CHEMICAL_HIERARCHY_PATH, sep="\t")
+    max_workers: int | None = None,
+    force: bool = False,
+    download_images: bool = False,
+) -> list[str]:
+    """Draw the reaction network of each kingdom to ``output/<kingdom>.png``.
+
+    Kingdoms are drawn in a pool of worker processes. Each kingdom's diagram
+    has a fingerprint of the data drawn in it, stored in ``output/kingdoms.json``,
+    and kingdoms whose fingerprint didn't change since the last run are skipped.
+
+    :param max_workers: The number of worker processes
+    :param force: Re-draw all kingdoms, even if their data didn't change
+    :param download_images: Download missing structure images with
+        :func:`prefetch.prefetch` first, instead of drawing molecules without
+        one
+    :returns: The kingdoms that were drawn
+    """
+    from diagram_cache import get_diagram_key
+
+    # the compiled snapshot if it's up to date, otherwise the TSVs
+    kg = get_snapshot()
+    conditions_df = kg.conditions_df
+    labs_df = kg.labs_df
+    reactions_df = kg.reactions_df
+    reaction_hierarchy_df = kg.reaction_hierarchy_df
+    chemical_hierarchy_df = kg.chemical_hierarchy_df
+
+    if download_images:
+        prefetch()
+
+    options = {
+        "add_reagent": add_reagent,
+        "add_output_2": add_output_2,
+        "group_closed_loop": group_closed_loop,
+        "direction": direction,
+    }
+    code = hashlib.sha256(Path(__file__).read_bytes()).hexdigest()
+    previous = {}
+    if MANIFEST_PATH.is_file():
+        previous = json.loads(MANIFEST_PATH.read_text())
+    manifest = {} if force else previous
 
+    fingerprints: dict[str, str] = {}
+    stale: list[dict[str, Any]] = []
     for kingdom, kingdom_df in reactions_df.groupby("kingdom"):
-        draw(
+        frames = get_kingdom_frames(
+            kingdom_df,
             labs_df=labs_df,
-            reactions_df=kingdom_df,
             conditions_df=conditions_df,
             reaction_hierarchy_df=reaction_hierarchy_df,
             chemical_hierarchy_df=chemical_hierarchy_df,
-            add_reagent=add_reagent,
-            add_output_2=add_output_2,
-            group_closed_loop=group_closed_loop,
-            direction=direction,
-            output=OUTPUT.joinpath(f"{kingdom}.png"),
         )
+        # diagrams show the prefetched molecule images that exist
+        images = sorted(
+            curie
+            for curie in _get_curies(kingdom_df)
+            if curie.startswith("CHEBI:")
+            and get_png_path(curie.removeprefix("CHEBI:")).is_file()
+        )
+        hasher = hashlib.sha256(code.encode())
+        hasher.update(get_diagram_key(**frames, **options).encode())
+        hasher.update(json.dumps(images).encode())
+        fingerprints[kingdom] = fingerprint = hasher.hexdigest()
+        output = OUTPUT.joinpath(f"{kingdom}.png")
+        if manifest.get(kingdom) != fingerprint or not output.is_file():
+            stale.append({**frames, **options, "output": output})
+
+    failed = set()
+    if stale:
+        with ProcessPoolExecutor(max_workers) as executor:
+            futures = {
+                executor.submit(draw, **kwargs): kwargs["output"].stem
+                for kwargs in stale
+            }
+            for future in tqdm(
+                as_completed(futures),
+                total=len(futures),
+                desc="Drawing kingdoms",
+                unit="kingdom",
+            ):
+                if future.exception() is not None:
+                    # failed kingdoms are retried by the next run
+                    logger.warning(
+                        "failed to draw %s: %s", futures[future], future.exception()
+                    )
+                    failed.add(futures[future])
+
+    # only kingdoms that are no longer in the data are removed. failed
+    # kingdoms keep their last good diagram and its stale fingerprint
+    for kingdom in set(previous) - set(fingerprints):
+        OUTPUT.joinpath(f"{kingdom}.png").unlink(missing_ok=True)
+    for kingdom in failed:
+        if kingdom in previous:
+            fingerprints[kingdom] = previous[kingdom]
+        else:
+            del fingerprints[kingdom]
+    MANIFEST_PATH.write_text(json.dumps(fingerprints, indent=2, sort_keys=True))
+    return sorted(
+        kwargs["output"].stem for kwargs in stale if kwargs["output"].stem not in failed
+    )
 
 
-def draw_bytes(*args: Any, **kwargs: Any) -> str:
-    diagram_bytes = draw(*args, **kwargs)
-    b64_bytes = base64.b64encode(diagram_bytes)
-    b64_str = b64_bytes.decode("ascii")
-    return b64_str
+def _get_curies(reactions_df: pd.DataFrame) -> set[str]:
+    return {
+        curie
+        for curie in reactions_df[
+            ["input", "output", "output 2", "reagent"]
+        ].values.ravel()
+        if pd.notna(curie)
+    }
+
+
+def get_kingdom_frames(
+    reactions_df: pd.DataFrame,
+    *,
+    labs_df: pd.DataFrame,
+    conditions_df: pd.DataFrame,
+    reaction_hierarchy_df: pd.DataFrame,
+    chemical_hierarchy_df: pd.DataFrame,
+) -> dict[str, pd.DataFrame]:
+    """Get the rows of each data frame that can appear in a drawing of some reactions.
+
+    Drawing the subsets with :func:`draw` gives the same diagram as drawing the
+    whole data frames, so they can be used to fingerprint a diagram.
+    """
+    reactions = set(reactions_df["reaction"])
+    curies = _get_curies(reactions_df)
+    conditions_df = conditions_df[conditions_df["reaction"].isin(reactions)]
+    return {
+        "labs_df": labs_df[labs_df["group"].isin(conditions_df["group"])],
+        "reactions_df": reactions_df,
+        "conditions_df": conditions_df,
+        "reaction_hierarchy_df": reaction_hierarchy_df[
+            reaction_hierarchy_df.iloc[:, 0].isin(reactions)
+            & reaction_hierarchy_df.iloc[:, 1].isin(reactions)
+        ],
+        "chemical_hierarchy_df": chemical_hierarchy_df[
+            chemical_hierarchy_df["child"].isin(curies)
+            & chemical_hierarchy_df["parent"].isin(curies)
+        ],
+    }
 
 
 def draw(
@@ -89,7 +211,17 @@ def draw(
     draw_chemical_hierarchy: bool = True,
     direction: Literal["LR", "TD"] = "LR",
     output: Path | None = None,
-) -> None | str:
+    format: Literal["png", "svg"] = "png",
+) -> None | bytes:
+    """Draw the reaction network with graphviz.
+
+    :param format: Draw a PNG, or an SVG in which each molecule image is
+        embedded once and referenced by every node that shows it (see
+        :func:`share_images`). SVGs are smaller and skip rasterizing the
+        whole network.
+    :param output: The file to write to. If not given, the diagram's bytes
+        are returned.
+    """
     lab_id_to_name = {
         group_id: professor.split(" ", maxsplit=1)[1]
         for group_id, professor in labs_df[["group", "Professor"]].values
@@ -132,29 +264,24 @@ def draw(
     add_node_for = {curie for curies in reactions_df[keep].values for curie in curies}
 
     for curie, name in curies.items():
-        if not curie.startswith("CHEBI:"):
-            png_path = None
-        else:
-            chebi_id = curie.removeprefix("CHEBI:")
-            svg_path = IMG.joinpath(f"chebi_{chebi_id}.svg")
-            png_path = IMG.joinpath(f"chebi_{chebi_id}.png")
-            url = f"https://www.ebi.ac.uk/chebi/backend/api/public/compound/{chebi_id}/structure/?width=300&height=300"
-            if not svg_path.is_file():
-                download(url, svg_path)
+        if curie.startswith("CHEBI:"):
+            # images are downloaded ahead of time by prefetch.py, so never
+            # hit the network here
+            png_path = get_png_path(curie.removeprefix("CHEBI:"))
             if not png_path.is_file():
-                cairosvg.svg2png(
-                    url=svg_path.as_posix(),
-                    write_to=png_path.as_posix(),
-                    output_width=256,  # optional
-                    output_height=256,  # optional
-                    scale=3.125,
-                )
-        if curie in add_node_for:
-            node_attrs = dict(
-                label=textwrap.fill(name, 30) if pd.notna(name) else "???",
-                labelloc="b",
-                shape="box",
+                png_path = None
+            increment(
+                "catalaix_diagram_images_total",
+                prefetched=str(png_path is not None).lower(),
             )
+        else:
+            png_path = None
+        if curie in add_node_for:
+            node_attrs = {
+                "label": textwrap.fill(name, 30) if pd.notna(name) else "???",
+                "labelloc": "b",
+                "shape": "box",
+            }
             if png_path is not None:
                 node_attrs["image"] = png_path
             if curie in HIGHLIGHT:
@@ -210,7 +337,64 @@ def draw(
             if child in graph and parent in graph:
                 graph.add_edge(child, parent, label="is a")
 
-    return graph.draw(output, format="png", prog="dot")
+    increment("catalaix_graphviz_invocations_total", format=format)
+    with span("graphviz"):
+        if format == "png":
+            return graph.draw(output, format="png", prog="dot")
+        value = share_images(graph.draw(format="svg", prog="dot"))
+    if output is None:
+        return value
+    output.write_bytes(value)
+    return None
+
+
+IMAGE_RE = re.compile(rb"<image\b([^>]*?)/>")
+ATTRIBUTE_RE = re.compile(rb'([\w:-]+)="([^"]*)"')
+#: attributes of graphviz's ``<image>`` elements that position each use
+POSITION_ATTRIBUTES = {b"x", b"y", b"transform"}
+
+
+def share_images(svg: bytes) -> bytes:
+    """Embed each image of an SVG drawn by graphviz once and reference it.
+
+    Graphviz links images by their file path, which can't be resolved by a
+    browser, once per node. Each distinct image is instead defined once in
+    ``<defs>`` as a data URI and every node shows it with ``<use>``, so the
+    SVG is self-contained and a molecule that appears on many nodes only
+    costs its bytes once.
+    """
+    definitions: dict[bytes, bytes] = {}
+
+    def _replace(match: re.Match) -> bytes:
+        attributes = dict(ATTRIBUTE_RE.findall(match.group(1)))
+        href = attributes.pop(b"xlink:href", None) or attributes.pop(b"href", None)
+        if href is None:
+            return match.group(0)
+        position = {
+            key: attributes.pop(key)
+            for key in list(attributes)
+            if key in POSITION_ATTRIBUTES
+        }
+        shared = b" ".join(b'%s="%s"' % item for item in sorted(attributes.items()))
+        key = href + b"\0" + shared
+        if key not in definitions:
+            path = Path(html.unescape(href.decode()))
+            value = base64.b64encode(path.read_bytes())
+            definitions[key] = (
+                b'<image id="image%d" xlink:href="data:image/png;base64,%s" %s/>'
+                % (len(definitions), value, shared)
+            )
+        identifier = definitions[key].split(b'"', 2)[1]
+        position_text = b"".join(b' %s="%s"' % item for item in position.items())
+        return b'<use xlink:href="#%s"%s/>' % (identifier, position_text)
+
+    svg = IMAGE_RE.sub(_replace, svg)
+    if not definitions:
+        return svg
+    # graphviz writes the root element's attributes over several lines
+    end = svg.index(b">", svg.index(b"<svg")) + 1
+    defs = b"\n<defs>\n" + b"\n".join(definitions.values()) + b"\n</defs>"
+    return svg[:end] + defs + svg[end:]
 
 
 if __name__ == "__main__":
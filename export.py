@@ -0,0 +1,380 @@
+# /// script
+# requires-python = ">=3.14"
+# dependencies = [
+#     "bootstrap-flask>=2.5.0",
+#     "cairosvg>=2.8.2",
+#     "click>=8.1.0",
+#     "flask>=3.1.2",
+#     "pandas>=3.0.0",
+#     "pygraphviz>=1.14",
+#     "pystow>=0.7.15",
+#     "tqdm>=4.67.2",
+# ]
+# ///
+
+"""Export every page of the web application as a static site.
+
+Pages are rendered through the Flask application in a pool of worker
+processes and written to ``output/site/<route>/index.html``, so the site can
+be served by any static file server. Diagrams linked from pages are fetched,
+written once each to ``output/site/diagrams/``, and the links are rewritten to
+point to them.
+
+Each page has a fingerprint of the data it's rendered from, e.g., the
+conditions and reactions of an entity, stored in ``output/site/manifest.json``.
+Pages whose fingerprint didn't change since the last export are skipped, so
+editing one reaction only re-renders the pages that show it.
+
+Static file servers ignore query strings, so the variants of catalyst and
+entity pages that include subclasses (``?descendants=1``) are written to
+``<route>/descendants/index.html`` and links to them are rewritten. There's
+no search page, so exported pages don't have the search form.
+"""
+
+import hashlib
+import html
+import json
+import logging
+import os
+import re
+import tempfile
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import click
+import pandas as pd
+from tqdm import tqdm
+
+from constants import (
+    CHEMICAL_HIERARCHY_PATH,
+    HERE,
+    IMG_DIR,
+    LABS_PATH,
+    OUTPUT_DIR,
+    REACTION_HIERARCHY_PATH,
+)
+from index import EMPTY, union
+
+SITE_DIR = OUTPUT_DIR.joinpath("site")
+DIAGRAMS_DIRNAME = "diagrams"
+MANIFEST_NAME = "manifest.json"
+
+logger = logging.getLogger(__name__)
+
+#: files whose changes affect every page
+CODE_PATHS = (
+    HERE.joinpath("wsgi.py"),
+    HERE.joinpath("draw.py"),
+    *sorted(HERE.joinpath("templates").glob("*.html")),
+)
+
+#: links to diagrams served by :func:`wsgi.get_entity_diagram`
+DIAGRAM_URL_RE = re.compile(r'src="(/entity/[^"]+\.svg(?:\?[^"]*)?)"')
+#: the query of pages that include the subclasses of a catalyst or entity
+DESCENDANTS_QUERY = "descendants=1"
+#: links to pages that include subclasses
+DESCENDANTS_URL_RE = re.compile(
+    rf'href="(/(?:catalyst|entity)/[^"?]+)\?{DESCENDANTS_QUERY}"'
+)
+
+
+@dataclass(frozen=True)
+class Page:
+    """A page of the web application."""
+
+    #: the route, e.g., ``/entity/CHEBI:1234``
+    path: str
+    #: a hash of everything the page is rendered from
+    fingerprint: str
+
+
+def _hash(*parts: Any) -> str:
+    hasher = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, pd.DataFrame):
+            hasher.update(",".join(map(str, part.columns)).encode())
+            hasher.update(pd.util.hash_pandas_object(part).values.tobytes())
+        else:
+            hasher.update(json.dumps(part, sort_keys=True, default=str).encode())
+        hasher.update(b"\0")
+    return hasher.hexdigest()
+
+
+def _get_variants(kg, route: str, curie: str) -> list[tuple[str, list[str]]]:
+    """Get the routes of a catalyst or entity page and the CURIEs each one shows."""
+    rv = [(route, [curie])]
+    if kg.chemical_hierarchy.has_descendants(curie):
+        rv.append(
+            (
+                f"{route}?{DESCENDANTS_QUERY}",
+                kg.chemical_hierarchy.get_descendants(curie),
+            )
+        )
+    return rv
+
+
+def get_pages(kg, names) -> list[Page]:
+    """Get all pages of the web application with fingerprints of their inputs.
+
+    :param kg: A :class:`snapshot.KGSnapshot`
+    :param names: A :class:`names.NameTable`
+    """
+    index = kg.index
+    code = _hash(
+        *(hashlib.sha256(path.read_bytes()).hexdigest() for path in CODE_PATHS)
+    )
+    # diagrams embed the prefetched molecule images that exist
+    images = _hash(sorted(path.name for path in IMG_DIR.glob("*.png")))
+    diagram_files = [
+        kg.file_hashes[path.name]
+        for path in (LABS_PATH, REACTION_HIERARCHY_PATH, CHEMICAL_HIERARCHY_PATH)
+    ]
+    # decides which pages link to a variant including subclasses
+    chemical_hierarchy_file = kg.file_hashes[CHEMICAL_HIERARCHY_PATH.name]
+
+    def _conditions(positions) -> pd.DataFrame:
+        return kg.conditions_df.iloc[positions]
+
+    def _reactions(positions) -> pd.DataFrame:
+        return kg.reactions_df.iloc[positions]
+
+    pages = [
+        Page("/", _hash(code, kg.version)),
+        Page("/person/", _hash(code, kg.people)),
+    ]
+    for orcid, name in sorted(kg.people.items()):
+        pages.append(
+            Page(
+                f"/person/{orcid}",
+                _hash(
+                    code,
+                    name,
+                    _conditions(index.chemist_to_conditions.get(orcid, EMPTY)),
+                    kg.labs_df.iloc[index.get_groups(orcid)],
+                ),
+            )
+        )
+    for group in sorted(index.group_to_lab):
+        pages.append(
+            Page(
+                f"/group/{group}",
+                _hash(
+                    code,
+                    kg.labs_df.iloc[[index.group_to_lab[group]]],
+                    kg.memberships_df.iloc[
+                        index.group_to_memberships.get(group, EMPTY)
+                    ],
+                    _conditions(index.group_to_conditions.get(group, EMPTY)),
+                ),
+            )
+        )
+    for curie in sorted(index.catalyst_to_conditions):
+        if curie == "no catalyst":
+            continue
+        for route, curies in _get_variants(kg, f"/catalyst/{curie}", curie):
+            pages.append(
+                Page(
+                    route,
+                    _hash(
+                        code,
+                        chemical_hierarchy_file,
+                        names.get_name(curie),
+                        names.get_definition(curie),
+                        _conditions(union(index.catalyst_to_conditions, curies)),
+                    ),
+                )
+            )
+    entities = set(index.input_to_reactions).union(
+        index.output_to_reactions,
+        index.input_to_conditions,
+        index.output_to_conditions,
+    )
+    for curie in sorted(entities):
+        for route, curies in _get_variants(kg, f"/entity/{curie}", curie):
+            pages.append(
+                Page(
+                    route,
+                    _hash(
+                        code,
+                        images,
+                        diagram_files,
+                        names.get_name(curie),
+                        names.get_definition(curie),
+                        _reactions(union(index.input_to_reactions, curies)),
+                        _conditions(union(index.input_to_conditions, curies)),
+                        _reactions(union(index.output_to_reactions, curies)),
+                        _conditions(union(index.output_to_conditions, curies)),
+                    ),
+                )
+            )
+    return pages
+
+
+def get_page_path(directory: Path, path: str) -> Path:
+    """Get the file a route is written to."""
+    route, _, query = path.partition("?")
+    if query == DESCENDANTS_QUERY:
+        route = f"{route}/descendants"
+    return directory.joinpath(route.strip("/"), "index.html")
+
+
+def _write(path: Path, value: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as file:
+        file.write(value)
+    # temporary files are only readable by their owner
+    os.chmod(file.name, 0o644)
+    os.replace(file.name, path)
+
+
+_CLIENT = None
+
+
+def _initialize() -> None:
+    global _CLIENT
+    from wsgi import app
+
+    # static sites can't serve the search page, so pages don't link to it
+    app.config["STATIC_EXPORT"] = True
+    _CLIENT = app.test_client()
+
+
+def _render(path: str, directory: Path) -> tuple[str, list[str] | None]:
+    """Render a page in a worker, write it and its diagrams, and get their names.
+
+    :returns: The route and the names of its diagrams, or ``None`` if it failed
+    """
+    response = _CLIENT.get(path)
+    if response.status_code != 200:
+        return path, None
+    images = []
+
+    def _replace(match: re.Match) -> str:
+        diagram_response = _CLIENT.get(html.unescape(match.group(1)))
+        if diagram_response.status_code != 200:
+            raise ValueError(f"failed to render {match.group(1)}")
+        value = diagram_response.get_data()
+        name = f"{hashlib.sha256(value).hexdigest()}.svg"
+        image_path = directory.joinpath(DIAGRAMS_DIRNAME, name)
+        if not image_path.is_file():
+            _write(image_path, value)
+        images.append(name)
+        return f'src="/{DIAGRAMS_DIRNAME}/{name}"'
+
+    try:
+        text = DIAGRAM_URL_RE.sub(_replace, response.get_data(as_text=True))
+    except ValueError:
+        return path, None
+    text = DESCENDANTS_URL_RE.sub(r'href="\1/descendants/"', text)
+    _write(get_page_path(directory, path), text.encode("utf-8"))
+    return path, images
+
+
+def _read_manifest(directory: Path) -> dict[str, dict[str, Any]]:
+    path = directory.joinpath(MANIFEST_NAME)
+    if not path.is_file():
+        return {}
+    return json.loads(path.read_text())
+
+
+def export(
+    directory: Path = SITE_DIR,
+    *,
+    pages: Iterable[Page] | None = None,
+    max_workers: int | None = None,
+    force: bool = False,
+    progress: bool = True,
+) -> list[str]:
+    """Render changed pages to static files.
+
+    :param directory: The directory to write the site to
+    :param pages: The pages to export. Defaults to all pages from :func:`get_pages`.
+    :param max_workers: The number of worker processes
+    :param force: Re-render all pages, even if their inputs didn't change
+    :param progress: Show a progress bar
+    :returns: The routes that were rendered
+    """
+    if pages is None:
+        from wsgi import NAMES, STORE
+
+        pages = get_pages(STORE.get(), NAMES)
+    pages = list(pages)
+    previous = _read_manifest(directory)
+    manifest = {} if force else previous
+    stale = [
+        page
+        for page in pages
+        if manifest.get(page.path, {}).get("fingerprint") != page.fingerprint
+        or not get_page_path(directory, page.path).is_file()
+    ]
+
+    rendered = {}
+    if stale:
+        with ProcessPoolExecutor(max_workers, initializer=_initialize) as executor:
+            results = executor.map(
+                _render,
+                [page.path for page in stale],
+                [directory] * len(stale),
+                chunksize=4,
+            )
+            for path, images in tqdm(
+                results,
+                total=len(stale),
+                desc="Exporting pages",
+                unit="page",
+                disable=not progress,
+            ):
+                if images is None:
+                    logger.warning("failed to render %s", path)
+                else:
+                    rendered[path] = images
+
+    fingerprints = {page.path: page.fingerprint for page in pages}
+    for path in set(previous) - set(fingerprints):
+        get_page_path(directory, path).unlink(missing_ok=True)
+    failed = {page.path for page in stale} - set(rendered)
+    new_manifest = {
+        path: {
+            "fingerprint": fingerprint,
+            "images": rendered.get(path, manifest.get(path, {}).get("images", [])),
+        }
+        for path, fingerprint in fingerprints.items()
+        # failed pages are retried by the next export
+        if path not in failed
+    }
+
+    # remove diagrams that no page references anymore. the previous HTML of
+    # failed pages is still on disk, so their previous diagrams are kept
+    referenced = {name for entry in new_manifest.values() for name in entry["images"]}
+    for path in failed:
+        referenced.update(previous.get(path, {}).get("images", []))
+    diagrams_dir = directory.joinpath(DIAGRAMS_DIRNAME)
+    if diagrams_dir.is_dir():
+        for path in diagrams_dir.iterdir():
+            if path.name not in referenced:
+                path.unlink()
+
+    _write(
+        directory.joinpath(MANIFEST_NAME),
+        json.dumps(new_manifest, indent=2, sort_keys=True).encode("utf-8"),
+    )
+    return sorted(rendered)
+
+
+@click.command()
+@click.option("--directory", type=Path, default=SITE_DIR, show_default=True)
+@click.option("--max-workers", type=int, help="Defaults to the number of CPUs")
+@click.option(
+    "--force", is_flag=True, help="Re-render pages whose inputs didn't change"
+)
+def main(directory: Path, max_workers: int | None, force: bool) -> None:
+    """Export the web application as a static site."""
+    rendered = export(directory, max_workers=max_workers, force=force)
+    click.echo(f"rendered {len(rendered):,} pages to {directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+"""Settings for serving the web application with several worker processes.
+
+Run with ``uvx gunicorn --config gunicorn.conf.py wsgi:app``. The application
+is imported and :func:`wsgi.preload` is called once in the server process
+before it forks its workers, so workers share the curation data, indexes, and
+names copy-on-write instead of each loading their own.
+"""
+
+import os
+
+bind = os.environ.get("CATALAIX_BIND", "0.0.0.0:5004")
+workers = int(os.environ.get("WEB_CONCURRENCY", "4"))
+#: requests for diagrams wait for graphviz, so each worker serves several
+threads = int(os.environ.get("CATALAIX_THREADS", "4"))
+preload_app = True
+
+
+def when_ready(server) -> None:
+    """Preload shared data after importing the application and before forking."""
+    import wsgi
+
+    wsgi.preload()
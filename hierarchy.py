@@ -0,0 +1,130 @@
+"""Transitive closures of the reaction and chemical hierarchies.
+
+The hierarchies are directed acyclic graphs of "is a" edges, in which a term
+can have several parents, so each term's descendants and ancestors are kept as
+Python integer bitsets with one bit per term. They're computed once by walking
+the terms in topological order, so a subsumption query is a single bit test
+and getting all descendants of a class doesn't recurse through the hierarchy.
+"""
+
+from collections.abc import Hashable, Iterable
+from dataclasses import dataclass
+from graphlib import TopologicalSorter
+
+import pandas as pd
+
+
+def _get_terms(bits: int, terms: tuple) -> list:
+    rv = []
+    while bits:
+        lowest = bits & -bits
+        rv.append(terms[lowest.bit_length() - 1])
+        bits ^= lowest
+    return rv
+
+
+@dataclass(frozen=True)
+class Hierarchy:
+    """The ancestors and descendants of each term of a hierarchy."""
+
+    #: terms, in the order of their bits
+    terms: tuple
+    #: term -> its bit
+    term_to_bit: dict[Hashable, int]
+    #: bitsets of the descendants of each term, including itself
+    descendant_bits: tuple[int, ...]
+    #: bitsets of the ancestors of each term, including itself
+    ancestor_bits: tuple[int, ...]
+
+    def __contains__(self, term: Hashable) -> bool:
+        return term in self.term_to_bit
+
+    def is_a(self, child: Hashable, parent: Hashable) -> bool:
+        """Check if a term is the same as or a descendant of another term."""
+        if child == parent:
+            return True
+        child_bit = self.term_to_bit.get(child)
+        parent_bit = self.term_to_bit.get(parent)
+        if child_bit is None or parent_bit is None:
+            return False
+        return bool(self.descendant_bits[parent_bit] >> child_bit & 1)
+
+    def get_descendants(self, term: Hashable, *, include_self: bool = True) -> list:
+        """Get the descendants of a term.
+
+        Terms that aren't in the hierarchy have no descendants.
+        """
+        bit = self.term_to_bit.get(term)
+        if bit is None:
+            return [term] if include_self else []
+        bits = self.descendant_bits[bit]
+        if not include_self:
+            bits &= ~(1 << bit)
+        return _get_terms(bits, self.terms)
+
+    def get_ancestors(self, term: Hashable, *, include_self: bool = True) -> list:
+        """Get the ancestors of a term.
+
+        Terms that aren't in the hierarchy have no ancestors.
+        """
+        bit = self.term_to_bit.get(term)
+        if bit is None:
+            return [term] if include_self else []
+        bits = self.ancestor_bits[bit]
+        if not include_self:
+            bits &= ~(1 << bit)
+        return _get_terms(bits, self.terms)
+
+    def has_descendants(self, term: Hashable) -> bool:
+        """Check if a term has any descendants other than itself."""
+        bit = self.term_to_bit.get(term)
+        return bit is not None and self.descendant_bits[bit] != 1 << bit
+
+    def expand(self, terms: Iterable[Hashable]) -> set:
+        """Get the given terms and all of their descendants."""
+        bits = 0
+        rv = set()
+        for term in terms:
+            bit = self.term_to_bit.get(term)
+            if bit is None:
+                rv.add(term)
+            else:
+                bits |= self.descendant_bits[bit]
+        rv.update(_get_terms(bits, self.terms))
+        return rv
+
+
+def build_hierarchy(pairs: Iterable[tuple[Hashable, Hashable]]) -> Hierarchy:
+    """Build the transitive closure of a hierarchy.
+
+    :param pairs: Pairs of a child and its parent
+    :raises graphlib.CycleError: If the hierarchy has a cycle
+    """
+    parents: dict[Hashable, set] = {}
+    children: dict[Hashable, set] = {}
+    for child, parent in pairs:
+        if pd.isna(child) or pd.isna(parent):
+            continue
+        parents.setdefault(child, set()).add(parent)
+        parents.setdefault(parent, set())
+        children.setdefault(parent, set()).add(child)
+        children.setdefault(child, set())
+
+    # the sorter gives each term after its children
+    terms = tuple(TopologicalSorter(children).static_order())
+    term_to_bit = {term: bit for bit, term in enumerate(terms)}
+    descendant_bits = [1 << bit for bit in range(len(terms))]
+    for bit, term in enumerate(terms):
+        for child in children[term]:
+            descendant_bits[bit] |= descendant_bits[term_to_bit[child]]
+    ancestor_bits = [1 << bit for bit in range(len(terms))]
+    for bit in reversed(range(len(terms))):
+        for parent in parents[terms[bit]]:
+            ancestor_bits[bit] |= ancestor_bits[term_to_bit[parent]]
+
+    return Hierarchy(
+        terms=terms,
+        term_to_bit=term_to_bit,
+        descendant_bits=tuple(descendant_bits),
+        ancestor_bits=tuple(ancestor_bits),
+    )
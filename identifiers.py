@@ -0,0 +1,170 @@
+# /// script
+# requires-python = ">=3.14"
+# dependencies = [
+#     "numpy>=2.0.0",
+#     "opencitations-client>=0.0.7",
+#     "pandas>=3.0.0",
+# ]
+# ///
+
+"""Build a local crosswalk between PubMed IDs, DOIs, and OpenCitations identifiers (OMIDs).
+
+The crosswalk is built once from the OpenCitations metadata dumps and stored
+as sorted arrays in ``cache/crosswalk/``, one ``.npy`` file per array, which
+are memory-mapped on load. Lookups are vectorized binary searches over the
+sorted keys, so resolving all identifiers for an article's citations is a
+single call instead of one lookup per citation.
+"""
+
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass, fields
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from opencitations_client import get_omid_to_doi, get_omid_to_pubmed
+from opencitations_client.download import MODULE
+
+from constants import HERE
+
+CROSSWALK_DIR = HERE.joinpath("cache", "crosswalk")
+
+
+def _sort(keys: np.ndarray, values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    order = np.argsort(keys, kind="stable")
+    keys, values = keys[order], values[order]
+    # keep the first value for duplicate keys
+    unique = np.ones(len(keys), dtype=bool)
+    unique[1:] = keys[1:] != keys[:-1]
+    return keys[unique], values[unique]
+
+
+def _lookup(
+    keys: np.ndarray, values: np.ndarray, queries: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Look up values for queries in sorted keys, returning values and a mask of hits."""
+    if not len(keys):
+        return (
+            np.zeros(len(queries), dtype=values.dtype),
+            np.zeros(len(queries), dtype=bool),
+        )
+    positions = np.searchsorted(keys, queries)
+    positions[positions == len(keys)] = 0
+    found = keys[positions] == queries
+    return values[positions], found
+
+
+def _to_pubmed_array(pubmeds: Iterable[str | int]) -> np.ndarray:
+    return np.fromiter(
+        (int(p) if str(p).isdigit() else -1 for p in pubmeds), dtype=np.int64
+    )
+
+
+@dataclass(frozen=True)
+class Crosswalk:
+    """Sorted arrays mapping between PubMed IDs, DOIs, and OMIDs."""
+
+    #: sorted PubMed IDs
+    pubmed_keys: np.ndarray
+    #: OMIDs aligned with :attr:`pubmed_keys`
+    pubmed_omids: np.ndarray
+    #: sorted OMIDs
+    omid_keys: np.ndarray
+    #: PubMed IDs aligned with :attr:`omid_keys`
+    omid_pubmeds: np.ndarray
+    #: sorted, lowercase DOIs
+    doi_keys: np.ndarray
+    #: OMIDs aligned with :attr:`doi_keys`
+    doi_omids: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.omid_keys)
+
+    def get_omids_from_pubmeds(self, pubmeds: Iterable[str | int]) -> list[str | None]:
+        """Get OMIDs for PubMed IDs, with ``None`` for ones that aren't in the crosswalk."""
+        values, found = _lookup(
+            self.pubmed_keys, self.pubmed_omids, _to_pubmed_array(pubmeds)
+        )
+        return [v.decode() if f else None for v, f in zip(values, found, strict=True)]
+
+    def get_omids_from_dois(self, dois: Iterable[str]) -> list[str | None]:
+        """Get OMIDs for DOIs, with ``None`` for ones that aren't in the crosswalk."""
+        queries = np.array([doi.lower().encode() for doi in dois], dtype=bytes)
+        values, found = _lookup(self.doi_keys, self.doi_omids, queries)
+        return [v.decode() if f else None for v, f in zip(values, found, strict=True)]
+
+    def get_pubmeds_from_omids(self, omids: Sequence[str]) -> list[str | None]:
+        """Get PubMed IDs for OMIDs, with ``None`` for ones that aren't in the crosswalk."""
+        queries = np.array([omid.encode() for omid in omids], dtype=bytes)
+        values, found = _lookup(self.omid_keys, self.omid_pubmeds, queries)
+        return [str(v) if f else None for v, f in zip(values, found, strict=True)]
+
+    def save(self, directory: Path = CROSSWALK_DIR) -> None:
+        """Save the crosswalk as one ``.npy`` file per array."""
+        directory.mkdir(parents=True, exist_ok=True)
+        for field in fields(self):
+            np.save(directory.joinpath(f"{field.name}.npy"), getattr(self, field.name))
+
+    @classmethod
+    def load(cls, directory: Path = CROSSWALK_DIR) -> "Crosswalk":
+        """Load a crosswalk, memory-mapping its arrays."""
+        return cls(
+            **{
+                field.name: np.load(
+                    directory.joinpath(f"{field.name}.npy"), mmap_mode="r"
+                )
+                for field in fields(cls)
+            }
+        )
+
+
+def build_crosswalk(
+    omid_to_pubmed: pd.DataFrame, omid_to_doi: pd.DataFrame
+) -> Crosswalk:
+    """Build a crosswalk from data frames with OMID/PubMed and OMID/DOI columns."""
+    pubmeds = pd.to_numeric(omid_to_pubmed["pmid"], errors="coerce")
+    omid_to_pubmed = omid_to_pubmed[pubmeds.notna()]
+    pubmeds = pubmeds[pubmeds.notna()].to_numpy(dtype=np.int64)
+    omids = omid_to_pubmed["omid"].str.encode("utf-8").to_numpy(dtype=bytes)
+
+    pubmed_keys, pubmed_omids = _sort(pubmeds, omids)
+    omid_keys, omid_pubmeds = _sort(omids, pubmeds)
+
+    omid_to_doi = omid_to_doi.dropna()
+    doi_keys, doi_omids = _sort(
+        omid_to_doi["doi"].str.lower().str.encode("utf-8").to_numpy(dtype=bytes),
+        omid_to_doi["omid"].str.encode("utf-8").to_numpy(dtype=bytes),
+    )
+    return Crosswalk(
+        pubmed_keys=pubmed_keys,
+        pubmed_omids=pubmed_omids,
+        omid_keys=omid_keys,
+        omid_pubmeds=omid_pubmeds,
+        doi_keys=doi_keys,
+        doi_omids=doi_omids,
+    )
+
+
+def _read_opencitations_mapping(prefix: str) -> pd.DataFrame:
+    path = MODULE.join(name=f"omid_to_{prefix}.tsv.gz")
+    if not path.is_file():
+        # the first call processes the OpenCitations dumps and writes the TSV
+        {"pmid": get_omid_to_pubmed, "doi": get_omid_to_doi}[prefix]()
+    if not path.is_file():
+        raise FileNotFoundError(
+            f"processing the OpenCitations dumps didn't write the OMID to {prefix} "
+            f"mapping to {path}"
+        )
+    return pd.read_csv(path, sep="\t", dtype=str)
+
+
+def main() -> None:
+    """Build the crosswalk from the OpenCitations metadata dumps."""
+    crosswalk = build_crosswalk(
+        _read_opencitations_mapping("pmid"), _read_opencitations_mapping("doi")
+    )
+    crosswalk.save()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Lookup indexes over the curation tables, built once at load time.
+
+Each index maps a key (e.g., a chemist's ORCID or a catalyst's CURIE) to a
+sorted array of row positions in the corresponding data frame, so a route can
+take ``df.iloc[positions]`` instead of scanning the whole frame with a boolean
+mask.
+"""
+
+from collections.abc import Iterable, Mapping
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+EMPTY = np.empty(0, dtype=np.intp)
+
+
+def _positions(df: pd.DataFrame, column: str) -> dict:
+    """Get a dictionary from each non-null value in a column to its row positions."""
+    return {
+        key: np.asarray(positions, dtype=np.intp)
+        for key, positions in df.groupby(column, sort=False).indices.items()
+    }
+
+
+def union(index: Mapping, keys: Iterable) -> np.ndarray:
+    """Get the sorted union of the row positions of several keys of an index."""
+    arrays = [index[key] for key in keys if key in index]
+    if not arrays:
+        return EMPTY
+    if len(arrays) == 1:
+        return arrays[0]
+    return np.unique(np.concatenate(arrays))
+
+
+@dataclass(frozen=True)
+class KGIndex:
+    """Row-position indexes over the labs, memberships, reactions, and conditions tables."""
+
+    #: group ID -> position in the labs table
+    group_to_lab: dict[int, int]
+    #: group ID -> positions in the memberships table
+    group_to_memberships: dict[int, np.ndarray]
+    #: ORCID -> group IDs
+    orcid_to_groups: dict[str, frozenset[int]]
+    #: group ID -> ORCIDs
+    group_to_orcids: dict[int, frozenset[str]]
+    #: reaction ID -> positions in the reactions table
+    reaction_to_reactions: dict[int, np.ndarray]
+    #: input CURIE -> positions in the reactions table
+    input_to_reactions: dict[str, np.ndarray]
+    #: output CURIE -> positions in the reactions table
+    output_to_reactions: dict[str, np.ndarray]
+    #: reaction ID -> positions in the conditions table
+    reaction_to_conditions: dict[int, np.ndarray]
+    #: chemist ORCID -> positions in the conditions table
+    chemist_to_conditions: dict[str, np.ndarray]
+    #: catalyst CURIE -> positions in the conditions table
+    catalyst_to_conditions: dict[str, np.ndarray]
+    #: group ID -> positions in the conditions table, via its members' ORCIDs
+    group_to_conditions: dict[int, np.ndarray]
+    #: input CURIE -> positions in the conditions table, via its reactions
+    input_to_conditions: dict[str, np.ndarray]
+    #: output CURIE -> positions in the conditions table, via its reactions
+    output_to_conditions: dict[str, np.ndarray]
+
+    def get_groups(self, orcid: str) -> np.ndarray:
+        """Get positions in the labs table for the groups the person is a member of."""
+        return np.sort(
+            np.fromiter(
+                (
+                    self.group_to_lab[group]
+                    for group in self.orcid_to_groups.get(orcid, ())
+                    if group in self.group_to_lab
+                ),
+                dtype=np.intp,
+            )
+        )
+
+    def get_reactions(self, reaction_ids: Iterable[int]) -> np.ndarray:
+        """Get positions in the reactions table for the given reaction IDs."""
+        return union(self.reaction_to_reactions, reaction_ids)
+
+    def get_conditions(self, reaction_ids: Iterable[int]) -> np.ndarray:
+        """Get positions in the conditions table for the given reaction IDs."""
+        return union(self.reaction_to_conditions, reaction_ids)
+
+
+def build_index(
+    *,
+    labs_df: pd.DataFrame,
+    memberships_df: pd.DataFrame,
+    reactions_df: pd.DataFrame,
+    conditions_df: pd.DataFrame,
+) -> KGIndex:
+    """Build lookup indexes over the curation tables.
+
+    :param labs_df: The labs table
+    :param memberships_df: The memberships table
+    :param reactions_df: The reactions table
+    :param conditions_df: The conditions table, joined with the reactions table
+    :returns: Indexes from keys to row positions in each table
+    """
+    orcid_to_groups: dict[str, set[int]] = {}
+    group_to_orcids: dict[int, set[str]] = {}
+    for orcid, lab_id in memberships_df[["orcid", "lab"]].values:
+        if pd.notna(orcid):
+            orcid_to_groups.setdefault(orcid, set()).add(lab_id)
+            group_to_orcids.setdefault(lab_id, set()).add(orcid)
+
+    reaction_to_reactions = _positions(reactions_df, "reaction")
+    reaction_to_conditions = _positions(conditions_df, "reaction")
+    chemist_to_conditions = _positions(conditions_df, "chemist")
+
+    def _reactions_to_conditions(index: dict) -> dict:
+        return {
+            key: union(
+                reaction_to_conditions, reactions_df["reaction"].values[positions]
+            )
+            for key, positions in index.items()
+        }
+
+    input_to_reactions = _positions(reactions_df, "input")
+    output_to_reactions = _positions(reactions_df, "output")
+
+    return KGIndex(
+        group_to_lab={
+            group: int(positions[0])
+            for group, positions in _positions(labs_df, "group").items()
+        },
+        group_to_memberships=_positions(memberships_df, "lab"),
+        orcid_to_groups={k: frozenset(v) for k, v in orcid_to_groups.items()},
+        group_to_orcids={k: frozenset(v) for k, v in group_to_orcids.items()},
+        reaction_to_reactions=reaction_to_reactions,
+        input_to_reactions=input_to_reactions,
+        output_to_reactions=output_to_reactions,
+        reaction_to_conditions=reaction_to_conditions,
+        chemist_to_conditions=chemist_to_conditions,
+        catalyst_to_conditions=_positions(conditions_df, "catalyst"),
+        group_to_conditions={
+            group: union(chemist_to_conditions, orcids)
+            for group, orcids in group_to_orcids.items()
+        },
+        input_to_conditions=_reactions_to_conditions(input_to_reactions),
+        output_to_conditions=_reactions_to_conditions(output_to_reactions),
+    )
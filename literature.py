@@ -1,7 +1,9 @@
 # /// script
 # requires-python = ">=3.14"
 # dependencies = [
+#     "click>=8.1.0",
 #     "curies>=0.12.9",
+#     "numpy>=2.0.0",
 #     "opencitations-client>=0.0.7",
 #     "pandas>=3.0.0",
 #     "pubmed-downloader>=0.0.12",
@@ -10,95 +12,663 @@
 # ]
 # ///
 
-"""Find papers authored by catalaix consortium members, cited by them, and that cite them."""
+"""Find papers authored by catalaix consortium members, cited by them, and that cite them.
 
-from collections import defaultdict
+By default, the harvest is incremental: only new search hits are processed,
+new citation edges and articles are appended to the existing cache files, and
+each processed article is recorded in a checkpoint file as soon as its edges
+are written, so an interrupted run resumes where it left off. Pass ``--full``
+to rebuild everything from scratch.
 
+Requests to PubMed and OpenCitations are made concurrently from a thread pool,
+with a separate limit on the number of in-flight requests to each service and
+retries with exponential backoff. The services are accessed through
+:class:`Backends`, so a local stand-in can be swapped in for testing and
+benchmarking.
+"""
+
+import csv
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import TracebackType
+from typing import Any, Protocol, Self, TypeVar
+
+import click
 import pandas as pd
 import pubmed_downloader
 from curies import Reference
 from opencitations_client import (
     get_incoming_citations,
-    get_outgoing_citations,
     get_omid_from_doi,
-    get_pubmed_from_omid,
     get_omid_from_pubmed,
+    get_outgoing_citations,
+    get_pubmed_from_omid,
 )
-from pystow.utils import safe_open_writer
+from pystow.utils import safe_open_reader, safe_open_writer
 from tqdm import tqdm
+
 from constants import HERE
+from identifiers import CROSSWALK_DIR, Crosswalk
+
+logger = logging.getLogger(__name__)
+
+X = TypeVar("X")
 
 CACHE_DIR = HERE.joinpath("cache")
 PAPERS_TSV_PATH = CACHE_DIR.joinpath("literature.tsv")
 CITATIONS_PATH = CACHE_DIR.joinpath("citations.tsv")
+#: PubMed IDs of authored articles whose citations have been harvested, with their OMIDs
+CHECKPOINT_PATH = CACHE_DIR.joinpath("harvest_checkpoint.tsv")
+PAPERS_HEADER = ["pubmed", "year", "title", "professors"]
+#: the authors of each article, see :func:`_get_authorship_rows`
+AUTHORSHIPS_PATH = CACHE_DIR.joinpath("authorships.tsv")
+AUTHORSHIPS_HEADER = ["pubmed", "position", "name", "orcid", "affiliations"]
 
 
-def main(use_pubmed: bool = True) -> None:
-    labs_df = pd.read_csv(HERE.joinpath("curation", "labs.tsv"), sep="\t")
+class ArticleLike(Protocol):
+    """The parts of :class:`pubmed_downloader.Article` used for harvesting."""
 
-    pubmed_ids: defaultdict[str, set[str]] = defaultdict(set)
+    pubmed: int
+    title: str
+
+    @property
+    def date_published(self) -> Any: ...
+
+    @property
+    def xrefs(self) -> Any: ...
+
+    @property
+    def authors(self) -> Any: ...
 
-    if use_pubmed:
-        for name in tqdm(
-            labs_df["Professor"], unit="laboratory", desc="searching literature"
-        ):
-            for pubmed_id in pubmed_downloader.search(f"{name}[Author]"):
-                pubmed_ids[pubmed_id].add(name)
 
-    articles = list(
-        pubmed_downloader.get_articles(pubmed_ids, progress=True, error_strategy="skip")
+def _get_incoming_citations(omid: str) -> list[str]:
+    return get_incoming_citations(
+        Reference(prefix="omid", identifier=omid), backend="local", return_type="str"
     )
 
-    extra_pmids: set[str] = set()
-    with safe_open_writer(CITATIONS_PATH) as citations_writer:
-        for article in tqdm(
-            articles, unit="article", unit_scale=True, desc="retrieving citations"
+
+def _get_outgoing_citations(omid: str) -> list[str]:
+    return get_outgoing_citations(
+        Reference(prefix="omid", identifier=omid), backend="local", return_type="str"
+    )
+
+
+def _get_articles(pubmed_ids: Iterable[str]) -> list[ArticleLike]:
+    return list(pubmed_downloader.get_articles(pubmed_ids, error_strategy="skip"))
+
+
+@dataclass
+class Backends:
+    """Functions for accessing PubMed and OpenCitations."""
+
+    search: Callable[[str], list[str]] = pubmed_downloader.search
+    get_articles: Callable[[Iterable[str]], list[ArticleLike]] = _get_articles
+    get_omid_from_pubmed: Callable[[str], str | None] = get_omid_from_pubmed
+    get_omid_from_doi: Callable[[str], str | None] = get_omid_from_doi
+    get_pubmed_from_omid: Callable[[str], str | None] = get_pubmed_from_omid
+    get_incoming_citations: Callable[[str], list[str]] = _get_incoming_citations
+    get_outgoing_citations: Callable[[str], list[str]] = _get_outgoing_citations
+
+
+@dataclass
+class Limits:
+    """The maximum number of concurrent requests to each service."""
+
+    pubmed: int = 3
+    opencitations: int = 16
+
+
+#: errors from requests to PubMed and OpenCitations, e.g., requests'
+#: ``RequestException`` is an ``OSError`` and malformed responses raise ``ValueError``
+BACKEND_ERRORS = (OSError, ValueError, RuntimeError)
+
+
+class HarvestIncomplete(RuntimeError):
+    """Raised when requests failed after all retries, so a harvest is partial."""
+
+
+@dataclass
+class Harvest:
+    """The results of harvesting literature."""
+
+    #: PubMed ID -> names of professors who authored it
+    pubmed_ids: dict[str, set[str]] = field(default_factory=dict)
+    #: PubMed ID -> article
+    articles: dict[str, ArticleLike] = field(default_factory=dict)
+    #: pairs of citing and cited PubMed IDs
+    citations: set[tuple[str, str]] = field(default_factory=set)
+
+
+class Harvester:
+    """Harvests literature and citations concurrently."""
+
+    def __init__(
+        self,
+        backends: Backends | None = None,
+        *,
+        limits: Limits | None = None,
+        retries: int = 3,
+        backoff: float = 1.0,
+        article_batch_size: int = 200,
+        progress: bool = True,
+        crosswalk: Crosswalk | None = None,
+    ) -> None:
+        """Instantiate the harvester.
+
+        :param backends: Functions for accessing PubMed and OpenCitations
+        :param limits: The maximum number of concurrent requests to each service
+        :param retries: The number of times to retry a failed request
+        :param backoff: The base delay in seconds between retries, doubled each time
+        :param article_batch_size: The number of articles to fetch per request
+        :param progress: Should progress bars be shown?
+        :param crosswalk: A local crosswalk for resolving PubMed IDs, DOIs, and
+            OMIDs. If given, identifiers are resolved with it in bulk instead
+            of one at a time through the backends.
+        """
+        self.crosswalk = crosswalk
+        self.backends = backends or Backends()
+        self.limits = limits or Limits()
+        self.retries = retries
+        self.backoff = backoff
+        self.article_batch_size = article_batch_size
+        self.progress = progress
+        self._semaphores = {
+            "pubmed": threading.BoundedSemaphore(self.limits.pubmed),
+            "opencitations": threading.BoundedSemaphore(self.limits.opencitations),
+        }
+        max_workers = self.limits.pubmed + self.limits.opencitations
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        #: the number of items :meth:`_imap` submits ahead of the one it yields
+        self.window = 2 * max_workers
+        #: descriptions of requests that failed after all retries
+        self.failures: list[str] = []
+        self._failures_lock = threading.Lock()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self._executor.shutdown()
+
+    def _call(self, service: str, func: Callable[..., X], *args: Any) -> X:
+        """Call a function for a service, respecting its limit and retrying on failure."""
+        for attempt in range(self.retries + 1):
+            with self._semaphores[service]:
+                try:
+                    return func(*args)
+                except BACKEND_ERRORS:
+                    if attempt == self.retries:
+                        raise
+            time.sleep(self.backoff * 2**attempt)
+        raise RuntimeError  # unreachable
+
+    def _map(
+        self, service: str | None, func: Callable[..., X], items: Sequence, desc: str
+    ) -> list[X | None]:
+        """Apply a function concurrently, in order, and with ``None`` for failures."""
+        return list(self._imap(service, func, items, desc))
+
+    def _imap(
+        self, service: str | None, func: Callable[..., X], items: Sequence, desc: str
+    ) -> Iterator[X | None]:
+        """Lazily apply a function concurrently, in order, and with ``None`` for failures.
+
+        At most :attr:`window` items are submitted ahead of the one being
+        yielded, so memory and the number of queued requests don't grow with
+        the number of items. If no service is given, the function is
+        responsible for limiting and retrying its own requests. Failures are
+        logged and added to :attr:`failures`.
+        """
+
+        def _safe(item: Any) -> X | None:
+            try:
+                if service is None:
+                    return func(item)
+                return self._call(service, func, item)
+            except BACKEND_ERRORS as e:
+                logger.warning("%s failed for %s: %s", desc, item, e)
+                with self._failures_lock:
+                    self.failures.append(f"{desc} for {item}")
+                return None
+
+        def _iter_results() -> Iterator[X | None]:
+            pending: deque[Future[X | None]] = deque()
+            try:
+                for item in items:
+                    pending.append(self._executor.submit(_safe, item))
+                    if len(pending) >= self.window:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                # the caller stopped early
+                for future in pending:
+                    future.cancel()
+
+        yield from tqdm(
+            _iter_results(),
+            total=len(items),
+            desc=desc,
+            unit_scale=True,
+            disable=not self.progress,
+        )
+
+    def search(self, names: Sequence[str]) -> dict[str, set[str]]:
+        """Search PubMed for articles authored by each person."""
+        rv: defaultdict[str, set[str]] = defaultdict(set)
+        results = self._map(
+            "pubmed",
+            self.backends.search,
+            [f"{name}[Author]" for name in names],
+            "searching literature",
+        )
+        for name, pubmed_ids in zip(names, results, strict=True):
+            for pubmed_id in pubmed_ids or []:
+                rv[str(pubmed_id)].add(name)
+        return dict(rv)
+
+    def iter_article_batches(
+        self, pubmed_ids: Iterable[str]
+    ) -> Iterator[list[ArticleLike]]:
+        """Get batches of articles from PubMed, fetched concurrently."""
+        pubmed_ids = sorted(set(pubmed_ids), key=int)
+        batches = [
+            pubmed_ids[i : i + self.article_batch_size]
+            for i in range(0, len(pubmed_ids), self.article_batch_size)
+        ]
+        for batch in self._imap(
+            "pubmed", self.backends.get_articles, batches, "retrieving articles"
         ):
-            omid = get_omid_from_pubmed(article.pubmed)
-            if not omid and (doi := _get_doi(article)):
-                omid = get_omid_from_doi(doi)
-            if not omid:
-                continue
-            omid_reference = Reference(prefix="omid", identifier=omid)
+            yield batch or []
 
-            for incoming_omid in get_incoming_citations(
-                omid_reference, backend="local", return_type="str"
-            ):
-                if incoming_pubmed := get_pubmed_from_omid(incoming_omid):
-                    citations_writer.writerow((incoming_pubmed, str(article.pubmed)))
-                    extra_pmids.add(incoming_pubmed)
-            for outgoing_omid in get_outgoing_citations(
-                omid_reference, backend="local", return_type="str"
-            ):
-                if outgoing_pubmed := get_pubmed_from_omid(outgoing_omid):
-                    citations_writer.writerow((str(article.pubmed), outgoing_pubmed))
-                    extra_pmids.add(outgoing_pubmed)
+    def get_articles(self, pubmed_ids: Iterable[str]) -> dict[str, ArticleLike]:
+        """Get articles from PubMed, in concurrent batches."""
+        return {
+            str(article.pubmed): article
+            for batch in self.iter_article_batches(pubmed_ids)
+            for article in batch
+        }
+
+    def get_omids(self, articles: Sequence[ArticleLike]) -> list[str | None]:
+        """Get the OpenCitations identifiers for articles.
 
-    articles.extend(
-        pubmed_downloader.get_articles(
-            extra_pmids.difference(pubmed_ids), progress=True, error_strategy="skip"
+        With a crosswalk, the PubMed IDs of all articles are resolved in one
+        lookup, and the DOIs of the ones that weren't found in another.
+        """
+        if self.crosswalk is None:
+            return [self.get_omid(article) for article in articles]
+        omids = self.crosswalk.get_omids_from_pubmeds(
+            [article.pubmed for article in articles]
         )
-    )
+        dois = {
+            i: doi
+            for i, (omid, article) in enumerate(zip(omids, articles, strict=True))
+            if not omid and (doi := _get_doi(article))
+        }
+        if dois:
+            doi_omids = self.crosswalk.get_omids_from_dois(list(dois.values()))
+            for i, omid in zip(dois, doi_omids, strict=True):
+                omids[i] = omid
+        return omids
 
+    def get_omid(self, article: ArticleLike) -> str | None:
+        """Get the OpenCitations identifier for an article."""
+        if self.crosswalk is not None:
+            return self.get_omids([article])[0]
+        omid = self._call(
+            "opencitations", self.backends.get_omid_from_pubmed, str(article.pubmed)
+        )
+        if not omid and (doi := _get_doi(article)):
+            omid = self._call("opencitations", self.backends.get_omid_from_doi, doi)
+        return omid
+
+    def get_omid_and_citations(
+        self, article: ArticleLike
+    ) -> tuple[str | None, list[tuple[str, str]]]:
+        """Get the OMID of an article and citations from and to it."""
+        omid = self.get_omid(article)
+        if not omid:
+            return None, []
+        incoming_omids, outgoing_omids = self._get_citing_and_cited(omid)
+        return omid, _get_edges(
+            str(article.pubmed),
+            self.get_pubmeds(incoming_omids),
+            self.get_pubmeds(outgoing_omids),
+        )
+
+    def get_omids_and_citations(
+        self, articles: Sequence[ArticleLike], desc: str = "retrieving citations"
+    ) -> list[tuple[str | None, list[tuple[str, str]]] | None]:
+        """Get the OMIDs of articles and citations from and to them, concurrently.
+
+        With a crosswalk, the identifiers of all articles, and then the PubMed
+        IDs of all articles citing or cited by them, are resolved in bulk, so
+        only the citations themselves are requested per article.
+
+        :returns: The OMID and citations of each article, or ``None`` for
+            articles whose requests failed
+        """
+        if self.crosswalk is None:
+            return self._map(None, self.get_omid_and_citations, articles, desc)
+        omids = self.get_omids(articles)
+        neighbors = self._map(None, self._get_citing_and_cited, omids, desc)
+        pubmeds = iter(
+            self.crosswalk.get_pubmeds_from_omids(
+                [omid for pair in neighbors if pair for side in pair for omid in side]
+            )
+        )
+        rv: list[tuple[str | None, list[tuple[str, str]]] | None] = []
+        for article, omid, pair in zip(articles, omids, neighbors, strict=True):
+            if pair is None:
+                rv.append(None)
+                continue
+            incoming_pubmeds, outgoing_pubmeds = (
+                [next(pubmeds) for _ in side] for side in pair
+            )
+            rv.append(
+                (
+                    omid,
+                    _get_edges(str(article.pubmed), incoming_pubmeds, outgoing_pubmeds),
+                )
+            )
+        return rv
+
+    def _get_citing_and_cited(self, omid: str | None) -> tuple[list[str], list[str]]:
+        """Get the OMIDs of articles citing and cited by an article."""
+        if not omid:
+            return [], []
+        incoming_omids = self._call(
+            "opencitations", self.backends.get_incoming_citations, omid
+        )
+        outgoing_omids = self._call(
+            "opencitations", self.backends.get_outgoing_citations, omid
+        )
+        return incoming_omids, outgoing_omids
+
+    def get_pubmeds(self, omids: Sequence[str]) -> list[str | None]:
+        """Get PubMed IDs for OMIDs, in bulk if a crosswalk is available."""
+        if self.crosswalk is not None:
+            return self.crosswalk.get_pubmeds_from_omids(omids)
+        return [
+            self._call("opencitations", self.backends.get_pubmed_from_omid, omid)
+            for omid in omids
+        ]
+
+    def harvest(self, names: Sequence[str]) -> Harvest:
+        """Harvest articles by the given people and their citation neighborhood.
+
+        :raises HarvestIncomplete: If any search, batch of articles, or
+            citation lookup failed after all retries
+        """
+        self.failures = []
+        rv = Harvest()
+        rv.pubmed_ids = self.search(names)
+        rv.articles = self.get_articles(rv.pubmed_ids)
+        articles = [rv.articles[key] for key in sorted(rv.articles, key=int)]
+        for result in self.get_omids_and_citations(articles):
+            if result is not None:
+                rv.citations.update(result[1])
+        extra_pmids = {
+            pubmed for citation in rv.citations for pubmed in citation
+        }.difference(rv.pubmed_ids)
+        rv.articles.update(self.get_articles(extra_pmids))
+        if self.failures:
+            raise HarvestIncomplete(
+                f"{len(self.failures):,} requests failed, e.g., {self.failures[0]}"
+            )
+        return rv
+
+
+def write(harvest: Harvest) -> None:
+    """Write the literature and citations, sorted so the output is deterministic."""
+    with safe_open_writer(CITATIONS_PATH) as writer:
+        writer.writerows(
+            sorted(harvest.citations, key=lambda pair: (int(pair[0]), int(pair[1])))
+        )
     with safe_open_writer(PAPERS_TSV_PATH) as writer:
-        writer.writerow(["pubmed", "year", "title", "professors"])
+        writer.writerow(PAPERS_HEADER)
         writer.writerows(
-            (
-                article.pubmed,
-                article.date_published.year if article.date_published else None,
-                article.title,
-                ",".join(sorted(pubmed_ids.get(str(article.pubmed), []))),
+            _get_row(article, harvest.pubmed_ids.get(pubmed, ()))
+            for pubmed, article in sorted(
+                harvest.articles.items(), key=lambda item: int(item[0])
             )
-            for article in articles
         )
+    with safe_open_writer(AUTHORSHIPS_PATH) as writer:
+        writer.writerow(AUTHORSHIPS_HEADER)
+        for _, article in sorted(
+            harvest.articles.items(), key=lambda item: int(item[0])
+        ):
+            writer.writerows(_get_authorship_rows(article))
+
+
+def write_checkpoint(harvest: Harvest) -> None:
+    """Mark all articles authored by consortium members as processed."""
+    with safe_open_writer(CHECKPOINT_PATH) as writer:
+        writer.writerows((pubmed, "") for pubmed in sorted(harvest.pubmed_ids, key=int))
+
+
+def _repair(path: Path) -> None:
+    """Truncate a partially written last line, e.g., after an interrupted append."""
+    if not path.is_file():
+        return
+    with path.open("rb+") as file:
+        file.seek(0, os.SEEK_END)
+        size = file.tell()
+        if not size:
+            return
+        file.seek(size - 1)
+        if file.read(1) == b"\n":
+            return
+        file.seek(0)
+        data = file.read()
+        file.truncate(data.rfind(b"\n") + 1)
 
 
-def _get_doi(article: pubmed_downloader.Article) -> str | None:
+def _read_rows(path: Path, *, header: bool = False) -> list[list[str]]:
+    if not path.is_file():
+        return []
+    with safe_open_reader(path) as reader:
+        if header:
+            next(reader, None)
+        return list(reader)
+
+
+def update(harvester: Harvester, names: Sequence[str]) -> None:
+    """Incrementally update the literature and citations, resuming from the checkpoint."""
+    for path in (PAPERS_TSV_PATH, CITATIONS_PATH, CHECKPOINT_PATH, AUTHORSHIPS_PATH):
+        _repair(path)
+
+    literature = {row[0]: row for row in _read_rows(PAPERS_TSV_PATH, header=True)}
+    citations = {tuple(row) for row in _read_rows(CITATIONS_PATH)}
+    if CHECKPOINT_PATH.is_file():
+        processed = {row[0] for row in _read_rows(CHECKPOINT_PATH)}
+    else:
+        # seed from articles with professors, whose citations were harvested
+        # when the literature was last written in full
+        processed = {pubmed for pubmed, row in literature.items() if row[3]}
+        with safe_open_writer(CHECKPOINT_PATH) as writer:
+            writer.writerows((pubmed, "") for pubmed in sorted(processed, key=int))
+
+    n_failures = len(harvester.failures)
+    pubmed_ids = harvester.search(names)
+    # a failed search would drop its professor from every article it found
+    searches_failed = len(harvester.failures) > n_failures
+    unprocessed = sorted(set(pubmed_ids).difference(processed), key=int)
+    logger.info("%d new articles by consortium members", len(unprocessed))
+
+    with (
+        CITATIONS_PATH.open("a", newline="") as citations_file,
+        CHECKPOINT_PATH.open("a", newline="") as checkpoint_file,
+    ):
+        citations_writer = csv.writer(citations_file, delimiter="\t")
+        checkpoint_writer = csv.writer(checkpoint_file, delimiter="\t")
+        for batch in harvester.iter_article_batches(unprocessed):
+            for article, result in zip(
+                batch,
+                harvester.get_omids_and_citations(batch, "citations"),
+                strict=True,
+            ):
+                if result is None:
+                    continue  # failed, so not checkpointed and retried next time
+                omid, edges = result
+                new_edges = sorted(set(edges).difference(citations))
+                citations.update(new_edges)
+                citations_writer.writerows(new_edges)
+                citations_file.flush()
+                # only checkpoint after the article's edges are on disk
+                checkpoint_writer.writerow((article.pubmed, omid or ""))
+                checkpoint_file.flush()
+
+    if searches_failed:
+        logger.warning("not updating professors of articles, since searches failed")
+    professors_changed = not searches_failed and any(
+        row[3] != ",".join(sorted(pubmed_ids[pubmed]))
+        for pubmed, row in literature.items()
+        if pubmed in pubmed_ids
+    )
+    missing = (
+        set(pubmed_ids).union(pubmed for edge in citations for pubmed in edge)
+    ).difference(literature)
+    with (
+        PAPERS_TSV_PATH.open("a", newline="") as papers_file,
+        AUTHORSHIPS_PATH.open("a", newline="") as authorships_file,
+    ):
+        papers_writer = csv.writer(papers_file, delimiter="\t")
+        if not papers_file.tell():
+            papers_writer.writerow(PAPERS_HEADER)
+        authorships_writer = csv.writer(authorships_file, delimiter="\t")
+        if not authorships_file.tell():
+            authorships_writer.writerow(AUTHORSHIPS_HEADER)
+        for batch in harvester.iter_article_batches(missing):
+            rows = [
+                _get_row(article, pubmed_ids.get(str(article.pubmed), ()))
+                for article in batch
+            ]
+            # authors first, so an interrupted run re-fetches the article
+            # instead of leaving it without authors
+            for article in batch:
+                authorships_writer.writerows(_get_authorship_rows(article))
+            authorships_file.flush()
+            literature.update((str(row[0]), list(map(_to_str, row))) for row in rows)
+            papers_writer.writerows(rows)
+            papers_file.flush()
+
+    if professors_changed:
+        for pubmed, row in literature.items():
+            if pubmed in pubmed_ids:
+                row[3] = ",".join(sorted(pubmed_ids[pubmed]))
+        with safe_open_writer(PAPERS_TSV_PATH) as writer:
+            writer.writerow(PAPERS_HEADER)
+            writer.writerows(literature[key] for key in sorted(literature, key=int))
+
+
+def _get_edges(
+    pubmed: str,
+    incoming_pubmeds: Iterable[str | None],
+    outgoing_pubmeds: Iterable[str | None],
+) -> list[tuple[str, str]]:
+    """Get citations as pairs of PubMed IDs, skipping articles without one."""
+    rv = [
+        (incoming_pubmed, pubmed)
+        for incoming_pubmed in incoming_pubmeds
+        if incoming_pubmed
+    ]
+    rv.extend(
+        (pubmed, outgoing_pubmed)
+        for outgoing_pubmed in outgoing_pubmeds
+        if outgoing_pubmed
+    )
+    return rv
+
+
+def _to_str(value: Any) -> str:
+    return "" if value is None else str(value)
+
+
+def _get_row(article: ArticleLike, professors: Iterable[str]) -> tuple:
+    return (
+        article.pubmed,
+        article.date_published.year if article.date_published else None,
+        article.title,
+        ",".join(sorted(professors)),
+    )
+
+
+def _get_authorship_rows(article: ArticleLike) -> list[tuple]:
+    """Get a row for each author of an article, skipping collective authors.
+
+    Affiliations are joined with ``|``.
+    """
+    return [
+        (
+            article.pubmed,
+            author.position,
+            _to_str(author.name),
+            _to_str(author.orcid),
+            "|".join(
+                affiliation.name.replace("|", " ").replace("\t", " ")
+                for affiliation in author.affiliations
+            ),
+        )
+        for author in article.authors or ()
+        # collective authors, e.g., consortia, have no affiliations
+        if hasattr(author, "affiliations")
+    ]
+
+
+def _get_doi(article: ArticleLike) -> str | None:
     for xref in article.xrefs:
         if xref.prefix == "doi":
             return xref.identifier
     return None
 
 
+@click.command()
+@click.option("--pubmed-limit", type=int, default=3, show_default=True)
+@click.option("--opencitations-limit", type=int, default=16, show_default=True)
+@click.option("--retries", type=int, default=3, show_default=True)
+@click.option("--full", is_flag=True, help="Rebuild everything instead of updating")
+@click.option("--no-crosswalk", is_flag=True, help="Resolve identifiers one at a time")
+def main(
+    pubmed_limit: int,
+    opencitations_limit: int,
+    retries: int,
+    full: bool,
+    no_crosswalk: bool,
+) -> None:
+    """Harvest literature by consortium members and its citation neighborhood."""
+    labs_df = pd.read_csv(HERE.joinpath("curation", "labs.tsv"), sep="\t")
+    names = list(labs_df["Professor"])
+    limits = Limits(pubmed=pubmed_limit, opencitations=opencitations_limit)
+    if not no_crosswalk and CROSSWALK_DIR.is_dir():
+        crosswalk = Crosswalk.load()
+    else:
+        crosswalk = None
+    with Harvester(limits=limits, retries=retries, crosswalk=crosswalk) as harvester:
+        if full:
+            try:
+                harvest = harvester.harvest(names)
+            except HarvestIncomplete as e:
+                raise click.ClickException(
+                    f"{e}, so the existing caches were left as they are"
+                ) from None
+            write(harvest)
+            write_checkpoint(harvest)
+        else:
+            update(harvester, names)
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,293 @@
+"""In-process metrics for the web application, exposed in Prometheus' text format.
+
+Slow stages of a request are wrapped in :func:`span`, which records their
+durations in a histogram labeled with the stage, e.g., ``filter`` for pandas
+filtering, ``names`` for name lookups, ``graphviz`` for layout and
+rasterization, and ``template`` for Jinja rendering. Events like graphviz
+invocations and image downloads are counted with :func:`increment`.
+:func:`install` adds per-route latency histograms, a ``/metrics`` endpoint,
+and an opt-in per-request profiling mode to a Flask application.
+
+Metrics are kept per process, so each worker of a multi-process server
+reports its own. Flask is only imported by :func:`install`, so scripts like
+:mod:`draw` and :mod:`prefetch` can record metrics without depending on it.
+"""
+
+import cProfile
+import itertools
+import math
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import flask
+
+#: upper bounds of histogram buckets, in seconds
+BUCKETS: tuple[float, ...] = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+#: if set, requests with a ``profile`` query parameter are profiled with
+#: :mod:`cProfile` and the stats are written to this directory
+PROFILE_DIR_ENV = "CATALAIX_PROFILE_DIR"
+
+Labels = tuple[tuple[str, str], ...]
+
+
+class Histogram:
+    """Counts of observations in cumulative buckets, as in Prometheus."""
+
+    def __init__(self, buckets: tuple[float, ...] = BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """Add an observation."""
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Registry:
+    """A thread-safe collection of counters, histograms, and gauges."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._help: dict[str, tuple[str, str]] = {}
+        self._counters: defaultdict[str, defaultdict[Labels, float]] = defaultdict(
+            lambda: defaultdict(float)
+        )
+        self._histograms: defaultdict[str, dict[Labels, Histogram]] = defaultdict(dict)
+        self._gauges: dict[str, Callable[[], Iterable[tuple[Labels, float]]]] = {}
+
+    def describe(self, name: str, kind: str, help: str) -> None:
+        """Set the type and help text of a metric."""
+        self._help[name] = (kind, help)
+
+    def increment(self, name: str, value: float = 1, **labels: str) -> None:
+        """Increment a counter."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._counters[name][key] += value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """Add an observation to a histogram."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            histogram = self._histograms[name].get(key)
+            if histogram is None:
+                histogram = self._histograms[name][key] = Histogram()
+            histogram.observe(value)
+
+    def gauge(
+        self, name: str, func: Callable[[], Iterable[tuple[Labels, float]]]
+    ) -> None:
+        """Register a function that gets the current values of a gauge."""
+        self._gauges[name] = func
+
+    def _header(self, name: str, kind: str) -> Iterator[str]:
+        kind, help = self._help.get(name, (kind, ""))
+        if help:
+            yield f"# HELP {name} {help}"
+        yield f"# TYPE {name} {kind}"
+
+    def render(self) -> str:
+        """Get all metrics in Prometheus' text exposition format."""
+        with self._lock:
+            counters = {name: dict(values) for name, values in self._counters.items()}
+            histograms = {
+                name: {
+                    labels: (h.buckets, list(h.counts), h.count, h.sum)
+                    for labels, h in values.items()
+                }
+                for name, values in self._histograms.items()
+            }
+        lines = []
+        for name, values in sorted(counters.items()):
+            lines.extend(self._header(name, "counter"))
+            for labels, value in sorted(values.items()):
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for name, values in sorted(histograms.items()):
+            lines.extend(self._header(name, "histogram"))
+            for labels, (buckets, counts, count, total) in sorted(values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(buckets, counts, strict=True):
+                    cumulative += bucket_count
+                    bucket_labels = (*labels, ("le", _format_value(bound)))
+                    lines.append(
+                        f"{name}_bucket{_format_labels(bucket_labels)} {cumulative}"
+                    )
+                lines.append(
+                    f"{name}_bucket{_format_labels((*labels, ('le', '+Inf')))} {count}"
+                )
+                lines.append(f"{name}_sum{_format_labels(labels)} {total!r}")
+                lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        for name, func in sorted(self._gauges.items()):
+            lines.extend(self._header(name, "gauge"))
+            for labels, value in func():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+REGISTRY.describe(
+    "catalaix_span_seconds", "histogram", "Time spent in stages of handling requests"
+)
+REGISTRY.describe(
+    "catalaix_request_seconds", "histogram", "Time to handle requests, by route"
+)
+REGISTRY.describe(
+    "catalaix_requests_total", "counter", "Requests, by route and status code"
+)
+REGISTRY.describe(
+    "catalaix_graphviz_invocations_total", "counter", "Diagrams laid out with graphviz"
+)
+REGISTRY.describe(
+    "catalaix_diagram_images_total",
+    "counter",
+    "Molecule images looked up for diagrams, by whether they were prefetched",
+)
+REGISTRY.describe(
+    "catalaix_image_downloads_total",
+    "counter",
+    "Structure images downloaded from ChEBI, by outcome",
+)
+REGISTRY.describe(
+    "catalaix_name_lookups_total",
+    "counter",
+    "Name and definition lookups, by whether they fell back to PyOBO",
+)
+
+
+@contextmanager
+def span(name: str, registry: Registry = REGISTRY) -> Iterator[None]:
+    """Record the duration of a stage in the ``catalaix_span_seconds`` histogram."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe(
+            "catalaix_span_seconds", time.perf_counter() - start, span=name
+        )
+
+
+def increment(name: str, value: float = 1, **labels: str) -> None:
+    """Increment a counter in the default registry."""
+    REGISTRY.increment(name, value, **labels)
+
+
+#: numbers profiles within a process, so profiles in the same second don't collide
+_PROFILE_COUNTER = itertools.count()
+
+
+def _get_profile_path(directory: Path, route: str) -> Path:
+    name = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "home"
+    # the process ID tells apart workers of a multi-process server
+    suffix = f"{os.getpid()}-{next(_PROFILE_COUNTER)}"
+    return directory.joinpath(f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{suffix}.prof")
+
+
+def install(app: "flask.Flask", registry: Registry = REGISTRY) -> None:
+    """Add request timing, a ``/metrics`` endpoint, and opt-in profiling to an app.
+
+    Profiling is enabled by setting the ``CATALAIX_PROFILE_DIR`` environment
+    variable. Then, a request with a ``profile`` query parameter, e.g.,
+    ``/entity/CHEBI:53259?profile``, is profiled and its stats are written to
+    a ``.prof`` file in that directory, which can be read with :mod:`pstats`
+    or turned into a flame graph with tools like ``flameprof`` or ``snakeviz``.
+    """
+    import flask
+
+    profile_dir = os.environ.get(PROFILE_DIR_ENV)
+
+    def _get_route() -> str:
+        rule = flask.request.url_rule
+        return rule.rule if rule is not None else "<unmatched>"
+
+    @app.before_request
+    def _start() -> None:
+        flask.g.metrics_start = time.perf_counter()
+        if profile_dir and "profile" in flask.request.args:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # only one profiler can be active at a time
+                return
+            flask.g.profiler = profiler
+
+    @app.after_request
+    def _stop(response: flask.Response) -> flask.Response:
+        profiler = flask.g.pop("profiler", None)
+        if profiler is not None:
+            profiler.disable()
+            directory = Path(profile_dir)
+            directory.mkdir(parents=True, exist_ok=True)
+            path = _get_profile_path(directory, _get_route())
+            profiler.dump_stats(path)
+            response.headers["X-Profile"] = path.name
+        start = flask.g.pop("metrics_start", None)
+        if start is not None:
+            route = _get_route()
+            registry.observe(
+                "catalaix_request_seconds",
+                time.perf_counter() - start,
+                route=route,
+                method=flask.request.method,
+            )
+            registry.increment(
+                "catalaix_requests_total",
+                route=route,
+                method=flask.request.method,
+                status=str(response.status_code),
+            )
+        return response
+
+    @app.route("/metrics")
+    def get_metrics() -> flask.Response:
+        return flask.Response(
+            registry.render(), mimetype="text/plain; version=0.0.4; charset=utf-8"
+        )
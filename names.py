@@ -0,0 +1,184 @@
+# /// script
+# requires-python = ">=3.14"
+# dependencies = [
+#     "pandas>=3.0.0",
+#     "pyobo>=0.12.0",
+#     "tqdm>=4.67.2",
+# ]
+# ///
+
+"""Build and query a local table of names and definitions for curated CURIEs.
+
+Looking up a name with :func:`pyobo.get_name` loads the whole ontology (e.g.,
+ChEBI) into memory, so this script resolves only the CURIEs referenced in the
+curation TSVs ahead of time and stores them in a SQLite table that the web
+application reads at startup.
+"""
+
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from collections.abc import Iterable
+from pathlib import Path
+
+import pandas as pd
+from tqdm import tqdm
+
+from constants import (
+    CHEMICAL_HIERARCHY_PATH,
+    CLOSED_LOOP_MEMBERS_PATH,
+    CLOSED_LOOPS_PATH,
+    CONDITIONS_PATH,
+    NAMES_PATH,
+    REACTIONS_PATH,
+)
+from metrics import increment, span
+
+logger = logging.getLogger(__name__)
+
+#: curation TSVs and their columns containing CURIEs
+CURIE_COLUMNS: list[tuple[Path, list[str]]] = [
+    (REACTIONS_PATH, ["input", "reagent", "output", "output 2", "type"]),
+    (CONDITIONS_PATH, ["catalyst"]),
+    (CHEMICAL_HIERARCHY_PATH, ["child", "parent"]),
+    (CLOSED_LOOPS_PATH, ["curie"]),
+    (CLOSED_LOOP_MEMBERS_PATH, ["member"]),
+]
+
+SCHEMA = """\
+CREATE TABLE IF NOT EXISTS names (
+    curie TEXT PRIMARY KEY,
+    name TEXT,
+    definition TEXT
+) WITHOUT ROWID
+"""
+
+
+def get_curation_curies() -> set[str]:
+    """Get all CURIEs referenced in the curation TSVs."""
+    rv = set()
+    for path, columns in CURIE_COLUMNS:
+        df = pd.read_csv(path, sep="\t", usecols=columns, dtype=str)
+        for column in columns:
+            rv.update(curie for curie in df[column].dropna().unique() if ":" in curie)
+    return rv
+
+
+#: errors from downloading or parsing an ontology, e.g., ``pyobo.getters.NoBuildError``
+RESOLVE_ERRORS = (OSError, ValueError, RuntimeError)
+#: the number of lookups of CURIEs that aren't in the table that are cached
+MAX_FALLBACKS = 1_024
+
+
+def _resolve(curie: str) -> tuple[str | None, str | None] | None:
+    """Look up the name and definition of a CURIE with PyOBO.
+
+    :returns: The name and definition, or ``None`` if the ontology couldn't
+        be loaded, so the lookup can be retried later
+    """
+    import pyobo
+
+    try:
+        return pyobo.get_name(curie), pyobo.get_definition(curie)
+    except RESOLVE_ERRORS as e:
+        logger.warning("could not look up %s: %s", curie, e)
+        return None
+
+
+def build(path: Path = NAMES_PATH, *, force: bool = False) -> None:
+    """Resolve names and definitions for all curated CURIEs and store them.
+
+    CURIEs whose lookups fail aren't stored, so the next run retries them.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with sqlite3.connect(path) as connection:
+        connection.execute(SCHEMA)
+        if force:
+            connection.execute("DELETE FROM names")
+        done = {curie for (curie,) in connection.execute("SELECT curie FROM names")}
+        curies = sorted(get_curation_curies() - done)
+        resolved = (
+            (curie, _resolve(curie))
+            for curie in tqdm(curies, unit="curie", desc="resolving names")
+        )
+        connection.executemany(
+            "INSERT OR REPLACE INTO names VALUES (?, ?, ?)",
+            ((curie, *rv) for curie, rv in resolved if rv is not None),
+        )
+
+
+class NameTable:
+    """A lookup table for names and definitions of CURIEs."""
+
+    def __init__(self, path: Path = NAMES_PATH) -> None:
+        """Load the table built by :func:`build`, if it exists."""
+        self._lock = threading.Lock()
+        self._data: dict[str, tuple[str | None, str | None]] = {}
+        self._fallbacks: OrderedDict[str, tuple[str | None, str | None]] = OrderedDict()
+        if path.is_file():
+            with sqlite3.connect(path) as connection:
+                self._data.update(
+                    (curie, (name, definition))
+                    for curie, name, definition in connection.execute(
+                        "SELECT curie, name, definition FROM names"
+                    )
+                )
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _get(self, curie: str) -> tuple[str | None, str | None]:
+        with span("names"):
+            rv = self._data.get(curie)
+            if rv is not None:
+                increment("catalaix_name_lookups_total", source="table")
+                return rv
+            with self._lock:
+                rv = self._fallbacks.get(curie)
+                if rv is not None:
+                    self._fallbacks.move_to_end(curie)
+            if rv is not None:
+                increment("catalaix_name_lookups_total", source="fallback")
+                return rv
+            # fall back to PyOBO for CURIEs that were added after the table was
+            # built. any CURIE can be requested, so these are cached in a
+            # bounded LRU rather than in the table
+            increment("catalaix_name_lookups_total", source="pyobo")
+            rv = _resolve(curie)
+            if rv is None:
+                return None, None
+            with self._lock:
+                self._fallbacks[curie] = rv
+                while len(self._fallbacks) > MAX_FALLBACKS:
+                    self._fallbacks.popitem(last=False)
+            return rv
+
+    def resolve_missing(self, curies: Iterable[str]) -> int:
+        """Look up CURIEs that aren't in the table with PyOBO, so later lookups don't.
+
+        :returns: The number of CURIEs that were looked up
+        """
+        missing = [curie for curie in curies if curie not in self._data]
+        for curie in missing:
+            rv = _resolve(curie)
+            if rv is not None:
+                with self._lock:
+                    self._data[curie] = rv
+        return len(missing)
+
+    def get_name(self, curie: str) -> str | None:
+        """Get the name for a CURIE."""
+        return self._get(curie)[0]
+
+    def get_definition(self, curie: str) -> str | None:
+        """Get the definition for a CURIE."""
+        return self._get(curie)[1]
+
+
+def main() -> None:
+    build()
+
+
+if __name__ == "__main__":
+    main()
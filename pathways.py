@@ -0,0 +1,323 @@
+"""Multi-step pathways and closed loops through the reaction network.
+
+A :class:`PathwayIndex` turns the reactions into a directed graph from
+substrates to products, stored as compressed sparse rows with one edge per
+reaction and product, and gives each edge a cost from its conditions. Routes
+are found with Yen's algorithm for the k shortest simple paths on top of
+Dijkstra's algorithm. Closed loops through an entity are routes from the
+entity back to itself, found by redirecting the edges into the entity to a
+virtual node. Indexes are immutable and built per snapshot, so results are
+cached on the index.
+"""
+
+import heapq
+import math
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Literal
+
+import numpy as np
+import pandas as pd
+
+Weight = Literal["steps", "yield", "time"]
+WEIGHTS: tuple[Weight, ...] = ("steps", "yield", "time")
+
+#: the yield assumed for reactions without any conditions reporting one
+DEFAULT_YIELD = 50.0
+#: the time assumed for reactions without any conditions reporting one
+DEFAULT_TIME = 24.0
+#: the number of query results cached per index
+MAX_CACHED = 1_024
+
+
+def _get_costs(
+    reactions: np.ndarray, conditions_df: pd.DataFrame, weight: Weight
+) -> np.ndarray:
+    """Get the cost of each reaction.
+
+    ``steps`` counts reactions, ``yield`` is the negative logarithm of the best
+    reported yield, so the cheapest route has the highest overall yield, and
+    ``time`` is the shortest reported time.
+    """
+    if weight == "steps":
+        return np.ones(len(reactions))
+    column, default, aggregate = {
+        "yield": ("yield (%)", DEFAULT_YIELD, "max"),
+        "time": ("time", DEFAULT_TIME, "min"),
+    }[weight]
+    values = pd.to_numeric(conditions_df[column], errors="coerce")
+    best = values.groupby(conditions_df["reaction"]).agg(aggregate)
+    best = best.reindex(reactions).fillna(default).to_numpy(dtype=float)
+    if weight == "yield":
+        return -np.log(np.clip(best, 1.0, 100.0) / 100.0)
+    return np.clip(best, 0.0, None)
+
+
+@dataclass(frozen=True)
+class Route:
+    """A sequence of reactions from a substrate to a product."""
+
+    #: the total cost of the reactions
+    cost: float
+    #: the reaction IDs, in order
+    reactions: tuple
+    #: the entities, in order, starting with the substrate
+    curies: tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class PathwayIndex:
+    """An adjacency index over the reaction network for finding routes."""
+
+    #: entities, in the order of their node numbers
+    curies: tuple[str, ...]
+    curie_to_node: dict[str, int]
+    #: the reaction of each edge
+    reactions: np.ndarray
+    #: edges of each node are ``offsets[node]`` to ``offsets[node + 1]``
+    offsets: list[int]
+    sources: list[int]
+    targets: list[int]
+    #: the position of each edge's reaction in :attr:`reactions`
+    edge_reactions: list[int]
+    #: weight -> cost of each edge
+    costs: dict[str, list[float]]
+    _cache: OrderedDict = field(default_factory=OrderedDict, repr=False, compare=False)
+    _lock: threading.Lock = field(
+        default_factory=threading.Lock, repr=False, compare=False
+    )
+
+    def _cached(self, key: tuple, func: Callable[[], list[Route]]) -> list[Route]:
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        value = func()
+        with self._lock:
+            self._cache[key] = value
+            while len(self._cache) > MAX_CACHED:
+                self._cache.popitem(last=False)
+        return value
+
+    def _dijkstra(
+        self,
+        source: int,
+        target: int,
+        costs: list[float],
+        removed_edges: set[int],
+        removed_nodes: set[int],
+        loop: int | None,
+    ) -> tuple[float, list[int]] | None:
+        """Get the cheapest edges from a source to a target node.
+
+        :param loop: If given, edges into this node lead to the target instead
+        """
+        offsets, targets = self.offsets, self.targets
+        distances = {source: 0.0}
+        previous: dict[int, int] = {}
+        heap = [(0.0, source)]
+        while heap:
+            distance, node = heapq.heappop(heap)
+            if node == target:
+                edges = []
+                while node != source:
+                    edge = previous[node]
+                    edges.append(edge)
+                    node = self.sources[edge]
+                return distance, edges[::-1]
+            if distance > distances[node]:
+                continue
+            for edge in range(offsets[node], offsets[node + 1]):
+                if edge in removed_edges:
+                    continue
+                head = targets[edge]
+                if head == loop:
+                    head = target
+                if head in removed_nodes:
+                    continue
+                new = distance + costs[edge]
+                if new < distances.get(head, math.inf):
+                    distances[head] = new
+                    previous[head] = edge
+                    heapq.heappush(heap, (new, head))
+        return None
+
+    def _yen(
+        self, source: int, target: int | None, k: int, weight: Weight
+    ) -> list[Route]:
+        """Get the k cheapest simple routes with Yen's algorithm.
+
+        :param target: The target node, or ``None`` for loops back to the source
+        """
+        costs = self.costs[weight]
+        # a virtual node standing in for the source as the end of a loop
+        virtual = len(self.curies)
+        loop = target is None
+        if loop:
+            target, loop_node = virtual, source
+        else:
+            loop_node = None
+
+        def _nodes(edges: list[int]) -> list[int]:
+            nodes = [source]
+            for edge in edges:
+                head = self.targets[edge]
+                nodes.append(virtual if loop and head == source else head)
+            return nodes
+
+        first = self._dijkstra(source, target, costs, set(), set(), loop_node)
+        if first is None:
+            return []
+        found = [first]
+        seen = {tuple(first[1])}
+        candidates: list[tuple[float, list[int]]] = []
+        while len(found) < k:
+            _, edges = found[-1]
+            nodes = _nodes(edges)
+            for i in range(len(edges)):
+                root = edges[:i]
+                removed_edges = {
+                    other[i]
+                    for _, other in found
+                    if len(other) > i and other[:i] == root
+                }
+                spur = self._dijkstra(
+                    nodes[i],
+                    target,
+                    costs,
+                    removed_edges,
+                    set(nodes[:i]),
+                    loop_node,
+                )
+                if spur is None:
+                    continue
+                path = root + spur[1]
+                if tuple(path) in seen:
+                    continue
+                seen.add(tuple(path))
+                heapq.heappush(candidates, (sum(costs[edge] for edge in path), path))
+            if not candidates:
+                break
+            found.append(heapq.heappop(candidates))
+
+        rv = []
+        for cost, edges in found:
+            nodes = _nodes(edges)
+            rv.append(
+                Route(
+                    cost=float(cost),
+                    reactions=tuple(
+                        self.reactions[self.edge_reactions[edge]].item()
+                        for edge in edges
+                    ),
+                    curies=tuple(
+                        self.curies[source if node == virtual else node]
+                        for node in nodes
+                    ),
+                )
+            )
+        return rv
+
+    def get_routes(
+        self, source: str, target: str, *, k: int = 5, weight: Weight = "steps"
+    ) -> list[Route]:
+        """Get the k cheapest routes from a substrate to a product.
+
+        :param source: The CURIE of the substrate
+        :param target: The CURIE of the product
+        :param k: The maximum number of routes
+        :param weight: How to weigh reactions, see :func:`_get_costs`
+        :returns: Routes that don't visit any entity twice, cheapest first
+        """
+        if source == target:
+            return self.get_loops(source, k=k, weight=weight)
+        if source not in self.curie_to_node or target not in self.curie_to_node:
+            return []
+        return self._cached(
+            ("routes", source, target, k, weight),
+            lambda: self._yen(
+                self.curie_to_node[source],
+                self.curie_to_node[target],
+                k,
+                weight,
+            ),
+        )
+
+    def get_loops(
+        self, curie: str, *, k: int = 5, weight: Weight = "steps"
+    ) -> list[Route]:
+        """Get the k cheapest closed loops that start and end with an entity.
+
+        :param curie: The CURIE of the entity, e.g., a polymer
+        :param k: The maximum number of loops
+        :param weight: How to weigh reactions, see :func:`_get_costs`
+        :returns: Loops that don't visit any other entity twice, cheapest first
+        """
+        if curie not in self.curie_to_node:
+            return []
+        return self._cached(
+            ("loops", curie, k, weight),
+            lambda: self._yen(self.curie_to_node[curie], None, k, weight),
+        )
+
+
+def build_pathway_index(
+    reactions_df: pd.DataFrame,
+    conditions_df: pd.DataFrame,
+    *,
+    include_reagents: bool = False,
+    include_secondary: bool = False,
+) -> PathwayIndex:
+    """Build an adjacency index over the reaction network.
+
+    :param reactions_df: The reactions table
+    :param conditions_df: The conditions table
+    :param include_reagents: Should reagents be substrates of their reactions?
+    :param include_secondary: Should ``output 2`` be products of their reactions?
+    """
+    reactions = reactions_df["reaction"].to_numpy()
+    sources = ["input"] + (["reagent"] if include_reagents else [])
+    targets = ["output"] + (["output 2"] if include_secondary else [])
+    pairs = [
+        (source, target, position)
+        for source_column in sources
+        for target_column in targets
+        for position, (source, target) in enumerate(
+            reactions_df[[source_column, target_column]].values
+        )
+        if pd.notna(source) and pd.notna(target)
+    ]
+    curies = tuple(
+        sorted({curie for source, target, _ in pairs for curie in (source, target)})
+    )
+    curie_to_node = {curie: node for node, curie in enumerate(curies)}
+
+    edge_sources = np.array(
+        [curie_to_node[source] for source, _, _ in pairs], dtype=np.int64
+    )
+    edge_targets = np.array(
+        [curie_to_node[target] for _, target, _ in pairs], dtype=np.int64
+    )
+    edge_reactions = np.array([position for _, _, position in pairs], dtype=np.int64)
+    order = np.argsort(edge_sources, kind="stable")
+    offsets = np.zeros(len(curies) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(edge_sources, minlength=len(curies)), out=offsets[1:])
+    edge_reactions = edge_reactions[order]
+
+    return PathwayIndex(
+        curies=curies,
+        curie_to_node=curie_to_node,
+        reactions=reactions,
+        offsets=offsets.tolist(),
+        sources=edge_sources[order].tolist(),
+        targets=edge_targets[order].tolist(),
+        edge_reactions=edge_reactions.tolist(),
+        costs={
+            weight: _get_costs(reactions, conditions_df, weight)[
+                edge_reactions
+            ].tolist()
+            for weight in WEIGHTS
+        },
+    )
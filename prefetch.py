@@ -0,0 +1,163 @@
+# /// script
+# requires-python = ">=3.14"
+# dependencies = [
+#     "cairosvg>=2.8.2",
+#     "click>=8.1.0",
+#     "pandas>=3.0.0",
+#     "pystow>=0.7.15",
+#     "tqdm>=4.67.2",
+# ]
+# ///
+
+"""Download and rasterize ChEBI structure images for all curated molecules.
+
+Drawing only reads images that already exist, so this should be run whenever
+new ChEBI CURIEs are added to the curation TSVs.
+"""
+
+import logging
+import os
+import time
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+import click
+from tqdm import tqdm
+
+from constants import IMG_DIR
+from metrics import increment, span
+from names import get_curation_curies
+
+logger = logging.getLogger(__name__)
+
+
+def get_structure_url(chebi_id: str) -> str:
+    """Get the URL for the structure depiction of a ChEBI entry."""
+    return f"https://www.ebi.ac.uk/chebi/backend/api/public/compound/{chebi_id}/structure/?width=300&height=300"
+
+
+def get_svg_path(chebi_id: str) -> Path:
+    """Get the path for the downloaded structure depiction of a ChEBI entry."""
+    return IMG_DIR.joinpath(f"chebi_{chebi_id}.svg")
+
+
+def get_png_path(chebi_id: str) -> Path:
+    """Get the path for the rasterized structure depiction of a ChEBI entry."""
+    return IMG_DIR.joinpath(f"chebi_{chebi_id}.png")
+
+
+def get_chebi_ids() -> set[str]:
+    """Get the local unique identifiers of all ChEBI CURIEs in the curation TSVs."""
+    return {
+        curie.removeprefix("CHEBI:")
+        for curie in get_curation_curies()
+        if curie.startswith("CHEBI:")
+    }
+
+
+def _download(chebi_id: str, retries: int, backoff: float) -> bool:
+    from pystow.utils import download
+
+    path = get_svg_path(chebi_id)
+    part = path.with_suffix(".svg.part")
+    for attempt in range(retries + 1):
+        try:
+            with span("image_download"):
+                download(
+                    get_structure_url(chebi_id), part, force=True, progress_bar=False
+                )
+        # urllib's URLError and requests' RequestException are both OSErrors
+        except OSError as e:
+            if attempt == retries:
+                logger.warning("failed to download CHEBI:%s: %s", chebi_id, e)
+                increment("catalaix_image_downloads_total", outcome="failed")
+                return False
+            increment("catalaix_image_downloads_total", outcome="retried")
+            time.sleep(backoff * 2**attempt)
+        else:
+            os.replace(part, path)
+            increment("catalaix_image_downloads_total", outcome="downloaded")
+            return True
+    return False
+
+
+def _rasterize(chebi_id: str) -> str:
+    import cairosvg
+
+    png_path = get_png_path(chebi_id)
+    part = png_path.with_suffix(".png.part")
+    cairosvg.svg2png(
+        url=get_svg_path(chebi_id).as_posix(),
+        write_to=part.as_posix(),
+        output_width=256,
+        output_height=256,
+        scale=3.125,
+    )
+    os.replace(part, png_path)
+    return chebi_id
+
+
+def prefetch(
+    chebi_ids: Iterable[str] | None = None,
+    *,
+    max_downloads: int = 8,
+    max_processes: int | None = None,
+    retries: int = 3,
+    backoff: float = 1.0,
+    progress: bool = True,
+) -> None:
+    """Download missing structure SVGs concurrently, then rasterize missing PNGs in parallel.
+
+    :param chebi_ids: ChEBI local unique identifiers. Defaults to all in the curation.
+    :param max_downloads: The maximum number of concurrent downloads
+    :param max_processes: The maximum number of processes for rasterization
+    :param retries: The number of times to retry a failed download
+    :param backoff: The base delay in seconds between retries, doubled each time
+    :param progress: Should progress bars be shown?
+    """
+    if chebi_ids is None:
+        chebi_ids = get_chebi_ids()
+    chebi_ids = sorted(set(chebi_ids))
+    IMG_DIR.mkdir(parents=True, exist_ok=True)
+
+    missing_svg = [i for i in chebi_ids if not get_svg_path(i).is_file()]
+    if missing_svg:
+        with ThreadPoolExecutor(max_workers=max_downloads) as executor:
+            futures = [
+                executor.submit(_download, chebi_id, retries, backoff)
+                for chebi_id in missing_svg
+            ]
+            for future in tqdm(
+                futures, unit="image", desc="downloading", disable=not progress
+            ):
+                future.result()
+
+    missing_png = [
+        i
+        for i in chebi_ids
+        if get_svg_path(i).is_file() and not get_png_path(i).is_file()
+    ]
+    if missing_png:
+        with ProcessPoolExecutor(max_workers=max_processes) as executor:
+            for _ in tqdm(
+                executor.map(_rasterize, missing_png),
+                total=len(missing_png),
+                unit="image",
+                desc="rasterizing",
+                disable=not progress,
+            ):
+                pass
+
+
+@click.command()
+@click.option("--max-downloads", type=int, default=8, show_default=True)
+@click.option("--max-processes", type=int)
+@click.option("--retries", type=int, default=3, show_default=True)
+def main(max_downloads: int, max_processes: int | None, retries: int) -> None:
+    """Prefetch structure images for all ChEBI CURIEs in the curation."""
+    prefetch(max_downloads=max_downloads, max_processes=max_processes, retries=retries)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""A cache for rendered pages of the web application.
+
+Pages only depend on the curation data and on the route and arguments of the
+request, so rendered pages are kept in memory keyed by both, and evicted in
+least-recently-used order when there are too many of them or they take up too
+much memory. Each page's strong ETag is a hash of the version of the curation
+data (see :attr:`snapshot.KGSnapshot.version`), the templates, and the key, so
+conditional requests can be answered with 304 without rendering the page or
+even having it in the cache.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from collections.abc import Iterable
+from pathlib import Path
+
+
+def get_files_version(paths: Iterable[Path]) -> str:
+    """Get a hash of the names and contents of files, e.g., templates."""
+    hasher = hashlib.sha256()
+    for path in sorted(paths):
+        hasher.update(f"{path.name}\n".encode())
+        hasher.update(path.read_bytes())
+    return hasher.hexdigest()
+
+
+class ResponseCache:
+    """An in-memory LRU cache of rendered pages for the current curation data."""
+
+    def __init__(
+        self,
+        *,
+        salt: str = "",
+        max_entries: int = 4_096,
+        max_bytes: int = 64 * 1024**2,
+    ) -> None:
+        """Instantiate the cache.
+
+        :param salt: Anything else pages depend on, e.g., the version of the
+            templates from :func:`get_files_version`
+        :param max_entries: The maximum number of pages
+        :param max_bytes: The budget for the pages' bodies
+        """
+        self.salt = salt
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._pages: OrderedDict[str, bytes] = OrderedDict()
+        self._bytes = 0
+        self.version = ""
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+
+    def get_etag(self, version: str, key: str) -> str:
+        """Get the ETag of a page.
+
+        :param version: The version of the curation data
+        :param key: The route and arguments of the request
+        """
+        value = f"{version}\n{self.salt}\n{key}"
+        return hashlib.sha256(value.encode()).hexdigest()[:32]
+
+    def is_not_modified(self, etag: str, if_none_match: Iterable[str]) -> bool:
+        """Check if a client already has a page, counting it if so."""
+        if etag not in if_none_match:
+            return False
+        with self._lock:
+            self.not_modified += 1
+        return True
+
+    def _set_version(self, version: str) -> None:
+        # the lock is held
+        if version != self.version:
+            self.version = version
+            self._pages.clear()
+            self._bytes = 0
+
+    def get(self, version: str, key: str) -> bytes | None:
+        """Get a rendered page, or ``None`` if it isn't cached."""
+        with self._lock:
+            self._set_version(version)
+            value = self._pages.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._pages.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, version: str, key: str, value: bytes) -> None:
+        """Cache a rendered page."""
+        with self._lock:
+            # the curation data changed while the page was rendered
+            if version != self.version or key in self._pages:
+                return
+            self._pages[key] = value
+            self._bytes += len(value)
+            while self._pages and (
+                len(self._pages) > self.max_entries or self._bytes > self.max_bytes
+            ):
+                _, evicted = self._pages.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Remove all pages, e.g., to measure rendering them."""
+        with self._lock:
+            self._pages.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict[str, int | float | str]:
+        """Get hit/miss counters and the size of the cache."""
+        with self._lock:
+            requests = self.hits + self.misses + self.not_modified
+            return {
+                "version": self.version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "hit_rate": (self.hits + self.not_modified) / requests
+                if requests
+                else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._pages),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+            }
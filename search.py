@@ -0,0 +1,366 @@
+# /// script
+# requires-python = ">=3.14"
+# dependencies = [
+#     "click>=8.1.0",
+#     "numpy>=2.0.0",
+#     "pandas>=3.0.0",
+# ]
+# ///
+
+"""A full-text search index over articles, entities, catalysts, people, and groups.
+
+Names, titles, and identifiers (CURIEs, ORCIDs, and PubMed IDs) are split
+into lowercase tokens. The vocabulary is kept sorted, so the terms starting
+with a prefix are a contiguous range found by binary search, and the
+postings of all terms are stored in compressed sparse row (CSR) format with
+a weight per posting. A query matches documents that have a term starting
+with each of its tokens, and ranks them by the inverse document frequency of
+the matched terms, favoring exact matches and short fields.
+
+Running this script builds the index and writes it to ``output/search.pickle``.
+The web application loads it when it's up to date with the curation data and
+the literature cache, and rebuilds it otherwise.
+"""
+
+import bisect
+import hashlib
+import logging
+import os
+import pickle
+import re
+import tempfile
+import threading
+import time
+import unicodedata
+from collections.abc import Iterable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Literal
+
+import click
+import numpy as np
+import pandas as pd
+
+from cache.citation_graph import LITERATURE_PATH
+from constants import OUTPUT_DIR
+
+logger = logging.getLogger(__name__)
+
+SEARCH_INDEX_PATH = OUTPUT_DIR.joinpath("search.pickle")
+#: incremented when the contents of :class:`SearchIndex` change
+SEARCH_INDEX_FORMAT = 1
+
+Kind = Literal["entity", "catalyst", "person", "group", "article"]
+KINDS: tuple[Kind, ...] = ("entity", "catalyst", "person", "group", "article")
+
+#: the weight of tokens from identifiers, names and titles, and other fields
+IDENTIFIER_WEIGHT = 2.0
+NAME_WEIGHT = 1.0
+OTHER_WEIGHT = 0.5
+#: the factor for terms equal to a query token, rather than starting with it
+EXACT_BOOST = 2.0
+
+TOKEN_RE = re.compile(r"\w+(?::\w+)?")
+
+
+def tokenize(text: str) -> list[str]:
+    """Split text into lowercase tokens without accents.
+
+    CURIEs like ``CHEBI:53259`` are kept as one token, in addition to their
+    prefix and identifier.
+    """
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    rv = []
+    for token in TOKEN_RE.findall(text):
+        rv.append(token)
+        if ":" in token:
+            rv.extend(token.split(":"))
+    return rv
+
+
+@dataclass(frozen=True)
+class Document:
+    """Something that can be found with a search."""
+
+    kind: Kind
+    #: e.g., the CURIE of an entity or the PubMed ID of an article
+    key: str
+    title: str
+    #: a short description, e.g., the year and professors of an article
+    description: str = ""
+
+
+@dataclass(frozen=True)
+class SearchIndex:
+    """An inverted index from terms to documents."""
+
+    #: a hash of the versions of the data the index was built from
+    version: str
+    documents: list[Document]
+    #: the kind of each document, as an index into :data:`KINDS`
+    kinds: np.ndarray
+    #: sorted terms
+    terms: list[str]
+    #: the postings of each term are ``offsets[term]`` to ``offsets[term + 1]``
+    offsets: np.ndarray
+    #: the document of each posting
+    postings: np.ndarray
+    #: the weight of each posting, normalized by the length of its field
+    weights: np.ndarray
+    #: the inverse document frequency of each term
+    idf: np.ndarray
+
+    def search(
+        self, query: str, *, limit: int = 20, kinds: Iterable[Kind] | None = None
+    ) -> list[tuple[Document, float]]:
+        """Get the documents best matching a query.
+
+        :param query: Text whose tokens must each be the start of a term in
+            a document
+        :param limit: The maximum number of results
+        :param kinds: Only return documents of these kinds
+        :returns: Documents and their scores, best first
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        total = np.zeros(len(self.documents), dtype=np.float32)
+        matched = np.ones(len(self.documents), dtype=bool)
+        if kinds is not None:
+            matched &= np.isin(self.kinds, [KINDS.index(kind) for kind in kinds])
+        for token in dict.fromkeys(tokens):
+            start = bisect.bisect_left(self.terms, token)
+            stop = bisect.bisect_left(self.terms, token + "\U0010ffff", lo=start)
+            if start == stop:
+                return []
+            begin, end = self.offsets[start], self.offsets[stop]
+            term_lengths = np.diff(self.offsets[start : stop + 1])
+            boosts = self.idf[start:stop].copy()
+            if self.terms[start] == token:
+                boosts[0] *= EXACT_BOOST
+            scores = self.weights[begin:end] * np.repeat(boosts, term_lengths)
+            # a document's best matching term counts for each token
+            token_scores = np.zeros(len(self.documents), dtype=np.float32)
+            np.maximum.at(token_scores, self.postings[begin:end], scores)
+            matched &= token_scores > 0
+            total += token_scores
+        candidates = np.flatnonzero(matched)
+        if len(candidates) > limit:
+            top = np.argpartition(-total[candidates], limit - 1)[:limit]
+            candidates = candidates[top]
+        candidates = candidates[np.argsort(-total[candidates], kind="stable")]
+        return [(self.documents[i], float(total[i])) for i in candidates]
+
+
+def _get_literature_version(path: Path = LITERATURE_PATH) -> str:
+    if not path.is_file():
+        return ""
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def get_search_version(kg, literature_path: Path = LITERATURE_PATH) -> str:
+    """Get the version of the search index for a snapshot and the literature cache."""
+    hasher = hashlib.sha256(f"{SEARCH_INDEX_FORMAT}\n{kg.version}\n".encode())
+    hasher.update(_get_literature_version(literature_path).encode())
+    return hasher.hexdigest()
+
+
+def _get_documents(
+    kg, literature_path: Path
+) -> Iterable[tuple[Document, list[tuple[str, float]]]]:
+    """Get documents with their fields' texts and weights."""
+    entities = pd.concat(
+        [
+            kg.reactions_df[[column, f"{column} name"]].set_axis(
+                ["curie", "name"], axis=1
+            )
+            for column in ("input", "output")
+        ]
+    ).dropna(subset="curie")
+    for curie, name in entities.drop_duplicates("curie").values:
+        name = name if isinstance(name, str) else curie
+        yield (
+            Document("entity", curie, name, curie),
+            [(curie, IDENTIFIER_WEIGHT), (name, NAME_WEIGHT)],
+        )
+
+    catalysts = kg.conditions_df[
+        kg.conditions_df["catalyst"].notna()
+        & (kg.conditions_df["catalyst"] != "no catalyst")
+    ][["catalyst", "catalyst name"]].drop_duplicates("catalyst")
+    for curie, name in catalysts.values:
+        name = name if isinstance(name, str) else curie
+        yield (
+            Document("catalyst", curie, name, curie),
+            [(curie, IDENTIFIER_WEIGHT), (name, NAME_WEIGHT)],
+        )
+
+    for orcid, name in kg.people.items():
+        yield (
+            Document("person", orcid, name, f"orcid:{orcid}"),
+            [(orcid, IDENTIFIER_WEIGHT), (name, NAME_WEIGHT)],
+        )
+
+    for group, professor, topic in kg.labs_df[["group", "Professor", "Topic"]].values:
+        topic = topic if isinstance(topic, str) else ""
+        yield (
+            Document("group", str(group), professor, topic),
+            [(professor, NAME_WEIGHT), (topic, OTHER_WEIGHT)],
+        )
+
+    if not literature_path.is_file():
+        return
+    literature_df = pd.read_csv(
+        literature_path,
+        sep="\t",
+        dtype={"pubmed": str, "year": str, "title": str, "professors": str},
+        keep_default_na=False,
+    )
+    for pubmed, year, title, professors in literature_df[
+        ["pubmed", "year", "title", "professors"]
+    ].values:
+        professors = professors.replace(",", ", ")
+        yield (
+            Document("article", pubmed, title, f"{professors} ({year})"),
+            [
+                (pubmed, IDENTIFIER_WEIGHT),
+                (title, NAME_WEIGHT),
+                (professors, OTHER_WEIGHT),
+            ],
+        )
+
+
+def build_search_index(kg, literature_path: Path = LITERATURE_PATH) -> SearchIndex:
+    """Build a search index.
+
+    :param kg: A :class:`snapshot.KGSnapshot`
+    :param literature_path: The literature TSV. Articles are left out if it
+        doesn't exist.
+    """
+    documents: list[Document] = []
+    #: term -> document -> weight
+    term_weights: dict[str, dict[int, float]] = {}
+    for document, fields in _get_documents(kg, literature_path):
+        doc_id = len(documents)
+        documents.append(document)
+        for text, weight in fields:
+            tokens = tokenize(text)
+            if not tokens:
+                continue
+            # matches in short fields, e.g., a molecule's name, count for more
+            # than matches in long ones, e.g., an article's title
+            weight /= np.sqrt(len(tokens))
+            for token in tokens:
+                postings = term_weights.setdefault(token, {})
+                if postings.get(doc_id, 0.0) < weight:
+                    postings[doc_id] = weight
+
+    terms = sorted(term_weights)
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum([len(term_weights[term]) for term in terms], out=offsets[1:])
+    postings = np.fromiter(
+        (doc_id for term in terms for doc_id in term_weights[term]),
+        dtype=np.int32,
+        count=offsets[-1],
+    )
+    weights = np.fromiter(
+        (weight for term in terms for weight in term_weights[term].values()),
+        dtype=np.float32,
+        count=offsets[-1],
+    )
+    idf = np.log1p(len(documents) / np.diff(offsets)).astype(np.float32)
+    return SearchIndex(
+        version=get_search_version(kg, literature_path),
+        documents=documents,
+        kinds=np.array([KINDS.index(d.kind) for d in documents], dtype=np.int8),
+        terms=terms,
+        offsets=offsets,
+        postings=postings,
+        weights=weights,
+        idf=idf,
+    )
+
+
+def write_search_index(index: SearchIndex, path: Path = SEARCH_INDEX_PATH) -> None:
+    """Write a search index to a file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as file:
+        pickle.dump(index, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(file.name, path)
+
+
+def read_search_index(
+    version: str, path: Path = SEARCH_INDEX_PATH
+) -> SearchIndex | None:
+    """Read a search index written by :func:`write_search_index`.
+
+    :returns: The index, or ``None`` if there's none or it has another version
+    """
+    if not path.is_file():
+        return None
+    try:
+        with path.open("rb") as file:
+            index: SearchIndex = pickle.load(file)
+    except (
+        OSError,
+        pickle.UnpicklingError,
+        EOFError,
+        AttributeError,
+        ImportError,
+    ) as e:
+        logger.warning("could not read search index from %s: %s", path, e)
+        return None
+    if index.version != version:
+        return None
+    return index
+
+
+class SearchIndexStore:
+    """Holds the search index for the current snapshot and rebuilds it when it changes."""
+
+    def __init__(self, path: Path = SEARCH_INDEX_PATH) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._index: SearchIndex | None = None
+        self._key: tuple | None = None
+
+    def get(self, kg) -> SearchIndex:
+        """Get the search index for a snapshot, loading or building it if needed."""
+        key = (kg.version, _stat(LITERATURE_PATH))
+        with self._lock:
+            if key != self._key:
+                version = get_search_version(kg)
+                index = read_search_index(version, self.path)
+                if index is None:
+                    index = build_search_index(kg)
+                    write_search_index(index, self.path)
+                self._index = index
+                self._key = key
+            return self._index
+
+
+def _stat(path: Path) -> tuple[int, int] | None:
+    if not path.is_file():
+        return None
+    stat = path.stat()
+    return stat.st_mtime_ns, stat.st_size
+
+
+@click.command()
+@click.option("--path", type=Path, default=SEARCH_INDEX_PATH, show_default=True)
+def main(path: Path) -> None:
+    """Build the search index."""
+    from snapshot import get_snapshot
+
+    start = time.perf_counter()
+    index = build_search_index(get_snapshot())
+    write_search_index(index, path)
+    click.echo(
+        f"indexed {len(index.documents):,} documents with {len(index.terms):,} "
+        f"terms to {path} in {time.perf_counter() - start:.2f} s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,489 @@
+# /// script
+# requires-python = ">=3.14"
+# dependencies = [
+#     "click>=8.1.0",
+#     "pandas>=3.0.0",
+# ]
+# ///
+
+"""Immutable, versioned snapshots of the curation data that can be hot-reloaded.
+
+A :class:`KGSnapshot` holds everything the web application derives from the
+curation TSVs. The :class:`SnapshotStore` rebuilds it in the background when
+any TSV's content changes, re-deriving only the pieces that depend on the
+changed files, then swaps the new snapshot in with a single reference
+assignment. Requests should get the snapshot once and use it throughout, so
+they never see a mix of old and new data.
+
+Running this script validates the curation TSVs and compiles a snapshot to
+``output/snapshot.pickle``. Loading it is much faster than parsing and joining
+the TSVs, so the web application and :func:`draw.main` start from it when
+it's up to date with the TSVs, and fall back to the TSVs otherwise.
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import click
+import pandas as pd
+from pandas.core.groupby import DataFrameGroupBy
+
+from constants import (
+    CHEMICAL_HIERARCHY_PATH,
+    CLOSED_LOOPS_PATH,
+    CONDITIONS_PATH,
+    LABS_PATH,
+    MEMBERSHIPS_PATH,
+    OUTPUT_DIR,
+    REACTION_HIERARCHY_PATH,
+    REACTIONS_PATH,
+)
+from hierarchy import Hierarchy, build_hierarchy
+from index import KGIndex, build_index
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_PATH = OUTPUT_DIR.joinpath("snapshot.pickle")
+#: incremented when the contents of :class:`KGSnapshot` change
+SNAPSHOT_FORMAT = 2
+#: errors from reading a truncated, corrupt, or outdated pickle, e.g., one
+#: referring to a class that was moved or renamed
+PICKLE_ERRORS = (
+    OSError,
+    pickle.UnpicklingError,
+    EOFError,
+    AttributeError,
+    ImportError,
+)
+
+#: the curation TSVs a snapshot is built from
+PATHS: tuple[Path, ...] = (
+    CHEMICAL_HIERARCHY_PATH,
+    CLOSED_LOOPS_PATH,
+    CONDITIONS_PATH,
+    LABS_PATH,
+    MEMBERSHIPS_PATH,
+    REACTION_HIERARCHY_PATH,
+    REACTIONS_PATH,
+)
+
+
+@dataclass(frozen=True)
+class KGSnapshot:
+    """The curation data and everything derived from it."""
+
+    #: a hash of the contents of all curation TSVs
+    version: str
+    #: file name -> hash of its contents
+    file_hashes: dict[str, str]
+
+    chemical_hierarchy_df: pd.DataFrame
+    closed_loops_df: pd.DataFrame
+    labs_df: pd.DataFrame
+    reactions_df: pd.DataFrame
+    reaction_hierarchy_df: pd.DataFrame
+    conditions_df: pd.DataFrame
+    memberships_df: pd.DataFrame
+
+    people: dict[str, str]
+    catalyst_grouping: DataFrameGroupBy
+    substrate_grouping: DataFrameGroupBy
+    product_grouping: DataFrameGroupBy
+    index: KGIndex
+    reaction_hierarchy: Hierarchy
+    chemical_hierarchy: Hierarchy
+
+
+def _read_reactions(path: Path) -> pd.DataFrame:
+    df = pd.read_csv(path, sep="\t")
+    del df["desc."]
+    return df
+
+
+def _join_conditions(path: Path, reactions_df: pd.DataFrame) -> pd.DataFrame:
+    return pd.read_csv(path, sep="\t").join(
+        reactions_df,
+        on="reaction",
+        how="left",
+        rsuffix="_reaction",
+        lsuffix="_condition",
+    )
+
+
+def _get_people(conditions_df: pd.DataFrame) -> dict[str, str]:
+    return dict(
+        conditions_df[
+            conditions_df["chemist"].notna() & conditions_df["chemist name"].notna()
+        ][["chemist", "chemist name"]]
+        .drop_duplicates()
+        .values
+    )
+
+
+def _get_catalyst_grouping(conditions_df: pd.DataFrame) -> DataFrameGroupBy:
+    return conditions_df[
+        conditions_df["catalyst"].notna()
+        & (conditions_df["catalyst"].notna() != "no catalyst")
+        & conditions_df["catalyst name"].notna()
+    ].groupby(["catalyst", "catalyst name"])
+
+
+def hash_files(paths: tuple[Path, ...] = PATHS) -> dict[str, str]:
+    """Get a hash of the contents of each file."""
+    return {path.name: hashlib.sha256(path.read_bytes()).hexdigest() for path in paths}
+
+
+def get_version(file_hashes: dict[str, str]) -> str:
+    """Get a version for a snapshot from the hashes of its files."""
+    hasher = hashlib.sha256()
+    for name, file_hash in sorted(file_hashes.items()):
+        hasher.update(f"{name}\t{file_hash}\n".encode())
+    return hasher.hexdigest()
+
+
+def load_snapshot(previous: KGSnapshot | None = None) -> KGSnapshot:
+    """Load a snapshot of the curation data.
+
+    :param previous: A previous snapshot. If given, pieces that only depend on
+        files whose contents haven't changed are reused from it.
+    :returns: A new snapshot, or the previous one if no files changed
+    """
+    file_hashes = hash_files()
+    if previous is not None and previous.file_hashes == file_hashes:
+        return previous
+    changed = {
+        name
+        for name, file_hash in file_hashes.items()
+        if previous is None or previous.file_hashes.get(name) != file_hash
+    }
+
+    def _stale(*paths: Path) -> bool:
+        return any(path.name in changed for path in paths)
+
+    def _read(path: Path) -> pd.DataFrame:
+        return pd.read_csv(path, sep="\t")
+
+    p = previous
+    reactions_df = (
+        _read_reactions(REACTIONS_PATH) if _stale(REACTIONS_PATH) else p.reactions_df
+    )
+    if _stale(REACTIONS_PATH, CONDITIONS_PATH):
+        conditions_df = _join_conditions(CONDITIONS_PATH, reactions_df)
+        people = _get_people(conditions_df)
+        catalyst_grouping = _get_catalyst_grouping(conditions_df)
+    else:
+        conditions_df = p.conditions_df
+        people = p.people
+        catalyst_grouping = p.catalyst_grouping
+    if _stale(REACTIONS_PATH):
+        substrate_grouping = reactions_df.groupby(["input", "input name"])
+        product_grouping = reactions_df.groupby(["output", "output name"])
+    else:
+        substrate_grouping = p.substrate_grouping
+        product_grouping = p.product_grouping
+    labs_df = _read(LABS_PATH) if _stale(LABS_PATH) else p.labs_df
+    memberships_df = (
+        _read(MEMBERSHIPS_PATH) if _stale(MEMBERSHIPS_PATH) else p.memberships_df
+    )
+    if _stale(LABS_PATH, MEMBERSHIPS_PATH, REACTIONS_PATH, CONDITIONS_PATH):
+        index = build_index(
+            labs_df=labs_df,
+            memberships_df=memberships_df,
+            reactions_df=reactions_df,
+            conditions_df=conditions_df,
+        )
+    else:
+        index = p.index
+
+    if _stale(REACTION_HIERARCHY_PATH):
+        reaction_hierarchy_df = _read(REACTION_HIERARCHY_PATH)
+        reaction_hierarchy = build_hierarchy(
+            reaction_hierarchy_df[["child", "parent"]].values
+        )
+    else:
+        reaction_hierarchy_df = p.reaction_hierarchy_df
+        reaction_hierarchy = p.reaction_hierarchy
+    if _stale(CHEMICAL_HIERARCHY_PATH):
+        chemical_hierarchy_df = _read(CHEMICAL_HIERARCHY_PATH)
+        chemical_hierarchy = build_hierarchy(
+            chemical_hierarchy_df[["child", "parent"]].values
+        )
+    else:
+        chemical_hierarchy_df = p.chemical_hierarchy_df
+        chemical_hierarchy = p.chemical_hierarchy
+
+    return KGSnapshot(
+        version=get_version(file_hashes),
+        file_hashes=file_hashes,
+        chemical_hierarchy_df=chemical_hierarchy_df,
+        closed_loops_df=(
+            _read(CLOSED_LOOPS_PATH) if _stale(CLOSED_LOOPS_PATH) else p.closed_loops_df
+        ),
+        labs_df=labs_df,
+        reactions_df=reactions_df,
+        reaction_hierarchy_df=reaction_hierarchy_df,
+        conditions_df=conditions_df,
+        memberships_df=memberships_df,
+        people=people,
+        catalyst_grouping=catalyst_grouping,
+        substrate_grouping=substrate_grouping,
+        product_grouping=product_grouping,
+        index=index,
+        reaction_hierarchy=reaction_hierarchy,
+        chemical_hierarchy=chemical_hierarchy,
+    )
+
+
+#: columns of each curation TSV that the application relies on
+REQUIRED_COLUMNS: dict[Path, list[str]] = {
+    CHEMICAL_HIERARCHY_PATH: ["child", "parent"],
+    CLOSED_LOOPS_PATH: ["loop", "curie"],
+    REACTION_HIERARCHY_PATH: ["child", "parent"],
+    CONDITIONS_PATH: [
+        "reaction",
+        "method",
+        "catalyst",
+        "catalyst name",
+        "chemist",
+        "chemist name",
+        "group",
+        "group name",
+    ],
+    LABS_PATH: ["group", "Professor"],
+    MEMBERSHIPS_PATH: ["orcid", "lab"],
+    REACTIONS_PATH: [
+        "reaction",
+        "kingdom",
+        "input",
+        "input name",
+        "output",
+        "output name",
+        "desc.",
+    ],
+}
+#: columns of each curation TSV whose values must be integers, if given
+INTEGER_COLUMNS: dict[Path, list[str]] = {
+    REACTION_HIERARCHY_PATH: ["child", "parent"],
+    CONDITIONS_PATH: ["reaction", "group"],
+    LABS_PATH: ["group"],
+    MEMBERSHIPS_PATH: ["lab"],
+    REACTIONS_PATH: ["reaction"],
+}
+
+
+def validate_files() -> list[str]:
+    """Check the columns and types of the curation TSVs.
+
+    This only reads the TSVs, so it finds the problems that would make
+    :func:`load_snapshot` fail before it joins or derives anything.
+
+    :returns: A description of each problem
+    """
+    problems = []
+    for path, columns in REQUIRED_COLUMNS.items():
+        try:
+            df = pd.read_csv(path, sep="\t", dtype=str)
+        except (OSError, pd.errors.ParserError) as e:
+            problems.append(f"{path.name} could not be read: {e}")
+            continue
+        missing = set(columns).difference(df.columns)
+        if missing:
+            problems.append(f"{path.name} is missing columns {sorted(missing)}")
+        for column in INTEGER_COLUMNS.get(path, []):
+            if column not in df.columns:
+                continue
+            values = df[column].dropna()
+            invalid = values[~values.str.strip().str.fullmatch(r"-?\d+")]
+            if len(invalid):
+                examples = ", ".join(sorted(invalid.unique())[:5])
+                problems.append(
+                    f"{path.name} has non-integer values in {column}: {examples}"
+                )
+    return problems
+
+
+def validate_snapshot(snapshot: KGSnapshot) -> list[str]:
+    """Check a snapshot for inconsistencies between the curation TSVs.
+
+    The TSVs themselves should be checked with :func:`validate_files` first.
+
+    :returns: A description of each problem
+    """
+    problems = []
+    reactions = snapshot.reactions_df["reaction"]
+    for reaction in sorted(set(reactions[reactions.duplicated()]), key=str):
+        problems.append(f"{REACTIONS_PATH.name} has duplicate reaction {reaction}")
+    unknown = set(snapshot.conditions_df["reaction"].dropna()).difference(reactions)
+    for reaction in sorted(unknown, key=str):
+        problems.append(
+            f"{CONDITIONS_PATH.name} references unknown reaction {reaction}"
+        )
+    for column in ["child", "parent"]:
+        unknown = set(snapshot.reaction_hierarchy_df[column].dropna()).difference(
+            reactions
+        )
+        for reaction in sorted(unknown, key=str):
+            problems.append(
+                f"{REACTION_HIERARCHY_PATH.name} references unknown reaction {reaction}"
+            )
+    groups = snapshot.conditions_df["group"].dropna()
+    # 0 marks conditions from external groups
+    groups = groups[groups != 0]
+    for group in sorted(set(groups).difference(snapshot.labs_df["group"]), key=str):
+        problems.append(f"{CONDITIONS_PATH.name} references unknown group {group}")
+    return problems
+
+
+def compile_snapshot(path: Path = SNAPSHOT_PATH) -> KGSnapshot:
+    """Load a snapshot from the curation TSVs, validate it, and write it to a file.
+
+    :raises ValueError: If the curation TSVs have problems
+    """
+    problems = validate_files()
+    if problems:
+        raise ValueError("\n".join(problems))
+    snapshot = load_snapshot()
+    problems = validate_snapshot(snapshot)
+    if problems:
+        raise ValueError("\n".join(problems))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as file:
+        pickle.dump(
+            {
+                "format": SNAPSHOT_FORMAT,
+                "pandas": pd.__version__,
+                "snapshot": snapshot,
+            },
+            file,
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+    os.replace(file.name, path)
+    return snapshot
+
+
+def read_compiled_snapshot(path: Path = SNAPSHOT_PATH) -> KGSnapshot | None:
+    """Read a snapshot written by :func:`compile_snapshot`.
+
+    :returns: The snapshot, or ``None`` if there's none, it was written by a
+        different version of this module or pandas, or any curation TSV
+        changed since it was compiled
+    """
+    if not path.is_file():
+        return None
+    try:
+        with path.open("rb") as file:
+            data = pickle.load(file)
+    except PICKLE_ERRORS as e:
+        logger.warning("could not read snapshot from %s: %s", path, e)
+        return None
+    # e.g., a pickle written by an older version of this module
+    if (
+        not isinstance(data, dict)
+        or data.get("format") != SNAPSHOT_FORMAT
+        or data.get("pandas") != pd.__version__
+    ):
+        return None
+    snapshot: KGSnapshot = data["snapshot"]
+    if snapshot.file_hashes != hash_files():
+        return None
+    return snapshot
+
+
+def get_snapshot() -> KGSnapshot:
+    """Get the compiled snapshot if it's up to date, or load one from the TSVs."""
+    return read_compiled_snapshot() or load_snapshot()
+
+
+def _stat(paths: tuple[Path, ...] = PATHS) -> tuple[tuple[int, int], ...]:
+    rv = []
+    for path in paths:
+        stat = path.stat()
+        rv.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(rv)
+
+
+class SnapshotStore:
+    """Holds the current snapshot and rebuilds it in the background when files change."""
+
+    def __init__(self, *, interval: float = 2.0) -> None:
+        """Load the first snapshot.
+
+        :param interval: The minimum number of seconds between checks for
+            changes to the curation TSVs
+        """
+        self.interval = interval
+        self._stat = _stat()
+        self._snapshot = get_snapshot()
+        self._checked = time.monotonic()
+        self._rebuilding = threading.Lock()
+
+    def get(self) -> KGSnapshot:
+        """Get the current snapshot, and start a rebuild if files changed.
+
+        This never blocks on a rebuild. Until the rebuild finishes, the
+        previous snapshot is returned.
+        """
+        now = time.monotonic()
+        if now - self._checked >= self.interval:
+            self._checked = now
+            if _stat() != self._stat and self._rebuilding.acquire(blocking=False):
+                threading.Thread(target=self._rebuild, daemon=True).start()
+        return self._snapshot
+
+    def _rebuild(self) -> None:
+        try:
+            stat = _stat()
+            if problems := validate_files():
+                logger.warning(
+                    "not reloading the curation data:\n%s", "\n".join(problems)
+                )
+                # don't check again until the files change again
+                self._stat = stat
+                return
+            snapshot = load_snapshot(self._snapshot)
+            # a single reference assignment, so readers see either the old
+            # or the new snapshot, never a partially built one
+            self._snapshot = snapshot
+            self._stat = stat
+        except Exception:
+            # the thread would end silently, keeping the previous snapshot
+            logger.exception("could not reload the curation data")
+        finally:
+            self._rebuilding.release()
+
+    def reload(self) -> KGSnapshot:
+        """Rebuild the snapshot synchronously, if any files changed, and return it."""
+        with self._rebuilding:
+            self._stat = _stat()
+            self._snapshot = load_snapshot(self._snapshot)
+        return self._snapshot
+
+
+@click.command()
+@click.option("--path", type=Path, default=SNAPSHOT_PATH, show_default=True)
+def main(path: Path) -> None:
+    """Validate the curation TSVs and compile them into a snapshot."""
+    start = time.perf_counter()
+    try:
+        snapshot = compile_snapshot(path)
+    except ValueError as e:
+        raise click.ClickException(str(e)) from None
+    click.echo(
+        f"compiled {len(snapshot.reactions_df):,} reactions and "
+        f"{len(snapshot.conditions_df):,} conditions to {path} "
+        f"in {time.perf_counter() - start:.2f} s"
+    )
+    start = time.perf_counter()
+    read_compiled_snapshot(path)
+    click.echo(f"loaded it in {time.perf_counter() - start:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+# /// script
+# requires-python = ">=3.14"
+# dependencies = [
+#     "click>=8.1.0",
+#     "pandas>=3.0.0",
+# ]
+# ///
+
+"""Generate synthetic curation TSVs and literature caches at a multiple of the real size.
+
+The real data is replicated ``factor`` times. Each replicate gets its own
+reaction IDs, group IDs, CURIEs, ORCIDs, closed loops, and PubMed IDs, so
+lookups have the same selectivity as on the real data and every page of the
+web application has the same shape, only there are ``factor`` times as many
+of them. Generated data has the same schemas as the real files and can be
+used by pointing the application at it with the environment variables from
+:func:`get_environment`.
+"""
+
+import io
+import sqlite3
+from pathlib import Path
+
+import click
+import pandas as pd
+
+from cache.citation_graph import CITATIONS_PATH, LITERATURE_PATH
+from constants import (
+    CHEMICAL_HIERARCHY_PATH,
+    CLOSED_LOOP_MEMBERS_PATH,
+    CLOSED_LOOPS_PATH,
+    CONDITIONS_PATH,
+    LABS_PATH,
+    MEMBERSHIPS_PATH,
+    NAMES_PATH,
+    OUTPUT_DIR,
+    REACTION_HIERARCHY_PATH,
+    REACTIONS_PATH,
+)
+from names import SCHEMA
+
+SYNTHETIC_DIR = OUTPUT_DIR.joinpath("synthetic")
+
+#: curation TSV -> columns with IDs that are offset per replicate, and columns
+#: with CURIEs or other identifiers that are suffixed per replicate
+REPLICATED_COLUMNS: dict[Path, tuple[list[str], list[str]]] = {
+    LABS_PATH: (["group"], []),
+    MEMBERSHIPS_PATH: (["lab"], ["orcid"]),
+    REACTIONS_PATH: (["reaction"], ["input", "output", "reagent", "output 2"]),
+    REACTION_HIERARCHY_PATH: (["child", "parent"], []),
+    CONDITIONS_PATH: (["reaction", "group"], ["catalyst", "chemist"]),
+    CHEMICAL_HIERARCHY_PATH: ([], ["child", "parent"]),
+    CLOSED_LOOPS_PATH: ([], ["loop", "curie"]),
+    CLOSED_LOOP_MEMBERS_PATH: ([], ["loop", "member"]),
+}
+
+#: PubMed IDs of each replicate of the literature are offset by this much
+PUBMED_OFFSET = 100_000_000
+
+
+def _read(path: Path) -> pd.DataFrame:
+    return pd.read_csv(path, sep="\t", dtype=str, keep_default_na=False, na_values=[""])
+
+
+def _offset(series: pd.Series, offset: int) -> pd.Series:
+    if not offset:
+        return series
+    return (pd.to_numeric(series) + offset).astype("Int64").astype("string")
+
+
+def _suffix(series: pd.Series, i: int) -> pd.Series:
+    if not i:
+        return series
+    # keep values that aren't identifiers, like "no catalyst"
+    mask = series.notna() & (series != "no catalyst")
+    return series.where(~mask, series + f"-{i}")
+
+
+def scale_curation_tables(factor: int) -> dict[Path, pd.DataFrame]:
+    """Replicate each curation TSV ``factor`` times.
+
+    :returns: The path of each real curation TSV and its replicated contents,
+        with all values as strings
+    """
+    dfs = {path: _read(path) for path in REPLICATED_COLUMNS}
+    offsets = {
+        "reaction": int(pd.to_numeric(dfs[REACTIONS_PATH]["reaction"]).max()),
+        "group": int(pd.to_numeric(dfs[LABS_PATH]["group"]).max()),
+    }
+    # hierarchy IDs are reaction IDs and memberships' labs are groups
+    offsets |= {"child": offsets["reaction"], "parent": offsets["reaction"]}
+    offsets["lab"] = offsets["group"]
+
+    rv = {}
+    for path, (offset_columns, suffix_columns) in REPLICATED_COLUMNS.items():
+        df = dfs[path]
+        replicates = []
+        for i in range(factor):
+            replicate = df.copy()
+            for column in offset_columns:
+                replicate[column] = _offset(replicate[column], i * offsets[column])
+            for column in suffix_columns:
+                replicate[column] = _suffix(replicate[column], i)
+            replicates.append(replicate)
+        rv[path] = pd.concat(replicates, ignore_index=True)
+    return rv
+
+
+def scale_curation(
+    factor: int,
+) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Get replicated labs, memberships, reactions, and joined conditions.
+
+    The frames are parsed the same way as in :func:`snapshot.load_snapshot`.
+    """
+    tables = scale_curation_tables(factor)
+
+    def _parse(path: Path) -> pd.DataFrame:
+        return pd.read_csv(
+            io.StringIO(tables[path].to_csv(sep="\t", index=False)),
+            sep="\t",
+        )
+
+    reactions_df = _parse(REACTIONS_PATH)
+    conditions_df = _parse(CONDITIONS_PATH).join(
+        reactions_df,
+        on="reaction",
+        how="left",
+        rsuffix="_reaction",
+        lsuffix="_condition",
+    )
+    return _parse(LABS_PATH), _parse(MEMBERSHIPS_PATH), reactions_df, conditions_df
+
+
+def scale_literature(factor: int) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Replicate the literature and citations ``factor`` times."""
+    literature_df = _read(LITERATURE_PATH)
+    citations_df = pd.read_csv(CITATIONS_PATH, sep="\t", header=None, dtype=str)
+    literatures, citations = [], []
+    for i in range(factor):
+        literature = literature_df.copy()
+        literature["pubmed"] = _offset(literature["pubmed"], i * PUBMED_OFFSET)
+        literatures.append(literature)
+        citations.append(citations_df.apply(_offset, offset=i * PUBMED_OFFSET))
+    return (
+        pd.concat(literatures, ignore_index=True),
+        pd.concat(citations, ignore_index=True),
+    )
+
+
+def _write_names(path: Path, factor: int) -> None:
+    """Write a names table for the replicated CURIEs, so nothing falls back to PyOBO."""
+    from names import get_curation_curies
+
+    names: dict[str, tuple[str | None, str | None]] = {}
+    if NAMES_PATH.is_file():
+        with sqlite3.connect(NAMES_PATH) as connection:
+            names.update(
+                (curie, (name, definition))
+                for curie, name, definition in connection.execute(
+                    "SELECT curie, name, definition FROM names"
+                )
+            )
+    curies = get_curation_curies()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.unlink(missing_ok=True)
+    with sqlite3.connect(path) as connection:
+        connection.execute(SCHEMA)
+        connection.executemany(
+            "INSERT INTO names VALUES (?, ?, ?)",
+            (
+                (curie if not i else f"{curie}-{i}", *names.get(curie, (None, None)))
+                for i in range(factor)
+                for curie in sorted(curies)
+            ),
+        )
+
+
+def get_environment(directory: Path) -> dict[str, str]:
+    """Get environment variables that point the application to synthetic data."""
+    return {
+        "CATALAIX_CURATION_DIR": str(directory.joinpath("curation")),
+        "CATALAIX_OUTPUT_DIR": str(directory.joinpath("output")),
+        "CATALAIX_LITERATURE_DIR": str(directory.joinpath("cache")),
+    }
+
+
+def write_synthetic(
+    directory: Path, factor: int, *, literature_factor: int | None = None
+) -> None:
+    """Write synthetic curation TSVs, literature caches, and a names table.
+
+    :param directory: The directory to write to. Curation TSVs are written to
+        ``curation/``, the literature cache to ``cache/``, and the names table
+        to ``output/``, mirroring the repository's layout.
+    :param factor: The number of replicates of the curation data
+    :param literature_factor: The number of replicates of the literature
+        cache. Defaults to ``factor``.
+    """
+    curation_dir = directory.joinpath("curation")
+    curation_dir.mkdir(parents=True, exist_ok=True)
+    for path, df in scale_curation_tables(factor).items():
+        df.to_csv(curation_dir.joinpath(path.name), sep="\t", index=False)
+
+    cache_dir = directory.joinpath("cache")
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    literature_df, citations_df = scale_literature(literature_factor or factor)
+    # the literature cache is written with the csv module, which uses CRLF
+    literature_df.to_csv(
+        cache_dir.joinpath(LITERATURE_PATH.name),
+        sep="\t",
+        index=False,
+        lineterminator="\r\n",
+    )
+    citations_df.to_csv(
+        cache_dir.joinpath(CITATIONS_PATH.name),
+        sep="\t",
+        index=False,
+        header=False,
+        lineterminator="\r\n",
+    )
+
+    _write_names(directory.joinpath("output", NAMES_PATH.name), factor)
+
+
+@click.command()
+@click.option("--factor", type=int, required=True)
+@click.option("--literature-factor", type=int, help="Defaults to --factor")
+@click.option("--directory", type=Path, help=f"Defaults to {SYNTHETIC_DIR}/<factor>x")
+def main(factor: int, literature_factor: int | None, directory: Path | None) -> None:
+    """Write synthetic data at a multiple of the real data's size."""
+    if directory is None:
+        directory = SYNTHETIC_DIR.joinpath(f"{factor}x")
+    write_synthetic(directory, factor, literature_factor=literature_factor)
+    click.echo(f"wrote {factor}x data to {directory}")
+    for key, value in get_environment(directory).items():
+        click.echo(f"export {key}={value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,23 +7,25 @@
 # ]
 # ///
 
-from collections import defaultdict
+import functools
+import gc
+from collections.abc import Callable
+from concurrent.futures import Future
+from pathlib import Path
+from urllib.parse import urlencode
 
 import flask
 import pandas as pd
 from flask_bootstrap import Bootstrap5
-import pyobo
-
-from constants import (
-    LABS_PATH,
-    REACTIONS_PATH,
-    REACTION_HIERARCHY_PATH,
-    CONDITIONS_PATH,
-    MEMBERSHIPS_PATH,
-    CLOSED_LOOPS_PATH,
-    CHEMICAL_HIERARCHY_PATH,
-)
-from draw import draw_bytes
+
+from api import get_blueprint
+from diagram_cache import DiagramCache, DiagramQueueFull
+from index import EMPTY, union
+from metrics import REGISTRY, install, span
+from names import NameTable, get_curation_curies
+from response_cache import ResponseCache, get_files_version
+from search import KINDS, SearchIndexStore
+from snapshot import SnapshotStore
 
 app = flask.Flask(__name__)
 Bootstrap5(app)
@@ -35,88 +37,162 @@ def _get_catalysts_df(conditions: pd.DataFrame) -> pd.DataFrame:
     ].drop_duplicates()
 
 
-CHEMICAL_HIERARCHY_DF = pd.read_csv(CHEMICAL_HIERARCHY_PATH, sep="\t")
-CLOSED_LOOPS_DF = pd.read_csv(CLOSED_LOOPS_PATH, sep="\t")
-LABS_DF = pd.read_csv(LABS_PATH, sep="\t")
-REACTIONS_DF = pd.read_csv(REACTIONS_PATH, sep="\t")
-del REACTIONS_DF["desc."]
-REACTION_HIERARCHY_DF = pd.read_csv(REACTION_HIERARCHY_PATH, sep="\t")
-CONDITIONS_DF = pd.read_csv(CONDITIONS_PATH, sep="\t").join(
-    REACTIONS_DF, on="reaction", how="left", rsuffix="_reaction", lsuffix="_condition"
+STORE = SnapshotStore()
+DIAGRAM_CACHE = DiagramCache(lambda: STORE.get().version)
+#: the number of seconds a request waits for a diagram to be drawn
+DIAGRAM_TIMEOUT = 30
+NAMES = NameTable()
+SEARCH = SearchIndexStore()
+RESPONSE_CACHE = ResponseCache(
+    salt=get_files_version(
+        Path(app.root_path, app.template_folder or "templates").glob("*.html")
+    )
+)
+API = get_blueprint(STORE)
+app.register_blueprint(API)
+install(app)
+REGISTRY.describe(
+    "catalaix_diagram_cache", "gauge", "Counters and sizes of the diagram cache"
+)
+REGISTRY.gauge(
+    "catalaix_diagram_cache",
+    lambda: [
+        ((("stat", key),), value)
+        for key, value in DIAGRAM_CACHE.stats().items()
+        if isinstance(value, int)
+    ],
+)
+REGISTRY.describe(
+    "catalaix_response_cache", "gauge", "Counters and sizes of the page cache"
 )
+REGISTRY.gauge(
+    "catalaix_response_cache",
+    lambda: [
+        ((("stat", key),), value)
+        for key, value in RESPONSE_CACHE.stats().items()
+        if isinstance(value, int | float)
+    ],
+)
+
+
+def preload() -> None:
+    """Load everything workers share before a multi-process server forks them.
+
+    This loads the snapshot, the search index, and the API's derived tables
+    and looks up names missing from the name table, so workers don't load them
+    or PyOBO's ontologies on their own. Diagrams cached on disk for previous
+    versions of the curation data are removed, since no worker uses them yet. Objects are then frozen out of garbage
+    collection, so collections in workers don't write to the pages they share
+    with the server, which would copy them into every worker. See
+    ``gunicorn.conf.py``.
+    """
+    kg = STORE.get()
+    SEARCH.get(kg)
+    API.preload()
+    NAMES.resolve_missing(get_curation_curies())
+    DIAGRAM_CACHE.prune()
+    gc.collect()
+    gc.freeze()
+
+
+def _render_template(template: str, **context) -> str:
+    with span("template"):
+        return flask.render_template(template, **context)
 
-MEMBERSHIPS_DF = pd.read_csv(MEMBERSHIPS_PATH, sep="\t")
-ORCID_TO_GROUPS: defaultdict[str, set[int]] = defaultdict(set)
-GROUP_TO_ORCIDS: defaultdict[int, set[str]] = defaultdict(set)
-for orcid, _name, lab_id, _lab_name in MEMBERSHIPS_DF.values:
-    if pd.notna(orcid):
-        ORCID_TO_GROUPS[orcid].add(lab_id)
-        GROUP_TO_ORCIDS[lab_id].add(orcid)
-
-PEOPLE_DF = CONDITIONS_DF[
-    CONDITIONS_DF["chemist"].notna() & CONDITIONS_DF["chemist name"].notna()
-][["chemist", "chemist name"]].drop_duplicates()
-PEOPLE: dict[str, str] = {}
-for orcid, name in (
-    CONDITIONS_DF[
-        CONDITIONS_DF["chemist"].notna() & CONDITIONS_DF["chemist name"].notna()
-    ][["chemist", "chemist name"]]
-    .drop_duplicates()
-    .values
-):
-    PEOPLE[orcid] = name
-
-CATALYST_GROUPING = CONDITIONS_DF[
-    CONDITIONS_DF["catalyst"].notna()
-    & (CONDITIONS_DF["catalyst"].notna() != "no catalyst")
-    & CONDITIONS_DF["catalyst name"].notna()
-].groupby(["catalyst", "catalyst name"])
-
-SUBSTRATE_GROUPING = REACTIONS_DF.groupby(["input", "input name"])
-PRODUCT_GROUPING = REACTIONS_DF.groupby(["output", "output name"])
+
+def _cached_page(view: Callable[..., str]) -> Callable[..., flask.Response]:
+    """Serve a page from :data:`RESPONSE_CACHE`, rendering it only on misses.
+
+    Pages get a strong ETag for the curation data, the templates, and the
+    route and arguments of the request. Browsers revalidate them on each
+    visit, which is answered with 304 until the curation data changes.
+
+    The view gets the snapshot the page is cached for as its first argument,
+    so a page rendered while the snapshot is swapped is cached for the
+    snapshot it was rendered from. Profiled requests are always rendered.
+    """
+
+    @functools.wraps(view)
+    def _wrapper(**kwargs) -> flask.Response:
+        kg = STORE.get()
+        request = flask.request
+        if "profile" in request.args:
+            return flask.Response(view(kg, **kwargs), mimetype="text/html")
+        version = kg.version
+        key = request.path
+        if request.args:
+            key += "?" + urlencode(sorted(request.args.items(multi=True)))
+        etag = RESPONSE_CACHE.get_etag(version, key)
+        if RESPONSE_CACHE.is_not_modified(etag, request.if_none_match):
+            response = flask.Response(status=304)
+        else:
+            body = RESPONSE_CACHE.get(version, key)
+            if body is None:
+                body = view(kg, **kwargs).encode()
+                RESPONSE_CACHE.put(version, key, body)
+            response = flask.Response(body, mimetype="text/html")
+        response.set_etag(etag)
+        response.cache_control.public = True
+        response.cache_control.no_cache = True
+        return response
+
+    return _wrapper
 
 
 @app.route("/")
-def get_home() -> str:
-    return flask.render_template(
+@_cached_page
+def get_home(kg) -> str:
+    return _render_template(
         "home.html",
-        people=PEOPLE,
-        labs=LABS_DF,
-        reactions=REACTIONS_DF,
-        conditions=CONDITIONS_DF,
-        catalysts=CATALYST_GROUPING,
-        substrates=SUBSTRATE_GROUPING,
-        products=PRODUCT_GROUPING,
-        closed_loops=CLOSED_LOOPS_DF,
+        people=kg.people,
+        labs=kg.labs_df,
+        reactions=kg.reactions_df,
+        conditions=kg.conditions_df,
+        catalysts=kg.catalyst_grouping,
+        substrates=kg.substrate_grouping,
+        products=kg.product_grouping,
+        closed_loops=kg.closed_loops_df,
     )
 
 
 @app.route("/person/")
-def get_people() -> str:
-    return flask.render_template("people.html", people=PEOPLE)
+@_cached_page
+def get_people(kg) -> str:
+    return _render_template("people.html", people=kg.people)
 
 
 @app.route("/person/<orcid>")
-def get_person(orcid: str) -> str:
-    conditions = CONDITIONS_DF[CONDITIONS_DF["chemist"] == orcid]
-    catalysts = _get_catalysts_df(conditions)
-    return flask.render_template(
+@_cached_page
+def get_person(kg, orcid: str) -> str:
+    with span("filter"):
+        conditions = kg.conditions_df.iloc[
+            kg.index.chemist_to_conditions.get(orcid, EMPTY)
+        ]
+        catalysts = _get_catalysts_df(conditions)
+        groups = kg.labs_df.iloc[kg.index.get_groups(orcid)]
+    return _render_template(
         "person.html",
         orcid=orcid,
-        name=PEOPLE[orcid],
-        groups=LABS_DF[LABS_DF["group"].isin(ORCID_TO_GROUPS[orcid])],
+        name=kg.people[orcid],
+        groups=groups,
         conditions=conditions,
         catalysts=catalysts,
     )
 
 
 @app.route("/group/<int:group>")
-def get_group(group: int) -> str:
-    data = LABS_DF.loc[LABS_DF["group"] == group].iloc[0].to_dict()
-    members = MEMBERSHIPS_DF[MEMBERSHIPS_DF["lab"] == group]
-    conditions = CONDITIONS_DF[CONDITIONS_DF["chemist"].isin(GROUP_TO_ORCIDS[group])]
-    catalysts = _get_catalysts_df(conditions)
-    return flask.render_template(
+@_cached_page
+def get_group(kg, group: int) -> str:
+    with span("filter"):
+        data = kg.labs_df.iloc[kg.index.group_to_lab[group]].to_dict()
+        members = kg.memberships_df.iloc[
+            kg.index.group_to_memberships.get(group, EMPTY)
+        ]
+        conditions = kg.conditions_df.iloc[
+            kg.index.group_to_conditions.get(group, EMPTY)
+        ]
+        catalysts = _get_catalysts_df(conditions)
+    return _render_template(
         "group.html",
         data=data,
         members=members,
@@ -125,19 +201,30 @@ def get_group(group: int) -> str:
     )
 
 
+def _get_curies(kg, curie: str) -> list[str]:
+    """Get the CURIE, and its descendants if the request has a ``descendants`` parameter."""
+    if "descendants" in flask.request.args:
+        return kg.chemical_hierarchy.get_descendants(curie)
+    return [curie]
+
+
 @app.route("/catalyst/<curie>")
-def get_catalyst(curie: str) -> str:
-    name = pyobo.get_name(curie)
-    description = pyobo.get_definition(curie)
+@_cached_page
+def get_catalyst(kg, curie: str) -> str:
+    name = NAMES.get_name(curie)
+    description = NAMES.get_definition(curie)
     if curie.startswith("CHEBI:"):
         image_url = f"https://bioregistry.io/{curie}?provider=chebi-img"
     else:
         image_url = None
 
-    conditions = CONDITIONS_DF[CONDITIONS_DF["catalyst"] == curie]
-    groups = conditions[["group", "group name"]].drop_duplicates()
-    people = conditions[["chemist", "chemist name"]].drop_duplicates()
-    return flask.render_template(
+    with span("filter"):
+        conditions = kg.conditions_df.iloc[
+            union(kg.index.catalyst_to_conditions, _get_curies(kg, curie))
+        ]
+        groups = conditions[["group", "group name"]].drop_duplicates()
+        people = conditions[["chemist", "chemist name"]].drop_duplicates()
+    return _render_template(
         "catalyst.html",
         curie=curie,
         name=name,
@@ -146,59 +233,165 @@ def get_catalyst(curie: str) -> str:
         conditions=conditions,
         groups=groups,
         people=people,
+        descendants="descendants" in flask.request.args,
+        has_descendants=kg.chemical_hierarchy.has_descendants(curie),
     )
 
 
 @app.route("/entity/<curie>")
-def get_entity(curie: str) -> str:
-    name = pyobo.get_name(curie)
-    description = pyobo.get_definition(curie)
+@_cached_page
+def get_entity(kg, curie: str) -> str:
+    name = NAMES.get_name(curie)
+    description = NAMES.get_definition(curie)
     if curie.startswith("CHEBI:"):
         image_url = f"https://bioregistry.io/{curie}?provider=chebi-img"
     else:
         image_url = None
 
-    substrate_reactions_df = REACTIONS_DF[REACTIONS_DF["input"] == curie]
-    substrate_reaction_ids = substrate_reactions_df["reaction"]
-    substrate_conditions_df = CONDITIONS_DF[
-        CONDITIONS_DF["reaction"].isin(substrate_reaction_ids)
-    ]
-    substrate_diagram = draw_bytes(
-        labs_df=LABS_DF,
-        reactions_df=substrate_reactions_df,
-        conditions_df=substrate_conditions_df,
-        reaction_hierarchy_df=REACTION_HIERARCHY_DF,
-        chemical_hierarchy_df=CHEMICAL_HIERARCHY_DF,
-        direction="TD",
-        group_closed_loop=False,
-    )
+    curies = _get_curies(kg, curie)
+    with span("filter"):
+        substrate_conditions_df = kg.conditions_df.iloc[
+            union(kg.index.input_to_conditions, curies)
+        ]
+        product_conditions_df = kg.conditions_df.iloc[
+            union(kg.index.output_to_conditions, curies)
+        ]
 
-    product_reactions_df = REACTIONS_DF[REACTIONS_DF["output"] == curie]
-    product_reaction_ids = product_reactions_df["reaction"]
-    product_conditions_df = CONDITIONS_DF[
-        CONDITIONS_DF["reaction"].isin(product_reaction_ids)
-    ]
-    product_diagram = draw_bytes(
-        labs_df=LABS_DF,
-        reactions_df=product_reactions_df,
-        conditions_df=product_conditions_df,
-        reaction_hierarchy_df=REACTION_HIERARCHY_DF,
-        chemical_hierarchy_df=CHEMICAL_HIERARCHY_DF,
-        direction="TD",
-        group_closed_loop=False,
-    )
+    # start drawing the diagrams without waiting for them, so they're ready or
+    # in progress when the browser requests them from get_entity_diagram. Pages
+    # served from the cache skip this, and get_entity_diagram draws on demand
+    for role in ("substrate", "product"):
+        try:
+            _submit_entity_diagram(kg, curies, role)
+        except DiagramQueueFull:
+            pass
 
-    return flask.render_template(
+    # diagrams of descendants are separate resources, so they get their own URLs
+    parameters = {"descendants": 1} if len(curies) > 1 else {}
+    return _render_template(
         "entity.html",
+        curie=curie,
         name=name,
         description=description,
         image_url=image_url,
         substrate_conditions=substrate_conditions_df,
-        input_diagram=substrate_diagram,
-        product_diagram=product_diagram,
+        input_diagram_url=flask.url_for(
+            "get_entity_diagram",
+            curie=curie,
+            role="substrate",
+            version=kg.version,
+            **parameters,
+        ),
+        product_diagram_url=flask.url_for(
+            "get_entity_diagram",
+            curie=curie,
+            role="product",
+            version=kg.version,
+            **parameters,
+        ),
         product_conditions=product_conditions_df,
+        descendants="descendants" in flask.request.args,
+        has_descendants=kg.chemical_hierarchy.has_descendants(curie),
+    )
+
+
+def _submit_entity_diagram(kg, curies: list[str], role: str) -> Future[bytes]:
+    """Start drawing the diagram of reactions with the entities as substrates or products."""
+    if role == "substrate":
+        reactions, conditions = (
+            kg.index.input_to_reactions,
+            kg.index.input_to_conditions,
+        )
+    else:
+        reactions, conditions = (
+            kg.index.output_to_reactions,
+            kg.index.output_to_conditions,
+        )
+    with span("filter"):
+        reactions_df = kg.reactions_df.iloc[union(reactions, curies)]
+        conditions_df = kg.conditions_df.iloc[union(conditions, curies)]
+    return DIAGRAM_CACHE.submit(
+        labs_df=kg.labs_df,
+        reactions_df=reactions_df,
+        conditions_df=conditions_df,
+        reaction_hierarchy_df=kg.reaction_hierarchy_df,
+        chemical_hierarchy_df=kg.chemical_hierarchy_df,
+        direction="TD",
+        group_closed_loop=False,
+        format="svg",
+        version=kg.version,
     )
 
 
+@app.route("/entity/<curie>/<any(substrate, product):role>.svg")
+def get_entity_diagram(curie: str, role: str) -> flask.Response:
+    """Get the diagram of reactions with the entity as a substrate or product.
+
+    Pages link diagrams with the version of the curation data they were
+    rendered from, so responses for the current version never change and can
+    be cached by browsers indefinitely. With a ``descendants`` parameter, the
+    reactions of all descendants of the entity in the chemical hierarchy are
+    drawn.
+    """
+    kg = STORE.get()
+    curies = _get_curies(kg, curie)
+    etag = f"{kg.version}-{role}-{curie}"
+    if len(curies) > 1:
+        etag += "-descendants"
+    if etag in flask.request.if_none_match:
+        return flask.Response(status=304)
+
+    # includes looking up the diagram cache and waiting for graphviz on misses,
+    # which is timed separately
+    with span("diagram"):
+        try:
+            value = _submit_entity_diagram(kg, curies, role).result(DIAGRAM_TIMEOUT)
+        except (DiagramQueueFull, TimeoutError):
+            response = flask.Response("diagram is not ready", status=503)
+            response.retry_after = 5
+            return response
+
+    response = flask.Response(value, mimetype="image/svg+xml")
+    response.set_etag(etag)
+    if flask.request.args.get("version") == kg.version:
+        response.cache_control.public = True
+        response.cache_control.max_age = 365 * 24 * 60 * 60
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+
+@app.route("/search")
+def get_search() -> str:
+    """Search articles, entities, catalysts, people, and groups.
+
+    The ``q`` argument is the query, and ``kind`` optionally restricts
+    results to one kind of document.
+    """
+    query = flask.request.args.get("q", "").strip()
+    kind = flask.request.args.get("kind")
+    if kind is not None and kind not in KINDS:
+        flask.abort(400, f"kind must be one of {', '.join(KINDS)}")
+    index = SEARCH.get(STORE.get())
+    with span("search"):
+        results = (
+            index.search(query, limit=50, kinds=None if kind is None else [kind])
+            if query
+            else []
+        )
+    return _render_template("search.html", query=query, kind=kind, results=results)
+
+
+@app.route("/stats/diagrams")
+def get_diagram_cache_stats() -> flask.Response:
+    return flask.jsonify(DIAGRAM_CACHE.stats())
+
+
+@app.route("/stats/responses")
+def get_response_cache_stats() -> flask.Response:
+    return flask.jsonify(RESPONSE_CACHE.stats())
+
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5004, debug=True)